@@ -0,0 +1,6 @@
+-- Indexes for the per-user ticket list and the upcoming-match listing,
+-- for databases created before the models declared them. Lookups by
+-- bookings.match_id already use the UNIQUE(match_id, seat_row, seat_number)
+-- index, so no separate match_id index is added.
+CREATE INDEX IF NOT EXISTS ix_bookings_user_id ON bookings(user_id);
+CREATE INDEX IF NOT EXISTS ix_matches_date_id ON matches(match_date, id);
@@ -46,6 +46,11 @@ CREATE TABLE matches (
     FOREIGN KEY (stadium_id) REFERENCES stadiums(id) ON DELETE CASCADE
 );
 
+CREATE INDEX ix_stadiums_city ON stadiums(city);
+CREATE INDEX ix_matches_date_id ON matches(match_date, id);
+CREATE INDEX ix_matches_status_date ON matches(status, match_date);
+CREATE INDEX ix_matches_tournament_date ON matches(tournament, match_date);
+
 -- Bookings table
 CREATE TABLE bookings (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -65,6 +70,8 @@ CREATE TABLE bookings (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE
 );
+CREATE INDEX ix_bookings_booking_date ON bookings(booking_date);
+CREATE INDEX ix_bookings_user_id ON bookings(user_id);
 
 -- Match Reviews table
 CREATE TABLE match_reviews (
@@ -88,6 +95,18 @@ CREATE TABLE seat_categories (
     color_code VARCHAR(7) DEFAULT '#28a745'
 );
 
+-- Stadium Sections table (row ranges per seat category; stadiums without
+-- sections use the default Premium/VIP/Regular bands)
+CREATE TABLE stadium_sections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stadium_id INTEGER NOT NULL,
+    seat_category VARCHAR(20) NOT NULL,
+    first_row INTEGER NOT NULL,
+    last_row INTEGER NOT NULL,
+    FOREIGN KEY (stadium_id) REFERENCES stadiums(id) ON DELETE CASCADE
+);
+CREATE INDEX ix_stadium_sections_stadium_id ON stadium_sections(stadium_id);
+
 -- Price History table
 CREATE TABLE price_history (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -98,6 +117,7 @@ CREATE TABLE price_history (
     reason VARCHAR(100),
     FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE
 );
+CREATE INDEX ix_price_history_match_id ON price_history(match_id);
 
 -- Notifications table
 CREATE TABLE notifications (
@@ -110,3 +130,85 @@ CREATE TABLE notifications (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
+CREATE INDEX ix_notifications_user_read ON notifications(user_id, is_read);
+
+-- Seat Holds table (temporary reservations between seat selection and payment)
+CREATE TABLE seat_holds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    match_id INTEGER NOT NULL,
+    seat_row INTEGER NOT NULL,
+    seat_number INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    UNIQUE(match_id, seat_row, seat_number),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE
+);
+CREATE INDEX ix_seat_holds_expires_at ON seat_holds(expires_at);
+
+-- Loyalty ledger (point events, folded into users.loyalty_points in batches)
+CREATE TABLE loyalty_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    booking_id INTEGER,
+    points INTEGER NOT NULL,
+    reason VARCHAR(50) NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    settled_at DATETIME,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE SET NULL
+);
+CREATE INDEX ix_loyalty_events_user_id ON loyalty_events(user_id);
+CREATE INDEX ix_loyalty_events_booking_id ON loyalty_events(booking_id);
+CREATE INDEX ix_loyalty_events_settled_at ON loyalty_events(settled_at);
+
+-- Open waiting-room queues shared by every worker; frontier is the
+-- admission token bucket as of updated_at (Unix seconds)
+CREATE TABLE waiting_room_queues (
+    match_id INTEGER PRIMARY KEY,
+    epoch VARCHAR(16) NOT NULL,
+    rate FLOAT NOT NULL,
+    burst INTEGER NOT NULL,
+    issued INTEGER NOT NULL DEFAULT 0,
+    frontier FLOAT NOT NULL,
+    updated_at FLOAT NOT NULL,
+    FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE
+);
+
+-- Next allowed run of periodic jobs shared by every worker
+CREATE TABLE job_leases (
+    name VARCHAR(50) PRIMARY KEY,
+    next_run_at DATETIME NOT NULL
+);
+
+-- Dashboard summary tables (folded from stat_deltas in the background)
+CREATE TABLE stat_counters (
+    name VARCHAR(50) PRIMARY KEY,
+    value FLOAT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE match_booking_stats (
+    match_id INTEGER PRIMARY KEY,
+    booking_count INTEGER NOT NULL DEFAULT 0,
+    revenue FLOAT NOT NULL DEFAULT 0,
+    FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE
+);
+CREATE INDEX ix_match_booking_stats_booking_count ON match_booking_stats(booking_count);
+
+-- Pending changes to the summary tables, folded in and deleted in batches
+CREATE TABLE stat_deltas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    match_id INTEGER,
+    users INTEGER NOT NULL DEFAULT 0,
+    matches INTEGER NOT NULL DEFAULT 0,
+    bookings INTEGER NOT NULL DEFAULT 0,
+    revenue FLOAT NOT NULL DEFAULT 0,
+    FOREIGN KEY (match_id) REFERENCES matches(id) ON DELETE CASCADE
+);
+
+-- Applied SQL/migrations files (flask migrate-db)
+CREATE TABLE schema_migrations (
+    version VARCHAR(255) PRIMARY KEY,
+    applied_at DATETIME NOT NULL
+);
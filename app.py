@@ -6,25 +6,21 @@ import os
 import logging
 
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_login import LoginManager
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-class Base(DeclarativeBase):
-    pass
-
-db = SQLAlchemy(model_class=Base)
+from extension import db
+import db_profiles
 
 # Create the app
 app = Flask(__name__)
 
 # Configuration for local development
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
 # Database configuration - Use SQLite for local development
 database_url = os.environ.get("DATABASE_URL", "sqlite:///cricketTix_local.db")
@@ -34,14 +30,24 @@ if database_url.startswith('postgres://'):
     database_url = database_url.replace('postgres://', 'postgresql://', 1)
 
 app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# Pooling, timeouts and SQLite pragmas are chosen per backend
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = db_profiles.engine_options(database_url, app.config)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Optional read replicas for browse traffic, comma separated
+replica_urls = [url.strip().replace('postgres://', 'postgresql://', 1)
+                for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+app.config["SQLALCHEMY_BINDS"] = {
+    f"replica{number}": {"url": url, **db_profiles.engine_options(url, app.config)}
+    for number, url in enumerate(replica_urls, 1)
+}
+
 # Initialize extensions
 db.init_app(app)
+db_profiles.init_app(app)
+
+from replicas import replicas
+replicas.init_app(app, db)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -50,10 +56,13 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
+from identity import identities
+identities.init_app(app)
+
 @login_manager.user_loader
 def load_user(user_id):
-    import models
-    return models.User.query.get(int(user_id))
+    # Cached snapshot (or the signed session cookie) rather than a users query
+    return identities.load_user(user_id)
 
 # Create database tables and sample data
 with app.app_context():
@@ -75,8 +84,68 @@ with app.app_context():
             membership_tier='Platinum'
         )
         db.session.add(admin)
+        db.session.flush()
+        # Seeded points go through the loyalty ledger like any other
+        db.session.add(models.LoyaltyEvent(
+            user_id=admin.id, points=1000, reason='Opening balance', settled_at=datetime.utcnow()
+        ))
         db.session.commit()
         logging.info("Admin user created: admin@cricket.com / admin123")
 
+# Request metrics, N+1 warnings and the opt-in slow request profiler
+import instrumentation
+instrumentation.init_app(app)
+
+# Pooled password hashing and sign-in throttling
+from auth_service import auth
+auth.init_app(app)
+
+# Cached anonymous pages and template fragments
+from response_cache import response_cache
+response_cache.init_app(app)
+
 # Import routes after app is configured
-import routes
\ No newline at end of file
+import routes
+
+# Booking subsystems
+import seat_holds
+seat_holds.init_app(app)
+
+from waiting_room import waiting_room
+waiting_room.init_app(app)
+
+import match_catalogue
+match_catalogue.init_app(app)
+
+import pricing
+pricing.engine.init_app(app)
+
+import dashboard_stats
+dashboard_stats.init_app(app)
+
+import finance_export
+finance_export.init_app(app)
+
+import fixture_import
+fixture_import.init_app(app)
+
+import dynamic_pricing
+dynamic_pricing.init_app(app)
+
+import loyalty
+loyalty.init_app(app)
+
+from notifications import dispatcher
+dispatcher.init_app(app)
+
+from live_score import scoreboard
+scoreboard.init_app(app)
+
+import ticket_renderer
+ticket_renderer.init_app(app)
+
+from ticket_cache import ticket_cache
+ticket_cache.init_app(app)
+
+from checkin import gate
+gate.init_app(app)
@@ -0,0 +1,224 @@
+"""
+Auth service
+Password hashing and verification run in a small process pool, so a burst
+of logins neither holds the GIL nor starves the booking routes of request
+threads. At most AUTH_HASH_WORKERS + AUTH_HASH_QUEUE hashes are in
+flight; a slot is held until its hash finishes, even when the caller gave
+up after AUTH_HASH_TIMEOUT seconds. A caller that cannot get a slot
+within AUTH_QUEUE_TIMEOUT seconds, whose hash times out, or whose pool
+lost a worker (the pool is then replaced) gets AuthBusy (503) instead of
+queueing without bound. Workers come from a forkserver (spawn where
+unavailable), as in ticket_renderer. Login and registration attempts are
+throttled per client IP, and per client IP and email pair so that nobody
+else can lock a user out, with token buckets held in process memory. A
+stored hash made with other parameters than AUTH_HASH_METHOD (Werkzeug's
+current default unless set) is replaced on the next successful login.
+"""
+import atexit
+import math
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from extension import db
+from instrumentation import metrics
+
+DEFAULT_METHOD = None           # whatever the installed Werkzeug defaults to
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE = 32              # hashes waiting beyond the ones running
+DEFAULT_QUEUE_TIMEOUT = 2.0     # seconds to wait for a slot before AuthBusy
+DEFAULT_HASH_TIMEOUT = 10
+DEFAULT_IP_RATE = 1.0           # attempts per second, refilled continuously
+DEFAULT_IP_BURST = 20
+DEFAULT_EMAIL_RATE = 0.1
+DEFAULT_EMAIL_BURST = 5
+DEFAULT_MAX_KEYS = 100000
+
+
+class AuthThrottled(Exception):
+    """Too many attempts from this client or for this email"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class AuthBusy(Exception):
+    """Every hashing slot is taken, or the hash could not be finished in time"""
+
+
+def _hash(password, method):
+    if method is None:
+        return generate_password_hash(password)
+    return generate_password_hash(password, method)
+
+
+@lru_cache(maxsize=8)
+def method_prefix(method):
+    """The part of a hash before the salt, e.g. scrypt:32768:8:1"""
+    return _hash('', method).split('$', 1)[0]
+
+
+def _verify(stored_hash, password, method, prefix):
+    """Runs in a worker: (matched, replacement hash or None)"""
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if stored_hash.split('$', 1)[0] != prefix:
+        return True, _hash(password, method)
+    return True, None
+
+
+_executor = None
+_workers = DEFAULT_WORKERS
+_pool_lock = threading.Lock()
+
+
+def _context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _pool():
+    global _executor
+    with _pool_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=_workers, mp_context=_context())
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _discard(pool):
+    """Drop a broken pool so the next call starts a fresh one"""
+    global _executor
+    with _pool_lock:
+        if _executor is pool:
+            _executor = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class RateLimiter:
+    """Token bucket per key, least recently seen keys dropped past max_keys"""
+
+    def __init__(self, rate, burst, max_keys=DEFAULT_MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Take a token for key; 0 if allowed, else seconds until one is available"""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class AuthService:
+
+    def __init__(self):
+        self.method = DEFAULT_METHOD
+        self.queue_timeout = DEFAULT_QUEUE_TIMEOUT
+        self.hash_timeout = DEFAULT_HASH_TIMEOUT
+        self.ip_limiter = RateLimiter(DEFAULT_IP_RATE, DEFAULT_IP_BURST)
+        self.email_limiter = RateLimiter(DEFAULT_EMAIL_RATE, DEFAULT_EMAIL_BURST)
+        self._slots = threading.BoundedSemaphore(DEFAULT_WORKERS + DEFAULT_QUEUE)
+
+    def init_app(self, app):
+        global _workers
+        app.config.setdefault('AUTH_HASH_METHOD', DEFAULT_METHOD)
+        app.config.setdefault('AUTH_HASH_WORKERS', DEFAULT_WORKERS)
+        app.config.setdefault('AUTH_HASH_QUEUE', DEFAULT_QUEUE)
+        app.config.setdefault('AUTH_QUEUE_TIMEOUT', DEFAULT_QUEUE_TIMEOUT)
+        app.config.setdefault('AUTH_HASH_TIMEOUT', DEFAULT_HASH_TIMEOUT)
+        app.config.setdefault('AUTH_IP_RATE', DEFAULT_IP_RATE)
+        app.config.setdefault('AUTH_IP_BURST', DEFAULT_IP_BURST)
+        app.config.setdefault('AUTH_EMAIL_RATE', DEFAULT_EMAIL_RATE)
+        app.config.setdefault('AUTH_EMAIL_BURST', DEFAULT_EMAIL_BURST)
+        _workers = app.config['AUTH_HASH_WORKERS']
+        self.method = app.config['AUTH_HASH_METHOD']
+        self.queue_timeout = app.config['AUTH_QUEUE_TIMEOUT']
+        self.hash_timeout = app.config['AUTH_HASH_TIMEOUT']
+        # With no workers hashing runs inline, still bounded by the slots
+        self._slots = threading.BoundedSemaphore(max(_workers, 1) + app.config['AUTH_HASH_QUEUE'])
+        self.ip_limiter = RateLimiter(app.config['AUTH_IP_RATE'], app.config['AUTH_IP_BURST'])
+        self.email_limiter = RateLimiter(app.config['AUTH_EMAIL_RATE'], app.config['AUTH_EMAIL_BURST'])
+        app.extensions['auth_service'] = self
+
+    def throttle(self, ip, email=None):
+        """Count an attempt; raises AuthThrottled when the IP or the IP and email pair is out of tokens"""
+        wait = self.ip_limiter.hit(ip)
+        if not wait and email:
+            wait = self.email_limiter.hit((ip, email.strip().lower()))
+        if wait:
+            metrics.inc('auth_events_total', ('throttled',))
+            raise AuthThrottled(math.ceil(wait))
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            metrics.inc('auth_events_total', ('busy',))
+            raise AuthBusy()
+        if not _workers:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+        pool = _pool()
+        try:
+            future = pool.submit(fn, *args)
+        except RuntimeError:
+            # Broken, or shut down by another thread that found it broken
+            self._slots.release()
+            _discard(pool)
+            metrics.inc('auth_events_total', ('busy',))
+            raise AuthBusy()
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot follows the hash, not the caller, so abandoned hashes still count
+        future.add_done_callback(lambda future: self._slots.release())
+        try:
+            return future.result(timeout=self.hash_timeout)
+        except BrokenProcessPool:
+            _discard(pool)
+            metrics.inc('auth_events_total', ('busy',))
+            raise AuthBusy()
+        except FutureTimeout:
+            metrics.inc('auth_events_total', ('busy',))
+            raise AuthBusy()
+
+    def hash_password(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, user, password):
+        """Check password against user's hash, upgrading the hash if it is outdated"""
+        matched, new_hash = self._run(_verify, user.password_hash, password, self.method,
+                                      method_prefix(self.method))
+        if new_hash is not None:
+            user.password_hash = new_hash
+            db.session.commit()
+            metrics.inc('auth_events_total', ('rehashed',))
+        return matched
+
+
+auth = AuthService()
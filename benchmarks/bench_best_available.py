@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark: best-available search on a 100k-seat ground
+
+Usage: python benchmarks/bench_best_available.py [--rows 250] [--seats-per-row 400]
+Measures index build, incremental refresh after a booking, and search
+latency for several block sizes on near-empty and near-sold-out maps.
+Pure in-memory; no database is needed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from seat_inventory import SeatMap
+from pricing import PriceGrid, category_prices, default_sections
+from seat_allocator import RunIndex, score_front
+
+
+def filled_map(rows, seats_per_row, booked_fraction, seed=7):
+    rng = random.Random(seed)
+    seat_map = SeatMap(rows, seats_per_row)
+    for row in range(1, rows + 1):
+        for seat in range(1, seats_per_row + 1):
+            if rng.random() < booked_fraction:
+                seat_map.set_booked(row, seat)
+    return seat_map
+
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=250)
+    parser.add_argument('--seats-per-row', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    grid = PriceGrid(0, args.rows, default_sections(args.rows), category_prices(50.0))
+    print(f"ground: {args.rows} rows x {args.seats_per_row} seats = {args.rows * args.seats_per_row:,}")
+    for label, fraction in (('near-empty', 0.02), ('half-full', 0.5), ('near-sold-out', 0.98)):
+        seat_map = filled_map(args.rows, args.seats_per_row, fraction)
+        start = time.perf_counter()
+        index = RunIndex(seat_map)
+        build = time.perf_counter() - start
+
+        # One booking, then an incremental refresh touching a single row
+        row, seat = args.rows // 2, args.seats_per_row // 2
+        seat_map.set_booked(row, seat, not seat_map.is_booked(row, seat))
+        start = time.perf_counter()
+        index.refresh()
+        refresh = time.perf_counter() - start
+
+        print(f"\n{label} ({seat_map.booked_count:,} booked): "
+              f"index build {build * 1000:.1f}ms, refresh after 1 change {refresh * 1000:.3f}ms")
+        print(f"  {'category':>8} {'n':>3} {'search (us)':>12}  result")
+        for category, rows in grid.category_rows.items():
+            for count in (2, 4, 8):
+                per_call, best = time_per_call(
+                    lambda: index.search(count, rows, score_front), args.repeat
+                )
+                found = f"row {best[1]}, seats {best[2]}-{best[2] + count - 1}" if best else 'none'
+                print(f"  {category:>8} {count:>3} {per_call * 1e6:>12.1f}  {found}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-object booking inserts vs booking_service.create_bookings
+
+Usage: python benchmarks/bench_bulk_booking.py [--sizes 10 1000 50000]
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app, db
+import models
+import booking_service
+import pricing
+
+
+def seat_list(count, seats_per_row):
+    return [(i // seats_per_row + 1, i % seats_per_row + 1) for i in range(count)]
+
+
+def new_match(stadium_id):
+    match = models.Match(
+        team1='Bench XI', team2='Bench XI', stadium_id=stadium_id,
+        match_date=datetime.utcnow() + timedelta(days=30), ticket_price=50.0
+    )
+    db.session.add(match)
+    db.session.commit()
+    return match.id
+
+
+def per_object(user_id, match_id, seats):
+    for row, seat in seats:
+        db.session.add(models.Booking(
+            user_id=user_id, match_id=match_id, seat_row=row, seat_number=seat,
+            total_amount=50.0, payment_status='completed'
+        ))
+    db.session.commit()
+
+
+def bulk(user_id, match_id, seats):
+    booking_service.create_bookings(user_id, match_id, pricing.engine.quote(match_id, seats).lines)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 50000])
+    args = parser.parse_args()
+
+    with app.app_context():
+        seats_per_row = 500
+        stadium = models.Stadium(
+            name='Bench Ground', city='Nowhere', capacity=max(args.sizes),
+            rows=max(args.sizes) // seats_per_row + 1, seats_per_row=seats_per_row
+        )
+        user = models.User(name='Bench', email=f'bench-{time.time()}@example.com', password_hash='x')
+        db.session.add_all([stadium, user])
+        db.session.commit()
+        stadium_id, user_id = stadium.id, user.id
+
+        print(f"{'seats':>8} {'per-object (s)':>15} {'bulk (s)':>10} {'speedup':>8}")
+        for size in args.sizes:
+            seats = seat_list(size, seats_per_row)
+            timings = []
+            for fn in (per_object, bulk):
+                match_id = new_match(stadium_id)
+                start = time.perf_counter()
+                fn(user_id, match_id, seats)
+                timings.append(time.perf_counter() - start)
+                db.session.expunge_all()
+            print(f"{size:>8} {timings[0]:>15.4f} {timings[1]:>10.4f} {timings[0] / timings[1]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Benchmark: SQLite default settings vs the db_profiles pragmas, and the
+lookup indexes before and after the 001 migration
+
+Usage: python benchmarks/bench_db_profiles.py [--writers 8] [--readers 8] [--seconds 10] [--bookings 300000]
+Part one runs booking writers (small transactions of a few seats) against
+seat-map readers on one SQLite file, first with the driver defaults and
+then with db_profiles.SQLITE_PRAGMAS, and reports commits, reads, latency
+and "database is locked" failures. Part two times the ticket-list,
+match-bookings and upcoming-match queries with the indexes dropped, then
+applies SQL/migrations and times them again.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import bindparam, create_engine, func, insert, select, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from extension import db
+import models
+import db_profiles
+
+SEATS_PER_ROW = 200
+ROWS = 100
+
+
+def new_engine(tuned):
+    path = os.path.join(tempfile.mkdtemp(), 'profile.db')
+    url = f'sqlite:///{path}'
+    engine = create_engine(url, **db_profiles.engine_options(url, {}))
+    if tuned:
+        db_profiles.apply_sqlite_pragmas(engine, db_profiles.SQLITE_PRAGMAS)
+    db.metadata.create_all(engine)
+    return engine
+
+
+def seed(engine, match_count, user_count, booking_count, rng):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Stadium), [{'name': 'Bench Ground', 'city': 'Nowhere', 'capacity': ROWS * SEATS_PER_ROW,
+                                               'rows': ROWS, 'seats_per_row': SEATS_PER_ROW}])
+        conn.execute(insert(models.Match), [
+            {'team1': f'Team {i}', 'team2': f'Team {i + 1}', 'stadium_id': 1, 'ticket_price': 50.0,
+             'match_date': now + timedelta(hours=rng.randint(-24 * 90, 24 * 90))}
+            for i in range(match_count)
+        ])
+        conn.execute(insert(models.User), [
+            {'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': 'x'} for i in range(user_count)
+        ])
+        capacity = ROWS * SEATS_PER_ROW
+        rows = []
+        for i in range(booking_count):
+            match_id, seat = divmod(i, capacity)
+            rows.append({'user_id': rng.randint(1, user_count), 'match_id': match_id + 2,
+                         'seat_row': seat // SEATS_PER_ROW + 1, 'seat_number': seat % SEATS_PER_ROW + 1,
+                         'total_amount': 50.0})
+            if len(rows) == 20000:
+                conn.execute(insert(models.Booking), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(models.Booking), rows)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def contention(engine, writers, readers, seconds):
+    """Writers book seats on match 1 while readers load its seat map"""
+    stats = {'commits': [], 'reads': [], 'locked': 0, 'conflicts': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    next_seat = iter(range(ROWS * SEATS_PER_ROW))
+
+    def writer(user_id):
+        while time.perf_counter() < deadline:
+            with lock:
+                seats = [next(next_seat, None) for _ in range(3)]
+            if None in seats:
+                return
+            started = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(models.Booking), [
+                        {'user_id': user_id, 'match_id': 1, 'seat_row': seat // SEATS_PER_ROW + 1,
+                         'seat_number': seat % SEATS_PER_ROW + 1, 'total_amount': 50.0}
+                        for seat in seats
+                    ])
+                    conn.execute(text('UPDATE users SET loyalty_points = loyalty_points + 150 WHERE id = :id'),
+                                 {'id': user_id})
+                stats['commits'].append(time.perf_counter() - started)
+            except OperationalError:
+                with lock:
+                    stats['locked'] += 1
+            except IntegrityError:
+                with lock:
+                    stats['conflicts'] += 1
+
+    def reader():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(select(models.Booking.seat_row, models.Booking.seat_number)
+                                 .where(models.Booking.match_id == 1)).all()
+                stats['reads'].append(time.perf_counter() - started)
+            except OperationalError:
+                with lock:
+                    stats['locked'] += 1
+
+    threads = [threading.Thread(target=writer, args=(i + 1,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+def time_query(conn, stmt, params, repeat):
+    started = time.perf_counter()
+    for value in params[:repeat]:
+        conn.execute(stmt, value).all()
+    return (time.perf_counter() - started) / repeat
+
+
+def query_plans(engine, args, rng):
+    queries = {
+        'tickets of a user': (
+            select(models.Booking.id).where(models.Booking.user_id == bindparam('uid')),
+            [{'uid': rng.randint(1, args.users)} for _ in range(200)]),
+        'bookings of a match': (
+            select(func.count(models.Booking.id)).where(models.Booking.match_id == bindparam('mid')),
+            [{'mid': rng.randint(2, 20)} for _ in range(200)]),
+        'upcoming matches': (
+            select(models.Match.id).where(models.Match.match_date > bindparam('now'))
+            .order_by(models.Match.match_date, models.Match.id).limit(20),
+            [{'now': datetime.utcnow()} for _ in range(200)]),
+    }
+    results = {}
+    with engine.connect() as conn:
+        for name, (stmt, params) in queries.items():
+            compiled = stmt.compile(engine)
+            plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}',
+                                        tuple(compiled.construct_params(params[0])[name]
+                                              for name in compiled.positiontup)).all()
+            results[name] = (time_query(conn, stmt, params, 200), ' / '.join(row[-1] for row in plan))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--bookings', type=int, default=300000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--matches', type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'commits/s':>10} {'commit p95':>11} {'reads/s':>9} {'read p95':>9} {'locked':>7}")
+    for label, tuned in (('default', False), ('tuned', True)):
+        engine = new_engine(tuned)
+        seed(engine, 2, args.writers, 0, random.Random(7))
+        stats = contention(engine, args.writers, args.readers, args.seconds)
+        print(f"{label:>8} {len(stats['commits']) / args.seconds:>10.1f} "
+              f"{percentile(stats['commits'], .95) * 1000:>9.1f}ms "
+              f"{len(stats['reads']) / args.seconds:>9.1f} {percentile(stats['reads'], .95) * 1000:>7.1f}ms "
+              f"{stats['locked']:>7}")
+        engine.dispose()
+
+    engine = new_engine(True)
+    rng = random.Random(7)
+    started = time.perf_counter()
+    seed(engine, args.matches, args.users, args.bookings, rng)
+    print(f"\nseeded {args.bookings} bookings in {time.perf_counter() - started:.1f}s")
+    with engine.begin() as conn:
+        conn.exec_driver_sql('DROP INDEX ix_bookings_user_id')
+        conn.exec_driver_sql('DROP INDEX ix_matches_date_id')
+    before = query_plans(engine, args, rng)
+    with engine.connect() as conn:
+        print(f"applied {db_profiles.apply_migrations(conn)}")
+        conn.exec_driver_sql('ANALYZE')
+    after = query_plans(engine, args, rng)
+    for name in before:
+        print(f"{name:>20}: {before[name][0] * 1000:8.3f}ms -> {after[name][0] * 1000:8.3f}ms")
+        print(f"{'':>20}  before: {before[name][1]}")
+        print(f"{'':>20}  after:  {after[name][1]}")
+
+
+if __name__ == '__main__':
+    main()
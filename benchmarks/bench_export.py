@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: streamed finance export vs building the file in memory
+
+Usage: python benchmarks/bench_export.py [--bookings 1000000] [--batch-size 5000]
+Bulk seeds bookings, then exports them as CSV through finance_export
+(yield_per partitions, one chunk per partition) and reports rows per
+second, first-chunk latency and peak RSS. The naive version (all rows
+fetched, then one CSV string) runs second, since peak RSS only grows.
+On SQLite, RSS includes pages touched through the 256MB mmap of the
+database file.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'export.db')
+
+from sqlalchemy import insert
+
+from app import app, db
+import finance_export
+import models
+
+SEATS_PER_ROW = 200
+ROWS = 100
+CHUNK = 20000
+
+
+def seed(bookings, users, rng):
+    now = datetime.utcnow()
+    capacity = ROWS * SEATS_PER_ROW
+    matches = bookings // capacity + 1
+    db.session.execute(insert(models.Stadium), [{'name': 'Export Ground', 'city': 'Nowhere', 'capacity': capacity,
+                                                 'rows': ROWS, 'seats_per_row': SEATS_PER_ROW}])
+    db.session.execute(insert(models.Match), [
+        {'team1': f'Team {i}', 'team2': f'Team {i + 1}', 'stadium_id': 1, 'ticket_price': 50.0,
+         'tournament': 'Bench Cup', 'match_date': now + timedelta(days=i)}
+        for i in range(matches)
+    ])
+    db.session.execute(insert(models.User), [
+        {'name': f'User {i}', 'email': f'export{i}@bench.example.com', 'password_hash': 'x'} for i in range(users)
+    ])
+    rows = []
+    for i in range(bookings):
+        match_index, seat = divmod(i, capacity)
+        rows.append({'user_id': rng.randint(2, users + 1), 'match_id': match_index + 1,
+                     'seat_row': seat // SEATS_PER_ROW + 1, 'seat_number': seat % SEATS_PER_ROW + 1,
+                     'total_amount': 50.0, 'booking_date': now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))})
+        if len(rows) == CHUNK:
+            # Commit per chunk so the seat-hold sweeper is not locked out
+            db.session.execute(insert(models.Booking), rows)
+            db.session.commit()
+            rows = []
+    if rows:
+        db.session.execute(insert(models.Booking), rows)
+    db.session.commit()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def streamed(batch_size):
+    started = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in finance_export.export('csv', batch_size):
+        if first is None:
+            first = time.perf_counter() - started
+        size += len(chunk)
+    return time.perf_counter() - started, first, size
+
+
+def materialized():
+    started = time.perf_counter()
+    rows = db.session.execute(finance_export.export_query()).all()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name for name, _, _ in finance_export.COLUMNS)
+    writer.writerows(rows)
+    data = buffer.getvalue().encode()
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=finance_export.DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        seed(args.bookings, args.users, random.Random(7))
+        print(f"seeded {args.bookings} bookings in {time.perf_counter() - started:.1f}s, "
+              f"peak RSS {peak_rss_mb():.0f}MB")
+        db.session.remove()
+        baseline = peak_rss_mb()
+        print(f"{'export':>13} {'rows/s':>9} {'first chunk':>12} {'MB out':>7} {'peak RSS':>9}")
+        for label, run in (('streamed', lambda: streamed(args.batch_size)), ('materialized', materialized)):
+            elapsed, first, size = run()
+            db.session.remove()
+            print(f"{label:>13} {args.bookings / elapsed:>9.0f} {first * 1000:>10.0f}ms {size / 1e6:>7.1f} "
+                  f"{peak_rss_mb():>7.0f}MB")
+        print(f"(RSS before exporting: {baseline:.0f}MB)")
+
+
+if __name__ == '__main__':
+    main()
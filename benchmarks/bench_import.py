@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bulk fixture import vs one ORM object per fixture
+
+Usage: python benchmarks/bench_import.py [--fixtures 100000] [--venues 200] [--orm-sample 2000]
+Writes a CSV schedule whose first row at each venue also carries the
+stadium layout, then times fixture_import on it three times: a fresh
+import, the same file again (all unchanged) and a copy with every price
+moved (all updates). For comparison, a sample is added the way add_match
+does it (one Match, one commit) and the rate extrapolated.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'import.db')
+
+from app import app, db
+import fixture_import
+import models
+
+HEADER = 'team1,team2,match_date,stadium,city,ticket_price,vip_price,premium_price,tournament,match_type,rows,seats_per_row\n'
+TEAMS = ('India', 'Australia', 'England', 'Pakistan', 'South Africa', 'New Zealand', 'Sri Lanka', 'West Indies',
+         'Bangladesh', 'Afghanistan', 'Ireland', 'Zimbabwe')
+
+
+def schedule(fixtures, venues, rng, price_shift=0):
+    lines = [HEADER]
+    start = datetime(2030, 1, 1, 10, 0)
+    for i in range(fixtures):
+        venue = i % venues
+        team1, team2 = rng.sample(TEAMS, 2)
+        layout = '40,50' if i < venues else ','
+        price = 40 + i % 50 + price_shift
+        lines.append(f'{team1},{team2},{start + timedelta(hours=i):%Y-%m-%dT%H:%M},Venue {venue},City {venue},'
+                     f'{price},{price * 2},{price * 3},Bench Cup,T20,{layout}\n')
+    return ''.join(lines).encode()
+
+
+def timed_import(data):
+    with app.app_context():
+        return fixture_import.import_fixtures(fixture_import.read_rows(io.BytesIO(data), 'csv'))
+
+
+def orm_sample(count):
+    with app.app_context():
+        stadium_id = db.session.scalar(db.select(models.Stadium.id).limit(1))
+        started = time.perf_counter()
+        for i in range(count):
+            db.session.add(models.Match(team1='ORM A', team2='ORM B', stadium_id=stadium_id, ticket_price=50.0,
+                                        match_date=datetime(2040, 1, 1) + timedelta(hours=i)))
+            db.session.commit()
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fixtures', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--orm-sample', type=int, default=2000)
+    args = parser.parse_args()
+
+    data = schedule(args.fixtures, args.venues, random.Random(7))
+    shifted = schedule(args.fixtures, args.venues, random.Random(7), price_shift=5)
+    print(f"{args.fixtures} fixtures at {args.venues} venues, {len(data) / 1e6:.1f}MB of CSV")
+    for label, payload in (('fresh', data), ('unchanged', data), ('repriced', shifted)):
+        report = timed_import(payload)
+        print(f"{label:>10}: {report['seconds']:6.2f}s {args.fixtures / report['seconds']:>9.0f} rows/s  "
+              f"{fixture_import.summary(report)}")
+
+    elapsed = orm_sample(args.orm_sample)
+    rate = args.orm_sample / elapsed
+    print(f"{'orm':>10}: {args.orm_sample} in {elapsed:.2f}s, {rate:.0f} rows/s "
+          f"(~{args.fixtures / rate:.0f}s for {args.fixtures})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: login throughput with password hashing inline vs in the auth pool
+
+Usage: python benchmarks/bench_login.py [--clients 16] [--seconds 10] [--workers 4] [--queue 32]
+Client threads post /login in a loop through the Flask test client while
+one bystander thread loads /matches, first with AUTH_HASH_WORKERS=0 (hash
+checked in the request thread) and then with the process pool. Reports
+logins per second, login p50/p95, bystander p95 and the requests turned
+away with 503. Throttling is switched off so only hashing is measured.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'login.db')
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import app, db
+from auth_service import auth
+import models
+
+PASSWORD = 'bench-login'
+
+
+def seed(count):
+    password_hash = generate_password_hash(PASSWORD)
+    with app.app_context():
+        db.session.execute(insert(models.User), [
+            {'name': f'Login {i}', 'email': f'login{i}@bench.example.com', 'password_hash': password_hash}
+            for i in range(count)
+        ])
+        db.session.commit()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def run(args, workers):
+    app.config['AUTH_HASH_WORKERS'] = workers
+    app.config['AUTH_HASH_QUEUE'] = args.queue
+    auth.init_app(app)
+    auth.ip_limiter.rate = None
+    auth.email_limiter.rate = None
+    if workers:
+        # Start the pool before the clock does
+        auth.hash_password('warm up')
+
+    stats = {'logins': [], 'busy': 0, 'failed': 0, 'bystander': []}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def client(i):
+        email = f'login{i}@bench.example.com'
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = app.test_client().post('/login', data={'email': email, 'password': PASSWORD}).status_code
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status == 302:
+                    stats['logins'].append(elapsed)
+                elif status == 503:
+                    stats['busy'] += 1
+                else:
+                    stats['failed'] += 1
+
+    def bystander():
+        browser = app.test_client()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            browser.get('/matches')
+            stats['bystander'].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    threads.append(threading.Thread(target=bystander))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--queue', type=int, default=32)
+    args = parser.parse_args()
+
+    seed(args.clients)
+    print(f"{args.clients} clients, {os.cpu_count()} CPUs, {args.seconds:.0f}s per run")
+    print(f"{'hashing':>12} {'logins/s':>9} {'p50':>9} {'p95':>9} {'/matches p95':>13} {'503s':>6} {'failed':>7}")
+    for label, workers in (('inline', 0), (f'pool x{args.workers}', args.workers)):
+        stats = run(args, workers)
+        print(f"{label:>12} {len(stats['logins']) / args.seconds:>9.1f} "
+              f"{percentile(stats['logins'], .5) * 1000:>7.0f}ms {percentile(stats['logins'], .95) * 1000:>7.0f}ms "
+              f"{percentile(stats['bystander'], .95) * 1000:>11.0f}ms {stats['busy']:>6} {stats['failed']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dynamic pricing run over thousands of upcoming fixtures
+
+Usage: python benchmarks/bench_reprice.py [--matches 5000] [--bookings 200000]
+Seeds matches and bookings with bulk inserts, then times reprice() (query,
+compute and write phases) on a cold and an already-repriced table.
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import insert
+
+from app import app, db
+import models
+import dynamic_pricing
+
+
+def seed(match_count, booking_count, rng):
+    rows, seats_per_row = 100, 200
+    stadium = models.Stadium(name='Bench Ground', city='Nowhere', capacity=rows * seats_per_row,
+                             rows=rows, seats_per_row=seats_per_row)
+    user = models.User(name='Bench', email=f'bench-{time.time()}@example.com', password_hash='x')
+    db.session.add_all([stadium, user])
+    db.session.commit()
+
+    now = datetime.utcnow()
+    match_ids = db.session.execute(insert(models.Match).returning(models.Match.id), [
+        {
+            'team1': f'Team {i}', 'team2': f'Team {i + 1}', 'stadium_id': stadium.id,
+            'match_date': now + timedelta(hours=rng.randint(2, 24 * 60)), 'status': 'Upcoming',
+            'ticket_price': 50.0, 'vip_price': 120.0, 'premium_price': 250.0,
+        }
+        for i in range(match_count)
+    ]).scalars().all()
+    db.session.execute(insert(models.PriceHistory), [
+        {'match_id': match_id, 'seat_category': category, 'price': price, 'reason': 'Initial price'}
+        for match_id in match_ids
+        for category, price in (('Regular', 50.0), ('VIP', 120.0), ('Premium', 250.0))
+    ])
+
+    # Skewed demand: a few hot fixtures take most of the bookings
+    weights = [1 / (rank + 1) for rank in range(match_count)]
+    per_match = {}
+    for match_id in rng.choices(match_ids, weights, k=booking_count):
+        per_match[match_id] = per_match.get(match_id, 0) + 1
+    bookings = []
+    for match_id, count in per_match.items():
+        for i in range(min(count, rows * seats_per_row)):
+            bookings.append({
+                'user_id': user.id, 'match_id': match_id,
+                'seat_row': i // seats_per_row + 1, 'seat_number': i % seats_per_row + 1,
+                'total_amount': 50.0, 'booking_date': now - timedelta(hours=rng.randint(0, 24 * 14)),
+            })
+    for start in range(0, len(bookings), 20000):
+        db.session.execute(insert(models.Booking), bookings[start:start + 20000])
+    db.session.commit()
+    return len(bookings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--matches', type=int, default=5000)
+    parser.add_argument('--bookings', type=int, default=200000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        start = time.perf_counter()
+        booked = seed(args.matches, args.bookings, random.Random(7))
+        print(f"seeded {args.matches} matches, {booked} bookings in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'run':>10} {'matches':>8} {'repriced':>9} {'query':>9} {'compute':>9} {'write':>9} {'total':>9}")
+        for label, dry_run in (('dry run', True), ('first', False), ('second', False)):
+            report = dynamic_pricing.reprice(dry_run=dry_run)
+            t = report['timings']
+            print(f"{label:>10} {report['matches']:>8} {report['repriced']:>9} "
+                  f"{t['query'] * 1000:>7.1f}ms {t['compute'] * 1000:>7.1f}ms "
+                  f"{t['write'] * 1000:>7.1f}ms {t['total'] * 1000:>7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: anonymous page requests with the response cache off, in memory
+and on disk
+
+Usage: python benchmarks/bench_response_cache.py [--matches 500] [--requests 2000]
+Seeds upcoming matches, then requests /, /matches and a few filtered
+/matches pages round-robin through the Flask test client for each
+backend, and reports requests per second and p50/p95. A final pass sends
+If-None-Match with the ETag of the first response to time 304s.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pages.db')
+
+from sqlalchemy import insert
+
+from app import app, db
+from response_cache import response_cache, MemoryBackend, DiskBackend
+import models
+
+TOURNAMENTS = ('World Cup', 'Asia Cup', 'Ashes', 'IPL')
+CITIES = ('Melbourne', 'Mumbai', 'London', 'Cape Town')
+
+
+def seed(count):
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(insert(models.Stadium), [
+            {'name': f'Bench Ground {city}', 'city': city, 'capacity': 20000, 'rows': 100, 'seats_per_row': 200}
+            for city in CITIES
+        ])
+        db.session.execute(insert(models.Match), [
+            {'team1': f'Team {i}', 'team2': f'Team {i + 1}', 'stadium_id': i % len(CITIES) + 1,
+             'match_date': now + timedelta(hours=i + 1), 'ticket_price': 50.0,
+             'tournament': TOURNAMENTS[i % len(TOURNAMENTS)], 'match_type': 'T20'}
+            for i in range(count)
+        ])
+        db.session.commit()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def run(paths, count, conditional=False):
+    client = app.test_client()
+    etags = {path: client.get(path).headers.get('ETag') for path in paths}
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        path = paths[i % len(paths)]
+        headers = {'If-None-Match': etags[path]} if conditional else {}
+        mark = time.perf_counter()
+        client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - mark)
+    return count / (time.perf_counter() - started), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--matches', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    seed(args.matches)
+    paths = ['/', '/matches'] + [f'/matches?city={city}' for city in CITIES] \
+        + [f'/matches?tournament={name}' for name in TOURNAMENTS]
+    directory = tempfile.mkdtemp()
+    print(f"{'backend':>10} {'req/s':>8} {'p50':>8} {'p95':>8}")
+    for label, backend, conditional in (('off', None, False), ('memory', MemoryBackend(), False),
+                                        ('disk', DiskBackend(directory), False), ('memory 304', MemoryBackend(), True)):
+        response_cache.backend = backend
+        rate, latencies = run(paths, args.requests, conditional)
+        print(f"{label:>10} {rate:>8.0f} {percentile(latencies, .5) * 1000:>6.2f}ms "
+              f"{percentile(latencies, .95) * 1000:>6.2f}ms")
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Load test: fake ball-by-ball feed fanned out to many SSE viewers
+
+Usage: python benchmarks/fake_score_feed.py [--matches 4] [--viewers 2000] [--rate 20] [--seconds 10]
+Seeds live matches, starts the asyncio broadcaster on a local port, opens
+the viewer connections, then posts random deliveries to the ingest
+endpoint at the given rate (balls per second across all matches) and
+reports how long each ball took to reach every viewer.
+With --url, only the feed runs, posting to a real server with --feed-key.
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FEED_KEY = 'load-test-feed-key'
+OUTCOMES = [0] * 30 + [1] * 25 + [2] * 8 + [3] + [4] * 10 + [6] * 4
+
+
+class Feed:
+    """Random deliveries per match, numbered so replays are detectable"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.seq = {}
+
+    def ball(self, match_id):
+        seq = self.seq[match_id] = self.seq.get(match_id, 0) + 1
+        roll = self.rng.random()
+        if roll < 0.04:
+            update = {'wicket': True, 'commentary': 'OUT! Taken in the deep.'}
+        elif roll < 0.08:
+            update = {'extra': self.rng.choice(['wd', 'nb'])}
+        else:
+            runs = self.rng.choice(OUTCOMES)
+            update = {'runs': runs, 'commentary': f'{runs} run{"s" if runs != 1 else ""}.'}
+        update['seq'] = seq
+        return update
+
+
+def post_http(url, match_id, update, feed_key):
+    request = urllib.request.Request(
+        url.rstrip('/') + f'/api/matches/{match_id}/live',
+        data=json.dumps(update).encode(), method='POST',
+        headers={'Content-Type': 'application/json', 'X-Feed-Key': feed_key},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
+
+
+def run_feed(post, match_ids, rate, seconds, rng):
+    """Post balls round-robin across matches at rate per second; returns ingest latencies"""
+    feed = Feed(rng)
+    latencies = []
+    interval = 1 / rate
+    deadline = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    i = 0
+    while time.perf_counter() < deadline:
+        match_id = match_ids[i % len(match_ids)]
+        started = time.perf_counter()
+        post(match_id, feed.ball(match_id))
+        latencies.append(time.perf_counter() - started)
+        i += 1
+        next_at += interval
+        time.sleep(max(0, next_at - time.perf_counter()))
+    return latencies
+
+
+async def viewer(port, match_id, delays, connected):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET /live/{match_id} HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n'.encode())
+    await writer.drain()
+    connected.append(match_id)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b'data: '):
+                score = json.loads(line[6:])
+                if score.get('updated_at'):
+                    sent = datetime.fromisoformat(score['updated_at'])
+                    delays.append((datetime.utcnow() - sent).total_seconds())
+    finally:
+        writer.close()
+
+
+def run_viewers(port, match_ids, count, delays, connected, stop):
+    async def main():
+        tasks = [asyncio.create_task(viewer(port, match_ids[i % len(match_ids)], delays, connected))
+                 for i in range(count)]
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    asyncio.run(main())
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def report(label, values):
+    print(f"{label:>18}: n={len(values):<8} p50={percentile(values, .5) * 1000:7.2f}ms "
+          f"p99={percentile(values, .99) * 1000:7.2f}ms max={max(values, default=0) * 1000:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--matches', type=int, default=4)
+    parser.add_argument('--viewers', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=20, help='balls per second across all matches')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--port', type=int, default=8765, help='broadcaster port for the in-process run')
+    parser.add_argument('--url', help='post to a running server instead, e.g. http://localhost:5000')
+    parser.add_argument('--match-ids', help='comma-separated match ids to score (with --url)')
+    parser.add_argument('--feed-key', default=FEED_KEY)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    if args.url:
+        match_ids = [int(match_id) for match_id in (args.match_ids or '1').split(',')]
+        latencies = run_feed(lambda mid, update: post_http(args.url, mid, update, args.feed_key),
+                             match_ids, args.rate, args.seconds, rng)
+        report('ingest', latencies)
+        return
+
+    if 'DATABASE_URL' not in os.environ:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'live.db')
+
+    from app import app, db
+    import models
+    import routes  # noqa: F401  (registers the ingest endpoint)
+    from live_score import scoreboard
+
+    app.config['LIVE_SCORE_FEED_KEY'] = args.feed_key
+    scoreboard.broadcaster.start('127.0.0.1', args.port)
+    if scoreboard.broadcaster.loop is None:
+        sys.exit(f"could not start the broadcaster on port {args.port}")
+
+    with app.app_context():
+        stadium = models.Stadium(name='Feed Oval', city='Nowhere', capacity=1000, rows=10, seats_per_row=100)
+        db.session.add(stadium)
+        db.session.flush()
+        matches = [
+            models.Match(team1=f'Team {i}', team2=f'Team {i + 1}', stadium_id=stadium.id,
+                         match_date=datetime.utcnow(), ticket_price=50.0, status='Live')
+            for i in range(args.matches)
+        ]
+        db.session.add_all(matches)
+        db.session.commit()
+        match_ids = [match.id for match in matches]
+
+    delays, connected = [], []
+    stop = threading.Event()
+    viewers = threading.Thread(target=run_viewers,
+                               args=(args.port, match_ids, args.viewers, delays, connected, stop))
+    viewers.start()
+    while len(connected) < args.viewers and viewers.is_alive():
+        time.sleep(0.05)
+    time.sleep(0.5)
+    print(f"{len(connected)} viewers on {args.matches} matches, "
+          f"{scoreboard.broadcaster.viewer_count()} registered with the broadcaster")
+    delays.clear()
+
+    client = app.test_client()
+    headers = {'X-Feed-Key': args.feed_key}
+    latencies = run_feed(lambda mid, update: client.post(f'/api/matches/{mid}/live', json=update, headers=headers),
+                         match_ids, args.rate, args.seconds, rng)
+    time.sleep(1)
+    stop.set()
+    viewers.join()
+
+    balls = len(latencies)
+    expected = balls * args.viewers // args.matches
+    report('ingest', latencies)
+    report('ball -> viewer', delays)
+    print(f"{balls} balls, {len(delays)} deliveries of ~{expected} expected")
+    with app.app_context():
+        stored = db.session.get(models.Match, match_ids[0]).get_live_score()
+    print(f"match {match_ids[0]} in memory: {scoreboard.peek(match_ids[0])['overs']} overs, "
+          f"persisted: {stored.get('overs', '-')} overs (flushed every {app.config['LIVE_SCORE_FLUSH_INTERVAL']}s)")
+
+
+if __name__ == '__main__':
+    main()
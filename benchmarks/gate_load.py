@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Load test: concurrent gate scanners against /gate/check_in
+
+Usage: python benchmarks/gate_load.py [--tickets 20000] [--gates 16] [--batch 1]
+Seeds one match with signed tickets, then every gate thread scans its
+share of them (plus a few duplicates and forgeries) through the real app.
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'gate.db')
+
+from sqlalchemy import func, select
+
+from app import app, db
+import models
+import booking_service
+import pricing
+
+GATE_KEY = 'load-test-gate-key'
+
+
+def seed(tickets):
+    seats_per_row = 200
+    stadium = models.Stadium(
+        name='Load Test Oval', city='Nowhere', capacity=tickets,
+        rows=tickets // seats_per_row + 1, seats_per_row=seats_per_row
+    )
+    user = models.User(name='Gate Load', email=f'gate-{time.time()}@example.com', password_hash='x')
+    db.session.add_all([stadium, user])
+    db.session.commit()
+    match = models.Match(
+        team1='Home', team2='Away', stadium_id=stadium.id,
+        match_date=datetime.utcnow() + timedelta(hours=1), ticket_price=40.0
+    )
+    db.session.add(match)
+    db.session.commit()
+    seats = [(i // seats_per_row + 1, i % seats_per_row + 1) for i in range(tickets)]
+    booking_service.create_bookings(user.id, match.id, pricing.engine.quote(match.id, seats).lines)
+    db.session.commit()
+    codes = db.session.scalars(select(models.Booking.qr_code).where(models.Booking.match_id == match.id)).all()
+    return match.id, codes
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=20000)
+    parser.add_argument('--gates', type=int, default=16)
+    parser.add_argument('--batch', type=int, default=1, help='codes per request')
+    parser.add_argument('--preload', action='store_true', help='fetch the offline manifest first')
+    args = parser.parse_args()
+
+    app.config['GATE_API_KEY'] = GATE_KEY
+    headers = {'X-Gate-Key': GATE_KEY}
+    with app.app_context():
+        match_id, codes = seed(args.tickets)
+
+    if args.preload:
+        start = time.perf_counter()
+        app.test_client().get(f'/gate/matches/{match_id}/manifest', headers=headers)
+        print(f"manifest preload: {time.perf_counter() - start:.3f}s")
+
+    # Each gate scans a disjoint slice, with 2% re-scans and 1% forgeries mixed in
+    random.shuffle(codes)
+    slices = [codes[i::args.gates] for i in range(args.gates)]
+    for scans in slices:
+        scans += random.sample(scans, max(1, len(scans) // 50))
+        scans += [code[:-4] + 'AAAA' for code in random.sample(scans, max(1, len(scans) // 100))]
+        random.shuffle(scans)
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def run_gate(scans):
+        client = app.test_client()
+        local_latencies = []
+        local_statuses = {}
+        for i in range(0, len(scans), args.batch):
+            batch = scans[i:i + args.batch]
+            start = time.perf_counter()
+            response = client.post('/gate/check_in', json={'codes': batch, 'match_id': match_id}, headers=headers)
+            local_latencies.append(time.perf_counter() - start)
+            for status in response.get_json()['results']:
+                local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=run_gate, args=(scans,)) for scans in slices]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total_scans = sum(statuses.values())
+    print(f"gates={args.gates} scans={total_scans} elapsed={elapsed:.2f}s "
+          f"throughput={total_scans / elapsed:,.0f} scans/s")
+    print(f"latency per request: p50={percentile(latencies, 50) * 1000:.2f}ms "
+          f"p95={percentile(latencies, 95) * 1000:.2f}ms p99={percentile(latencies, 99) * 1000:.2f}ms "
+          f"mean={statistics.mean(latencies) * 1000:.2f}ms")
+    print(f"results: {statuses}")
+
+    # Wait for the batched writer to drain, then confirm every ticket was recorded
+    writer = app.extensions['checkin_gate'].writer
+    drain_start = time.perf_counter()
+    while writer.queue.qsize():
+        time.sleep(0.05)
+    time.sleep(app.config['CHECKIN_FLUSH_INTERVAL'] * 2)
+    with app.app_context():
+        recorded = db.session.scalar(
+            select(func.count(models.Booking.id))
+            .where(models.Booking.match_id == match_id, models.Booking.check_in_time.isnot(None))
+        )
+    print(f"check-ins persisted: {recorded}/{args.tickets} "
+          f"(writer drained {time.perf_counter() - drain_start:.2f}s after last scan)")
+
+
+if __name__ == '__main__':
+    main()
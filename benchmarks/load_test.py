@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Load test: virtual users through the whole booking flow
+
+Usage: python benchmarks/load_test.py [--stadiums 4] [--max-seats 100000] [--matches 2000]
+           [--bookings 1000000] [--users 20000] [--vus 16] [--duration 30]
+           [--output results.json] [--compare baseline.json]
+Bulk-seeds stadiums, matches, users and bookings, then runs concurrent
+virtual users through /matches -> /seats -> best_available -> /book_seats
+-> /process_payment -> /tickets -> /download_ticket, mostly on a few hot
+matches so seat conflicts actually happen. Reports throughput, latency
+percentiles per step and conflict rates, and writes them as JSON (with
+the git commit) so runs can be compared with --compare.
+Drives the app in process through test clients, or a running server with
+--url (seed its DATABASE_URL, or pass --skip-seed if already seeded).
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash
+
+from app import app, db
+from auth_service import auth
+import models
+
+SEATS_PER_ROW = 200
+VU_PASSWORD = 'load-test'
+VU_EMAIL = 'vu{}@loadtest.example.com'
+STADIUM_PREFIX = 'Load Test Ground'
+CHUNK = 20000
+STEPS = ('login', 'matches', 'seats', 'best_available', 'book_seats', 'process_payment',
+         'tickets', 'download_ticket')
+CATEGORIES = ('Regular', 'Regular', 'Regular', 'VIP', 'Premium')
+
+
+def seed(args, rng):
+    """Bulk insert the dataset; returns (hot match ids, VU emails, timings)"""
+    timings = {}
+    started = time.perf_counter()
+    stadiums = []
+    for i in range(args.stadiums):
+        capacity = max(SEATS_PER_ROW, args.max_seats * (i + 1) // args.stadiums)
+        rows = capacity // SEATS_PER_ROW
+        stadiums.append({'name': f'{STADIUM_PREFIX} {i + 1}', 'city': rng.choice(['Mumbai', 'Melbourne', 'London']),
+                         'capacity': rows * SEATS_PER_ROW, 'rows': rows, 'seats_per_row': SEATS_PER_ROW})
+    stadium_ids = db.session.execute(insert(models.Stadium).returning(models.Stadium.id), stadiums).scalars().all()
+    rows_of = {stadium_id: stadium['rows'] for stadium_id, stadium in zip(stadium_ids, stadiums)}
+
+    now = datetime.utcnow()
+    matches = [
+        {'team1': f'Team {i % 20}', 'team2': f'Team {(i + 7) % 20}', 'stadium_id': stadium_ids[i % len(stadium_ids)],
+         'match_date': now + timedelta(hours=2 + i), 'match_type': rng.choice(['T20', 'ODI', 'Test']),
+         'tournament': 'Load Test Cup', 'ticket_price': 50.0, 'vip_price': 120.0, 'premium_price': 250.0,
+         'status': 'Upcoming'}
+        for i in range(args.matches)
+    ]
+    match_ids = db.session.execute(insert(models.Match).returning(models.Match.id), matches).scalars().all()
+    timings['stadiums_matches'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    password_hash = generate_password_hash(VU_PASSWORD)
+    emails = [VU_EMAIL.format(i) for i in range(args.users)]
+    for start in range(0, len(emails), CHUNK):
+        db.session.execute(insert(models.User), [
+            {'name': f'Load User {start + i}', 'email': email, 'password_hash': password_hash}
+            for i, email in enumerate(emails[start:start + CHUNK])
+        ])
+    first_user = db.session.scalar(select(models.User.id).where(models.User.email == emails[0]))
+    timings['users'] = time.perf_counter() - started
+
+    # Hot matches start empty so virtual users compete for their seats;
+    # the rest share the seeded bookings, filled front to back
+    started = time.perf_counter()
+    hot = match_ids[:args.hot_matches]
+    cold = [(match_id, rows_of[matches[i]['stadium_id']] * SEATS_PER_ROW)
+            for i, match_id in enumerate(match_ids) if match_id not in hot]
+    per_match = math.ceil(args.bookings / max(len(cold), 1))
+    batch = []
+    booked = 0
+    remaining = args.bookings
+    for match_id, capacity in cold:
+        count = min(per_match, capacity, remaining)
+        remaining -= count
+        for seat in range(count):
+            batch.append({
+                'user_id': first_user + rng.randrange(args.users), 'match_id': match_id,
+                'seat_row': seat // SEATS_PER_ROW + 1, 'seat_number': seat % SEATS_PER_ROW + 1,
+                'total_amount': 50.0, 'loyalty_points_earned': 50,
+                'booking_date': now - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+            })
+            if len(batch) == CHUNK:
+                db.session.execute(insert(models.Booking), batch)
+                booked += len(batch)
+                batch = []
+    if batch:
+        db.session.execute(insert(models.Booking), batch)
+        booked += len(batch)
+    db.session.commit()
+    timings['bookings'] = time.perf_counter() - started
+    return hot, emails, {'stadiums': len(stadium_ids), 'matches': len(match_ids), 'users': len(emails),
+                         'bookings': booked, 'timings': timings}
+
+
+def existing_dataset(args):
+    hot = db.session.execute(
+        select(models.Match.id).join(models.Stadium)
+        .where(models.Stadium.name.startswith(STADIUM_PREFIX))
+        .order_by(models.Match.id).limit(args.hot_matches)
+    ).scalars().all()
+    if not hot:
+        sys.exit('no seeded load test data found; run without --skip-seed first')
+    return hot, [VU_EMAIL.format(i) for i in range(args.users)], {'reused': True}
+
+
+class AppClient:
+    """In-process client around the Flask test client"""
+
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None, payload=None):
+        response = self.client.open(path, method=method, data=form, json=payload)
+        return response.status_code, response.headers.get('Location', ''), response.get_data()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpClient:
+    """Cookie-keeping client for a running server; redirects are not followed"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect
+        )
+
+    def request(self, method, path, form=None, payload=None):
+        body, headers = None, {}
+        if form is not None:
+            body = urllib.parse.urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif payload is not None:
+            body = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                return response.status, response.headers.get('Location', ''), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Location', ''), e.read()
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+
+    def timed(self, client, step, method, path, expect, **kwargs):
+        started = time.perf_counter()
+        status, location, body = client.request(method, path, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.latencies[step].append(elapsed)
+            if status not in expect:
+                self.errors[step] += 1
+        return (status, location, body) if status in expect else None
+
+    def outcome(self, name):
+        with self._lock:
+            self.outcomes[name] += 1
+
+
+def virtual_user(client, email, hot, args, results, deadline, rng):
+    if not results.timed(client, 'login', 'POST', '/login', (302,),
+                         form={'email': email, 'password': VU_PASSWORD}):
+        return
+    while time.perf_counter() < deadline:
+        match_id = rng.choice(hot)
+        if not results.timed(client, 'matches', 'GET', '/matches', (200,)):
+            continue
+        if not results.timed(client, 'seats', 'GET', f'/seats/{match_id}', (200,)):
+            continue
+        count = rng.randint(1, args.max_party)
+        found = results.timed(client, 'best_available', 'GET',
+                              f'/matches/{match_id}/best_available?count={count}&category={rng.choice(CATEGORIES)}',
+                              (200,))
+        if not found:
+            continue
+        offer = json.loads(found[2])
+        if not offer.get('success'):
+            results.outcome('sold_out')
+            continue
+        held = results.timed(client, 'book_seats', 'POST', '/book_seats', (200,),
+                             payload={'match_id': match_id, 'seats': offer['seats']})
+        if not held:
+            continue
+        if not json.loads(held[2]).get('success'):
+            # Someone else held one of the offered seats first
+            results.outcome('hold_conflict')
+            continue
+        results.outcome('held')
+        paid = results.timed(client, 'process_payment', 'POST', '/process_payment', (302,))
+        if not paid:
+            continue
+        if not paid[1].endswith('/tickets'):
+            results.outcome('payment_conflict')
+            continue
+        results.outcome('booked')
+        listing = results.timed(client, 'tickets', 'GET', '/tickets', (200,))
+        if not listing:
+            continue
+        booking_ids = [int(found) for found in re.findall(rb'/download_ticket/(\d+)', listing[2])]
+        if booking_ids:
+            results.timed(client, 'download_ticket', 'GET', f'/download_ticket/{max(booking_ids)}', (200,))
+        results.outcome('completed')
+        if args.think:
+            time.sleep(rng.uniform(0, 2 * args.think))
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else None
+
+
+def summarise(results, elapsed):
+    steps = {}
+    for step in STEPS:
+        ordered = sorted(results.latencies.get(step, ()))
+        steps[step] = {
+            'requests': len(ordered),
+            'errors': results.errors[step],
+            'p50_ms': ordered and round(percentile(ordered, .50) * 1000, 2),
+            'p95_ms': ordered and round(percentile(ordered, .95) * 1000, 2),
+            'p99_ms': ordered and round(percentile(ordered, .99) * 1000, 2),
+            'max_ms': ordered and round(ordered[-1] * 1000, 2),
+        }
+    outcomes = results.outcomes
+    attempts = outcomes['held'] + outcomes['hold_conflict']
+    requests = sum(len(values) for values in results.latencies.values())
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'requests': requests,
+        'requests_per_s': round(requests / elapsed, 1),
+        'bookings_per_s': round(outcomes['booked'] / elapsed, 1),
+        'outcomes': dict(outcomes),
+        'hold_conflict_rate': round(outcomes['hold_conflict'] / attempts, 4) if attempts else 0.0,
+        'payment_conflict_rate': round(outcomes['payment_conflict'] / outcomes['held'], 4) if outcomes['held'] else 0.0,
+        'error_rate': round(sum(results.errors.values()) / requests, 4) if requests else 0.0,
+        'steps': steps,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(summary, baseline=None):
+    print(f"\n{summary['requests']} requests in {summary['elapsed_s']}s: "
+          f"{summary['requests_per_s']} req/s, {summary['bookings_per_s']} bookings/s, "
+          f"hold conflicts {summary['hold_conflict_rate']:.1%}, "
+          f"payment conflicts {summary['payment_conflict_rate']:.1%}, errors {summary['error_rate']:.2%}")
+    print(f"{'step':>16} {'requests':>9} {'errors':>7} {'p50':>9} {'p95':>9} {'p99':>9}"
+          + (f" {'p95 vs base':>12}" if baseline else ''))
+    for step, stats in summary['steps'].items():
+        if not stats['requests']:
+            continue
+        line = (f"{step:>16} {stats['requests']:>9} {stats['errors']:>7} {stats['p50_ms']:>7.1f}ms "
+                f"{stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms")
+        base = baseline and baseline['summary']['steps'].get(step)
+        if base and base.get('p95_ms'):
+            line += f" {(stats['p95_ms'] / base['p95_ms'] - 1) * 100:>+11.1f}%"
+        print(line)
+    if baseline:
+        base = baseline['summary']
+        print(f"throughput vs {baseline.get('commit') or 'baseline'}: "
+              f"{(summary['requests_per_s'] / base['requests_per_s'] - 1) * 100:+.1f}% req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stadiums', type=int, default=4)
+    parser.add_argument('--max-seats', type=int, default=100000, help='seats in the largest stadium')
+    parser.add_argument('--matches', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--hot-matches', type=int, default=3, help='matches the virtual users book')
+    parser.add_argument('--vus', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load')
+    parser.add_argument('--max-party', type=int, default=4, help='largest number of seats per booking')
+    parser.add_argument('--think', type=float, default=0, help='mean seconds between flows')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--url', help='drive a running server instead of the in-process app')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse data seeded by an earlier run')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        started = time.perf_counter()
+        if args.skip_seed:
+            hot, emails, dataset = existing_dataset(args)
+        else:
+            hot, emails, dataset = seed(args, rng)
+        print(f"dataset ready in {time.perf_counter() - started:.1f}s: {dataset}")
+        database = db.engine.url.get_backend_name()
+
+    if not args.url:
+        # Every in-process virtual user signs in from the same address
+        auth.ip_limiter.rate = None
+    results = Results()
+    deadline = time.perf_counter() + args.duration
+    threads = []
+    for i in range(args.vus):
+        client = HttpClient(args.url) if args.url else AppClient()
+        thread = threading.Thread(target=virtual_user, name=f'vu-{i}', args=(
+            client, emails[i % len(emails)], hot, args, results, deadline, random.Random(args.seed + i)
+        ))
+        threads.append(thread)
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = summarise(results, time.perf_counter() - started)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_summary(summary, baseline)
+
+    if args.output:
+        report = {
+            'commit': git_commit(),
+            'recorded_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'database': database,
+            'target': args.url or 'in-process',
+            'config': vars(args),
+            'dataset': dataset,
+            'summary': summary,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Booking service
+Writes every seat of an order with a single multi-row INSERT ... RETURNING
+instead of adding one ORM object per seat. Seats arrive as priced quote
+lines (see pricing), so category, discount and amount are stored per seat.
+"""
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from extension import db
+from models import Booking
+import seat_inventory
+import dashboard_stats
+import loyalty
+from checkin import gate
+
+
+def booking_rows(user_id, match_id, lines, payment_status='completed'):
+    """Plain dict rows for the bookings table, one per pricing.QuoteLine"""
+    booking_date = datetime.utcnow()
+    return [
+        {
+            'user_id': user_id,
+            'match_id': match_id,
+            'seat_row': line.row,
+            'seat_number': line.seat,
+            'seat_category': line.category,
+            'total_amount': line.amount,
+            'discount_applied': line.discount,
+            'loyalty_points_earned': loyalty.points_for(line.amount),
+            'booking_date': booking_date,
+            'payment_status': payment_status,
+            'qr_code': gate.sign(match_id, line.row, line.seat, user_id),
+        }
+        for line in lines
+    ]
+
+
+def create_bookings(user_id, match_id, lines, payment_status='completed'):
+    """Insert bookings for all quote lines in one statement and return their ids
+
+    Runs inside the caller's transaction; the caller commits (and handles
+    IntegrityError if a seat was taken concurrently).
+    """
+    rows = booking_rows(user_id, match_id, lines, payment_status)
+    if not rows:
+        return []
+    result = db.session.execute(insert(Booking).returning(Booking.id, sort_by_parameter_order=True), rows)
+    ids = result.scalars().all()
+    seat_inventory.stage(db.session, match_id, [(r['seat_row'], r['seat_number']) for r in rows])
+    dashboard_stats.record_bookings(db.session, match_id, len(ids), sum(r['total_amount'] for r in rows))
+    loyalty.record_bookings(db.session, user_id, ids, [r['loyalty_points_earned'] for r in rows])
+    return ids
@@ -0,0 +1,268 @@
+"""
+Check-in
+Signed QR payloads issued at booking time and a gate-side validator that
+verifies them without a database round-trip. Check-in times are queued
+and written in batched UPDATEs by a background thread. Per-match
+manifests let gates keep validating offline if the main DB is slow.
+
+Each worker loads a match's manifest (valid codes and seats already in)
+from the DB on the first scan for that match, so tickets checked in
+before a restart or on another worker are caught. Once it is older than
+CHECKIN_MANIFEST_TTL seconds it is reloaded in the background while
+scans keep using the old one. A signed code missing from the manifest
+(bought since it was loaded, or cancelled) triggers a reload in the
+request, at most once per MANIFEST_RECHECK_INTERVAL per match. Loads are
+single-flight per match. A failed load keeps the last manifest; with
+none at all, scans fall back to signature checks only. A ticket scanned
+at two workers within CHECKIN_MANIFEST_TTL + CHECKIN_FLUSH_INTERVAL can
+still be admitted by both.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam, select
+
+from extension import db
+from models import Booking
+
+PREFIX = 'CT1'
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MANIFEST_TTL = 15
+DEFAULT_MAX_CODES = 500         # codes accepted in one gate request
+MANIFEST_RECHECK_INTERVAL = 1.0 # seconds between in-request reloads per match
+MANIFEST_LOAD_WAIT = 2.0        # seconds a scan waits for another thread's load
+
+OK = 'ok'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+WRONG_MATCH = 'wrong_match'
+
+
+class TicketSigner:
+
+    def __init__(self, secret=None):
+        self.key = None
+        if secret:
+            self.set_secret(secret)
+
+    def set_secret(self, secret):
+        self.key = hashlib.sha256(f'ticket-qr:{secret}'.encode()).digest()
+
+    def _signature(self, body):
+        digest = hmac.new(self.key, body.encode(), hashlib.sha256).digest()[:12]
+        return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+    def sign(self, match_id, seat_row, seat_number, user_id):
+        body = f'{PREFIX}:{match_id}:{seat_row}:{seat_number}:{user_id}'
+        return f'{body}:{self._signature(body)}'
+
+    def verify(self, code):
+        """Return (match_id, seat_row, seat_number, user_id) or None"""
+        if not isinstance(code, str) or not code.isascii():
+            return None
+        body, _, signature = code.rpartition(':')
+        if not hmac.compare_digest(self._signature(body), signature):
+            return None
+        parts = body.split(':')
+        if len(parts) != 5 or parts[0] != PREFIX:
+            return None
+        try:
+            return tuple(int(part) for part in parts[1:])
+        except ValueError:
+            return None
+
+
+def code_digest(code):
+    """Short digest of a QR code, as published in offline manifests"""
+    return hashlib.sha256(code.encode()).hexdigest()[:16]
+
+
+class CheckInWriter(threading.Thread):
+    """Collects check-ins and writes them in batched executemany UPDATEs"""
+
+    def __init__(self, app, interval, batch_size):
+        super().__init__(name='checkin-writer', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+
+    def submit(self, match_id, seat_row, seat_number, user_id, checked_in_at):
+        self.queue.put({
+            'm': match_id, 'r': seat_row, 's': seat_number, 'u': user_id, 't': checked_in_at
+        })
+
+    def _drain(self):
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=self.interval))
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def write(self, batch):
+        bookings = Booking.__table__
+        stmt = bookings.update().where(and_(
+            bookings.c.match_id == bindparam('m'),
+            bookings.c.seat_row == bindparam('r'),
+            bookings.c.seat_number == bindparam('s'),
+            bookings.c.user_id == bindparam('u'),
+            bookings.c.check_in_time.is_(None),
+        )).values(check_in_time=bindparam('t'))
+        with self.app.app_context():
+            db.session.connection().execute(stmt, batch)
+            db.session.commit()
+
+    def run(self):
+        while True:
+            batch = self._drain()
+            if not batch:
+                continue
+            try:
+                self.write(batch)
+            except Exception:
+                logging.exception("Failed to write %d check-ins, requeueing", len(batch))
+                for item in batch:
+                    self.queue.put(item)
+
+
+class Gate:
+    """Validates scans against signatures, the match manifest (which
+    catches cancelled tickets) and an in-memory admitted set"""
+
+    def __init__(self):
+        self.app = None
+        self.signer = TicketSigner()
+        self.writer = None
+        self.manifest_ttl = DEFAULT_MANIFEST_TTL
+        self._admitted = {}
+        self._manifests = {}
+        # match_id -> Event set when the load in progress ends
+        self._loading = {}
+        # match_id -> monotonic time of the last load attempt
+        self._attempted = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('CHECKIN_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        app.config.setdefault('CHECKIN_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        app.config.setdefault('CHECKIN_MANIFEST_TTL', DEFAULT_MANIFEST_TTL)
+        app.config.setdefault('GATE_API_KEY', None)
+        app.config.setdefault('GATE_MAX_CODES', DEFAULT_MAX_CODES)
+        self.app = app
+        self.manifest_ttl = app.config['CHECKIN_MANIFEST_TTL']
+        self.signer.set_secret(app.secret_key)
+        self.writer = CheckInWriter(
+            app, app.config['CHECKIN_FLUSH_INTERVAL'], app.config['CHECKIN_BATCH_SIZE']
+        )
+        self.writer.start()
+        app.extensions['checkin_gate'] = self
+
+    def sign(self, match_id, seat_row, seat_number, user_id):
+        return self.signer.sign(match_id, seat_row, seat_number, user_id)
+
+    def manifest(self, match_id):
+        """Offline validation set: valid code digests and seats already in"""
+        digests = []
+        checked_in = []
+        rows = db.session.execute(
+            select(Booking.qr_code, Booking.seat_row, Booking.seat_number, Booking.check_in_time)
+            .where(Booking.match_id == match_id)
+            .execution_options(yield_per=10000)
+        )
+        for qr_code, seat_row, seat_number, check_in_time in rows:
+            if qr_code:
+                digests.append(code_digest(qr_code))
+            if check_in_time:
+                checked_in.append([seat_row, seat_number])
+        return {'match_id': match_id, 'codes': digests, 'checked_in': checked_in}
+
+    def preload(self, match_id):
+        data = self.manifest(match_id)
+        with self._lock:
+            self._manifests[match_id] = (time.monotonic(), set(data['codes']))
+            # Seats admitted here but not yet written stay in the set
+            admitted = self._admitted.setdefault(match_id, set())
+            admitted.update(tuple(seat) for seat in data['checked_in'])
+        return data
+
+    def _load(self, match_id, min_interval=0.0):
+        """Reload a manifest unless one was attempted within min_interval
+        seconds; joins a load already in progress instead of starting one"""
+        with self._lock:
+            event = self._loading.get(match_id)
+            leader = event is None and \
+                time.monotonic() - self._attempted.get(match_id, float('-inf')) >= min_interval
+            if leader:
+                event = self._loading[match_id] = threading.Event()
+                self._attempted[match_id] = time.monotonic()
+        if event is None:
+            return
+        if not leader:
+            event.wait(MANIFEST_LOAD_WAIT)
+            return
+        try:
+            self.preload(match_id)
+        except Exception:
+            logging.exception("Could not load the gate manifest for match %s", match_id)
+        finally:
+            with self._lock:
+                del self._loading[match_id]
+            event.set()
+
+    def _load_in_background(self, match_id):
+        if match_id in self._loading or \
+                time.monotonic() - self._attempted.get(match_id, float('-inf')) < MANIFEST_RECHECK_INTERVAL:
+            return
+
+        def run():
+            with self.app.app_context():
+                self._load(match_id, MANIFEST_RECHECK_INTERVAL)
+        threading.Thread(target=run, name='manifest-refresh', daemon=True).start()
+
+    def _valid_codes(self, match_id, recheck=False):
+        """Code digests of the match's manifest, or None if none could be loaded"""
+        loaded = self._manifests.get(match_id)
+        if loaded is None or recheck:
+            self._load(match_id, MANIFEST_RECHECK_INTERVAL)
+            loaded = self._manifests.get(match_id)
+        elif time.monotonic() - loaded[0] > self.manifest_ttl:
+            self._load_in_background(match_id)
+        return loaded[1] if loaded is not None else None
+
+    def scan(self, code, match_id=None):
+        """Validate one scanned code and queue its check-in; returns a status"""
+        ticket = self.signer.verify(code)
+        if ticket is None:
+            return INVALID
+        ticket_match_id, seat_row, seat_number, user_id = ticket
+        if match_id is not None and ticket_match_id != match_id:
+            return WRONG_MATCH
+        # A signed code missing from the manifest may have been bought since
+        # it was loaded, so look again (rate-limited); with no manifest at
+        # all the signature is all there is to go on
+        digest = code_digest(code)
+        codes = self._valid_codes(ticket_match_id)
+        if codes is not None and digest not in codes:
+            codes = self._valid_codes(ticket_match_id, recheck=True)
+            if digest not in codes:
+                return INVALID
+        with self._lock:
+            admitted = self._admitted.setdefault(ticket_match_id, set())
+            if (seat_row, seat_number) in admitted:
+                return DUPLICATE
+            admitted.add((seat_row, seat_number))
+        self.writer.submit(ticket_match_id, seat_row, seat_number, user_id, datetime.utcnow())
+        return OK
+
+
+gate = Gate()
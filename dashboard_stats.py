@@ -0,0 +1,250 @@
+"""
+Dashboard statistics
+Running totals (users, matches, bookings, revenue) and per-match booking
+counts kept in summary tables, so the admin dashboard reads a handful of
+rows instead of scanning bookings. Writes only append a row to the
+insert-only stat_deltas table in their own transaction; a folder thread
+claims pending deltas with DELETE ... RETURNING and adds them to the
+summary rows, so bookings never queue on a shared counter row. totals()
+includes deltas not folded yet; top_matches() lags by up to
+DASHBOARD_FOLD_INTERVAL seconds.
+
+The summary tables are seeded from the base tables the first time the
+app runs against a database, by whichever worker takes the seed lease;
+later rebuilds only run from the rebuild-stats CLI command.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+import click
+from sqlalchemy import bindparam, delete, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from extension import db
+from models import User, Match, Booking, StatCounter, StatDelta, MatchBookingStat
+from dynamic_pricing import claim_run
+
+COUNTERS = ('users', 'matches', 'bookings', 'revenue')
+TOP_MATCHES = 20
+DEFAULT_FOLD_INTERVAL = 10
+DEFAULT_FOLD_BATCH = 5000
+SEED_LEASE_NAME = 'dashboard_stats_seed'
+# A worker that dies mid-seed leaves the lease to expire before another tries
+SEED_LEASE_SECONDS = 300
+
+
+def _append(conn, rows):
+    if rows:
+        conn.execute(insert(StatDelta), rows)
+
+
+def record_bookings(session, match_id, count, revenue):
+    """Count bookings written outside the ORM unit of work (bulk inserts)"""
+    _append(session.connection(), [{'match_id': match_id, 'bookings': count, 'revenue': revenue}])
+
+
+def record_matches(session, count):
+    """Count matches written outside the ORM unit of work (bulk imports)"""
+    _append(session.connection(), [{'matches': count}])
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_flushed_rows(session, flush_context):
+    counters = defaultdict(int)
+    per_match = defaultdict(lambda: [0, 0.0])
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            if isinstance(obj, User):
+                counters['users'] += sign
+            elif isinstance(obj, Match):
+                counters['matches'] += sign
+            elif isinstance(obj, Booking):
+                per_match[obj.match_id][0] += sign
+                per_match[obj.match_id][1] += sign * (obj.total_amount or 0)
+    rows = [{'match_id': match_id, 'bookings': count, 'revenue': revenue}
+            for match_id, (count, revenue) in per_match.items()]
+    if any(counters.values()):
+        rows.append({'users': counters['users'], 'matches': counters['matches']})
+    _append(session.connection(), rows)
+
+
+def _bump_counter(conn, name, delta):
+    if not delta:
+        return
+    result = conn.execute(
+        update(StatCounter).where(StatCounter.name == name).values(value=StatCounter.value + delta)
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(StatCounter).values(name=name, value=delta))
+
+
+def _bump_matches(conn, per_match):
+    stats = MatchBookingStat.__table__
+    existing = set()
+    match_ids = list(per_match)
+    for start in range(0, len(match_ids), 500):
+        existing.update(conn.execute(
+            select(stats.c.match_id).where(stats.c.match_id.in_(match_ids[start:start + 500]))
+        ).scalars())
+    updates = [{'mid': match_id, 'count': count, 'amount': revenue}
+               for match_id, (count, revenue) in per_match.items() if match_id in existing]
+    inserts = [{'match_id': match_id, 'booking_count': count, 'revenue': revenue}
+               for match_id, (count, revenue) in per_match.items() if match_id not in existing]
+    if updates:
+        conn.execute(
+            update(stats).where(stats.c.match_id == bindparam('mid')).values(
+                booking_count=stats.c.booking_count + bindparam('count'),
+                revenue=stats.c.revenue + bindparam('amount')
+            ),
+            updates
+        )
+    if inserts:
+        conn.execute(insert(stats), inserts)
+
+
+def fold(batch_size=DEFAULT_FOLD_BATCH):
+    """Move up to batch_size pending deltas into the summary tables; returns
+    how many were folded. Deleting is the claim, so concurrent folders never
+    add the same delta twice."""
+    deltas = StatDelta.__table__
+    conn = db.session.connection()
+    claimed = conn.execute(
+        delete(deltas)
+        .where(deltas.c.id.in_(select(deltas.c.id).order_by(deltas.c.id).limit(batch_size).scalar_subquery()))
+        .returning(deltas.c.match_id, deltas.c.users, deltas.c.matches, deltas.c.bookings, deltas.c.revenue)
+    ).all()
+    if not claimed:
+        db.session.rollback()
+        return 0
+    counters = defaultdict(float)
+    per_match = defaultdict(lambda: [0, 0.0])
+    for match_id, users, matches, bookings, revenue in claimed:
+        counters['users'] += users
+        counters['matches'] += matches
+        counters['bookings'] += bookings
+        counters['revenue'] += revenue
+        if match_id is not None:
+            per_match[match_id][0] += bookings
+            per_match[match_id][1] += revenue
+    try:
+        for name, delta in counters.items():
+            _bump_counter(conn, name, delta)
+        _bump_matches(conn, per_match)
+        db.session.commit()
+    except IntegrityError:
+        # Another folder created the same summary row first; the deltas
+        # are restored by the rollback and folded on the next pass
+        db.session.rollback()
+        return 0
+    return len(claimed)
+
+
+def fold_all(batch_size=DEFAULT_FOLD_BATCH):
+    total = 0
+    while True:
+        folded = fold(batch_size)
+        if not folded:
+            return total
+        total += folded
+
+
+def rebuild():
+    """Recompute every summary row from the base tables"""
+    db.session.execute(delete(StatDelta))
+    db.session.execute(delete(StatCounter))
+    db.session.execute(delete(MatchBookingStat))
+    totals = {
+        'users': db.session.scalar(select(func.count(User.id))),
+        'matches': db.session.scalar(select(func.count(Match.id))),
+        'bookings': db.session.scalar(select(func.count(Booking.id))),
+        'revenue': db.session.scalar(select(func.coalesce(func.sum(Booking.total_amount), 0))),
+    }
+    db.session.execute(insert(StatCounter), [
+        {'name': name, 'value': value} for name, value in totals.items()
+    ])
+    db.session.execute(insert(MatchBookingStat).from_select(
+        ['match_id', 'booking_count', 'revenue'],
+        select(Booking.match_id, func.count(Booking.id), func.sum(Booking.total_amount))
+        .group_by(Booking.match_id)
+    ))
+    db.session.commit()
+    return totals
+
+
+def seed():
+    """Rebuild the summary tables if the database has none yet, under a
+    lease because rebuild() drops pending deltas; True if this process did"""
+    if db.session.scalar(select(func.count()).select_from(StatCounter)):
+        return False
+    if not claim_run(SEED_LEASE_SECONDS, name=SEED_LEASE_NAME):
+        return False
+    rebuild()
+    return True
+
+
+def totals():
+    """Folded counters plus the deltas still pending"""
+    values = dict(db.session.execute(select(StatCounter.name, StatCounter.value)).all())
+    pending = db.session.execute(
+        select(*(func.coalesce(func.sum(getattr(StatDelta, name)), 0) for name in COUNTERS))
+    ).one()
+    return {name: values.get(name, 0) + delta for name, delta in zip(COUNTERS, pending)}
+
+
+def top_matches(limit=TOP_MATCHES):
+    """[team1, team2, booking_count] for the most booked matches"""
+    rows = db.session.execute(
+        select(Match.team1, Match.team2, MatchBookingStat.booking_count)
+        .join(Match, Match.id == MatchBookingStat.match_id)
+        .where(MatchBookingStat.booking_count > 0)
+        .order_by(MatchBookingStat.booking_count.desc())
+        .limit(limit)
+    )
+    return [list(row) for row in rows]
+
+
+class StatsFolder(threading.Thread):
+    """Daemon thread that folds pending deltas every interval seconds"""
+
+    def __init__(self, app, interval, batch_size):
+        super().__init__(name='stats-folder', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    fold_all(self.batch_size)
+            except Exception:
+                logging.exception("Folding dashboard stats failed")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def init_app(app):
+    app.config.setdefault('DASHBOARD_FOLD_INTERVAL', DEFAULT_FOLD_INTERVAL)
+    app.config.setdefault('DASHBOARD_FOLD_BATCH', DEFAULT_FOLD_BATCH)
+
+    @app.cli.command('fold-stats')
+    def fold_stats_command():
+        """Fold pending dashboard deltas into the summary tables."""
+        click.echo(f"{fold_all(app.config['DASHBOARD_FOLD_BATCH'])} deltas folded")
+
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats_command():
+        """Rebuild dashboard summary tables from bookings."""
+        result = rebuild()
+        click.echo(', '.join(f'{name}={value:g}' for name, value in result.items()))
+
+    with app.app_context():
+        seed()
+
+    folder = StatsFolder(app, app.config['DASHBOARD_FOLD_INTERVAL'], app.config['DASHBOARD_FOLD_BATCH'])
+    folder.start()
+    app.extensions['stats_folder'] = folder
@@ -0,0 +1,151 @@
+"""
+Database profiles
+Engine settings per backend. SQLite connections get WAL journaling (readers
+no longer block the booking writer and vice versa), synchronous=NORMAL,
+a busy timeout, memory-mapped reads and a larger page cache. Postgres gets
+a sized connection pool, a server-side statement timeout and batched
+executemany. Also applies the SQL files in SQL/migrations, once each.
+"""
+import os
+import re
+from datetime import datetime
+
+import click
+from sqlalchemy import Column, DateTime, String, Table, event, insert, select
+from sqlalchemy.engine import make_url
+
+from extension import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SQL', 'migrations')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,           # ms
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,       # negative: KiB, i.e. 64MB
+    'temp_store': 'MEMORY',
+}
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_OVERFLOW = 20
+DEFAULT_POOL_TIMEOUT = 30
+DEFAULT_POOL_RECYCLE = 300
+DEFAULT_STATEMENT_TIMEOUT = 15000   # ms
+DEFAULT_PREPARE_THRESHOLD = 5       # psycopg 3 only
+
+schema_migrations = Table(
+    'schema_migrations', db.metadata,
+    Column('version', String(255), primary_key=True),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def engine_options(url, config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the database at url; DB_* keys in config override the defaults"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend == 'sqlite':
+        # The pysqlite dialect picks a suitable pool; pragmas are set per
+        # connection by init_app
+        return {}
+
+    options = {
+        'pool_recycle': config.get('DB_POOL_RECYCLE', DEFAULT_POOL_RECYCLE),
+        'pool_pre_ping': True,
+    }
+    if backend == 'postgresql':
+        options.update(
+            pool_size=config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE),
+            max_overflow=config.get('DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW),
+            pool_timeout=config.get('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT),
+            # Reuse the most recent connection so surplus ones idle out
+            pool_use_lifo=True,
+        )
+        timeout = config.get('DB_STATEMENT_TIMEOUT', DEFAULT_STATEMENT_TIMEOUT)
+        connect_args = {'application_name': 'crickettix'}
+        if timeout:
+            connect_args['options'] = f'-c statement_timeout={int(timeout)}'
+        driver = url.get_driver_name()
+        if driver == 'psycopg2':
+            # Bulk UPDATEs (loyalty settle, repricing, live scores) go out
+            # as execute_batch pages rather than one round trip per row
+            options['executemany_mode'] = 'values_plus_batch'
+        elif driver == 'psycopg':
+            # Server-side prepared statements after this many executions
+            connect_args['prepare_threshold'] = config.get('DB_PREPARE_THRESHOLD', DEFAULT_PREPARE_THRESHOLD)
+        options['connect_args'] = connect_args
+    return options
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run the pragmas on every new connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def effective_settings(connection):
+    if connection.dialect.name == 'sqlite':
+        return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in SQLITE_PRAGMAS}
+    if connection.dialect.name == 'postgresql':
+        return {name: connection.exec_driver_sql(f'SHOW {name}').scalar()
+                for name in ('statement_timeout', 'max_connections', 'shared_buffers')}
+    return {}
+
+
+def pending_migrations(connection, directory=MIGRATIONS_DIR):
+    schema_migrations.create(connection, checkfirst=True)
+    applied = set(connection.execute(select(schema_migrations.c.version)).scalars())
+    files = sorted(name for name in os.listdir(directory) if name.endswith('.sql')) if os.path.isdir(directory) else []
+    return [name for name in files if name[:-4] not in applied]
+
+
+def split_statements(sql):
+    sql = re.sub(r'--[^\n]*', '', sql)
+    return [statement.strip() for statement in sql.split(';') if statement.strip()]
+
+
+def apply_migrations(connection, directory=MIGRATIONS_DIR):
+    """Apply each pending migration file in its own transaction; returns the versions applied"""
+    applied = []
+    for name in pending_migrations(connection, directory):
+        with open(os.path.join(directory, name)) as f:
+            statements = split_statements(f.read())
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        connection.execute(insert(schema_migrations), {'version': name[:-4], 'applied_at': datetime.utcnow()})
+        connection.commit()
+        applied.append(name[:-4])
+    return applied
+
+
+def init_app(app):
+    """Call after db.init_app, with SQLALCHEMY_ENGINE_OPTIONS from engine_options()"""
+    app.config.setdefault('SQLITE_PRAGMAS', SQLITE_PRAGMAS)
+    with app.app_context():
+        for engine in db.engines.values():
+            apply_sqlite_pragmas(engine, app.config['SQLITE_PRAGMAS'])
+
+    @app.cli.command('migrate-db')
+    def migrate_db_command():
+        """Apply pending SQL migrations from SQL/migrations."""
+        with db.engine.connect() as connection:
+            applied = apply_migrations(connection)
+        click.echo(f"Applied {', '.join(applied)}" if applied else 'Database is up to date')
+
+    @app.cli.command('db-profile')
+    def db_profile_command():
+        """Show the effective database settings and pending migrations."""
+        with db.engine.connect() as connection:
+            for name, value in effective_settings(connection).items():
+                click.echo(f'{name} = {value}')
+            pending = pending_migrations(connection)
+            connection.commit()
+        click.echo(f"pending migrations: {', '.join(pending) or 'none'}")
@@ -0,0 +1,267 @@
+"""
+Dynamic pricing
+Batch job that moves category prices of every upcoming match with
+sell-through, booking velocity and time to match. Demand for all matches
+is read with one grouped query, new prices are computed as NumPy arrays,
+and the changes are written with one executemany UPDATE plus one
+multi-row price_history INSERT.
+
+Prices move relative to each match's base price: the latest price_history
+row for the category not written by this job (the initial, admin or
+import price). A match with no such row has its current prices recorded
+as the base on its first run. Repeated runs therefore do not compound,
+and with flat demand they settle on a fixed point; each run may only move
+a price by MAX_STEP. With DYNAMIC_PRICING_INTERVAL set every worker runs a job
+thread, but a lease row in job_leases lets only one run per interval, so
+the cap holds per interval however many workers there are. Other workers
+see the new prices through pricing's price_history sync.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+import numpy as np
+from sqlalchemy import bindparam, case, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extension import db
+from models import Stadium, Match, Booking, PriceHistory, JobLease
+import match_catalogue
+import pricing
+
+VELOCITY_WINDOW = timedelta(hours=24)
+# Projected final sell-through at which the base price applies
+TARGET_SELL_THROUGH = 0.75
+DEMAND_SENSITIVITY = 0.5
+MIN_MULTIPLIER = 0.8
+MAX_MULTIPLIER = 1.5
+MAX_STEP = 0.10
+PRICE_STEP = 0.5
+
+# Column order of the price arrays
+CATEGORY_COLUMNS = (('Regular', 'ticket_price'), ('VIP', 'vip_price'), ('Premium', 'premium_price'))
+CATEGORY_INDEX = {category: i for i, (category, _) in enumerate(CATEGORY_COLUMNS)}
+LEASE_NAME = 'dynamic_pricing'
+REASON = 'Dynamic pricing'
+BASE_REASON = 'Base price'
+
+
+def demand_snapshot(now):
+    """One row per upcoming match: id, date, current prices, capacity,
+    seats sold and seats sold within VELOCITY_WINDOW"""
+    since = now - VELOCITY_WINDOW
+    # Aggregate bookings once per match, then join the (much smaller) result
+    demand = (
+        select(
+            Booking.match_id,
+            func.count().label('sold'),
+            func.sum(case((Booking.booking_date >= since, 1), else_=0)).label('recent'),
+        )
+        .group_by(Booking.match_id)
+        .subquery()
+    )
+    return db.session.execute(
+        select(
+            Match.id, Match.match_date, Match.ticket_price, Match.vip_price, Match.premium_price,
+            (Stadium.rows * Stadium.seats_per_row).label('capacity'),
+            func.coalesce(demand.c.sold, 0).label('sold'),
+            func.coalesce(demand.c.recent, 0).label('recent'),
+        )
+        .join(Stadium, Match.stadium_id == Stadium.id)
+        .outerjoin(demand, demand.c.match_id == Match.id)
+        .where(Match.status == 'Upcoming', Match.match_date > now)
+    ).all()
+
+
+def base_prices(match_ids):
+    """{(match_id, category): price} from the latest price_history row per
+    category that this job did not write"""
+    if not match_ids:
+        return {}
+    latest = (
+        select(func.max(PriceHistory.id))
+        .where(PriceHistory.match_id.in_(match_ids),
+               or_(PriceHistory.reason.is_(None), PriceHistory.reason != REASON))
+        .group_by(PriceHistory.match_id, PriceHistory.seat_category)
+    )
+    rows = db.session.execute(
+        select(PriceHistory.match_id, PriceHistory.seat_category, PriceHistory.price)
+        .where(PriceHistory.id.in_(latest))
+    )
+    return {(match_id, category): price for match_id, category, price in rows}
+
+
+def effective_prices(regular, vip, premium):
+    """(n, 3) array of category prices with the same fallbacks as
+    pricing.category_prices (unset VIP/Premium fall back to the tier below)"""
+    regular = regular.astype(float)
+    vip = vip.astype(float)
+    premium = premium.astype(float)
+    vip = np.where(np.isnan(vip) | (vip == 0), regular, vip)
+    premium = np.where(np.isnan(premium) | (premium == 0), vip, premium)
+    return np.column_stack([regular, vip, premium]).reshape(-1, len(CATEGORY_COLUMNS))
+
+
+def demand_multiplier(sold, recent, capacity, hours_left):
+    """Price multiplier per match from its projected final sell-through"""
+    capacity = np.maximum(capacity, 1)
+    sell_through = sold / capacity
+    # Seats per day at the current pace, carried forward to match day
+    velocity = recent / capacity * (timedelta(days=1) / VELOCITY_WINDOW)
+    projected = np.minimum(sell_through + velocity * np.maximum(hours_left, 1) / 24, 1.0)
+    multiplier = 1 + DEMAND_SENSITIVITY * (projected - TARGET_SELL_THROUGH)
+    return np.clip(multiplier, MIN_MULTIPLIER, MAX_MULTIPLIER)
+
+
+def compute_prices(current, base, multiplier):
+    """New (n, 3) price array: base x multiplier, rate-limited against the
+    current prices and rounded to PRICE_STEP"""
+    target = base * multiplier[:, None]
+    limited = np.clip(target, current * (1 - MAX_STEP), current * (1 + MAX_STEP))
+    return np.round(limited / PRICE_STEP) * PRICE_STEP
+
+
+def reprice(now=None, dry_run=False):
+    """Recompute prices of all upcoming matches; returns a run report"""
+    now = now or datetime.utcnow()
+    timings = {}
+    started = time.perf_counter()
+
+    rows = demand_snapshot(now)
+    match_ids = [row.id for row in rows]
+    initial = base_prices(match_ids)
+    timings['query'] = time.perf_counter() - started
+
+    mark = time.perf_counter()
+    if rows:
+        _, dates, regular, vip, premium, capacity, sold, recent = (np.array(column) for column in zip(*rows))
+    else:
+        dates = np.array([], dtype='datetime64[us]')
+        regular = vip = premium = capacity = sold = recent = np.array([], dtype=float)
+    current = effective_prices(regular, vip, premium)
+    base = current.copy()
+    position = {match_id: i for i, match_id in enumerate(match_ids)}
+    for (match_id, category), price in initial.items():
+        base[position[match_id], CATEGORY_INDEX[category]] = price
+    # Matches priced outside the ORM have no history yet: today's price
+    # becomes their base, recorded so later runs do not reuse their output
+    unbased = [
+        (match_id, category, float(current[i, j]))
+        for i, match_id in enumerate(match_ids)
+        for j, (category, _) in enumerate(CATEGORY_COLUMNS)
+        if (match_id, category) not in initial
+    ]
+    hours_left = (dates.astype('datetime64[us]') - np.datetime64(now, 'us')) / np.timedelta64(1, 'h')
+    multiplier = demand_multiplier(sold.astype(float), recent.astype(float), capacity.astype(float), hours_left)
+    new = compute_prices(current, base, multiplier)
+    changed = np.abs(new - current) >= 0.01
+    changed_rows = np.flatnonzero(changed.any(axis=1))
+    timings['compute'] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    if unbased and not dry_run:
+        pricing.record_price_changes(db.session, unbased, BASE_REASON)
+    if len(changed_rows) and not dry_run:
+        params = [
+            {'match_id': match_ids[i], **{column: float(new[i, j]) for j, (_, column) in enumerate(CATEGORY_COLUMNS)}}
+            for i in changed_rows
+        ]
+        matches = Match.__table__
+        db.session.connection().execute(
+            update(matches).where(matches.c.id == bindparam('match_id')).values(
+                ticket_price=bindparam('ticket_price'),
+                vip_price=bindparam('vip_price'),
+                premium_price=bindparam('premium_price'),
+            ),
+            params
+        )
+        pricing.record_price_changes(db.session, [
+            (match_ids[i], CATEGORY_COLUMNS[j][0], float(new[i, j]))
+            for i, j in zip(*np.nonzero(changed))
+        ], REASON)
+    if (unbased or len(changed_rows)) and not dry_run:
+        db.session.commit()
+        match_catalogue.invalidate()
+    timings['write'] = time.perf_counter() - mark
+    timings['total'] = time.perf_counter() - started
+
+    return {
+        'matches': len(rows),
+        'repriced': int(len(changed_rows)),
+        'prices_changed': int(changed.sum()),
+        'bases_recorded': 0 if dry_run else len(unbased),
+        'dry_run': dry_run,
+        'timings': timings,
+    }
+
+
+def claim_run(interval, now=None, name=LEASE_NAME):
+    """True for one caller per interval across all processes: moves the
+    lease's next_run_at forward only if it has passed"""
+    now = now or datetime.utcnow()
+    leases = JobLease.__table__
+    conn = db.session.connection()
+    claimed = conn.execute(
+        update(leases).where(leases.c.name == name, leases.c.next_run_at <= now)
+        .values(next_run_at=now + timedelta(seconds=interval))
+    ).rowcount == 1
+    if not claimed and conn.execute(select(leases.c.name).where(leases.c.name == name)).first() is None:
+        try:
+            conn.execute(insert(leases).values(name=name, next_run_at=now + timedelta(seconds=interval)))
+            claimed = True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+    db.session.commit()
+    return claimed
+
+
+class RepricingJob(threading.Thread):
+    """Daemon thread that reprices every interval seconds"""
+
+    def __init__(self, app, interval):
+        super().__init__(name='dynamic-pricing', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    if not claim_run(self.interval):
+                        continue
+                    report = reprice()
+                logging.info("Repriced %d of %d matches in %.1fms", report['repriced'],
+                             report['matches'], report['timings']['total'] * 1000)
+            except Exception:
+                logging.exception("Dynamic pricing run failed")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def init_app(app):
+    # Off by default; set to e.g. 60 for per-minute runs, or use the CLI from cron
+    app.config.setdefault('DYNAMIC_PRICING_INTERVAL', None)
+
+    @app.cli.command('reprice')
+    @click.option('--dry-run', is_flag=True, help='Compute prices without writing them.')
+    @click.option('--force', is_flag=True, help='Run even if another process repriced within the interval.')
+    def reprice_command(dry_run, force):
+        """Recompute prices of upcoming matches from demand."""
+        interval = app.config['DYNAMIC_PRICING_INTERVAL']
+        if interval and not dry_run and not force and not claim_run(interval):
+            click.echo(f'Skipped: prices were recomputed less than {interval}s ago (use --force)')
+            return
+        report = reprice(dry_run=dry_run)
+        timings = ', '.join(f'{name} {seconds * 1000:.1f}ms' for name, seconds in report['timings'].items())
+        click.echo(f"{report['repriced']} of {report['matches']} matches repriced "
+                   f"({report['prices_changed']} prices){' [dry run]' if dry_run else ''}: {timings}")
+
+    if app.config['DYNAMIC_PRICING_INTERVAL']:
+        job = RepricingJob(app, app.config['DYNAMIC_PRICING_INTERVAL'])
+        job.start()
+        app.extensions['dynamic_pricing'] = job
@@ -0,0 +1,226 @@
+"""
+Finance export
+Bookings joined with their match, stadium and customer, streamed as CSV
+or, when pyarrow is installed, as Parquet or an Arrow IPC stream. Rows are
+read in EXPORT_BATCH_SIZE partitions with yield_per (a server-side cursor
+on Postgres) and each partition is encoded and sent before the next is
+fetched, so memory stays flat however many bookings match the filters.
+CSV text cells starting with = + - @ tab or carriage return are prefixed
+with an apostrophe so spreadsheets show them instead of running them as
+formulas.
+"""
+import csv
+import io
+import sys
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import select
+
+from extension import db
+from models import User, Stadium, Match, Booking
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+DEFAULT_BATCH_SIZE = 5000
+# Leading characters that make Excel, LibreOffice or Sheets evaluate a cell
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+COLUMNS = (
+    ('booking_id', Booking.id, 'int'),
+    ('booking_date', Booking.booking_date, 'datetime'),
+    ('payment_status', Booking.payment_status, 'str'),
+    ('seat_category', Booking.seat_category, 'str'),
+    ('seat_row', Booking.seat_row, 'int'),
+    ('seat_number', Booking.seat_number, 'int'),
+    ('total_amount', Booking.total_amount, 'float'),
+    ('discount_applied', Booking.discount_applied, 'float'),
+    ('loyalty_points_earned', Booking.loyalty_points_earned, 'int'),
+    ('match_id', Match.id, 'int'),
+    ('match_date', Match.match_date, 'datetime'),
+    ('team1', Match.team1, 'str'),
+    ('team2', Match.team2, 'str'),
+    ('tournament', Match.tournament, 'str'),
+    ('match_type', Match.match_type, 'str'),
+    ('stadium', Stadium.name, 'str'),
+    ('city', Stadium.city, 'str'),
+    ('country', Stadium.country, 'str'),
+    ('user_id', User.id, 'int'),
+    ('user_name', User.name, 'str'),
+    ('user_email', User.email, 'str'),
+)
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+class ExportError(Exception):
+    """Raised for filters or formats that cannot be exported"""
+
+
+def parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ExportError(f'{name} must be a date like 2024-03-31')
+
+
+def export_query(start=None, end=None, tournament=None, match_id=None):
+    """Bookings with match, stadium and user columns; end is inclusive of its whole day"""
+    query = select(*(column for _, column, _ in COLUMNS)) \
+        .join(Match, Booking.match_id == Match.id) \
+        .join(Stadium, Match.stadium_id == Stadium.id) \
+        .join(User, Booking.user_id == User.id)
+    if start is not None:
+        query = query.where(Booking.booking_date >= start)
+    if end is not None:
+        query = query.where(Booking.booking_date < end + timedelta(days=1))
+    if tournament:
+        query = query.where(Match.tournament == tournament)
+    if match_id is not None:
+        query = query.where(Booking.match_id == match_id)
+    return query.order_by(Booking.id)
+
+
+def partitions(query, batch_size=DEFAULT_BATCH_SIZE):
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def spreadsheet_safe(value):
+    """Text that a spreadsheet will not run as a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name for name, _, _ in COLUMNS)
+    yield buffer.getvalue().encode()
+    text_columns = [index for index, (_, _, kind) in enumerate(COLUMNS) if kind == 'str']
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            row = list(row)
+            for index in text_columns:
+                row[index] = spreadsheet_safe(row[index])
+            writer.writerow(row)
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file for pyarrow that hands back what was written so far;
+    keeps counting bytes so the Parquet footer offsets stay right"""
+
+    def __init__(self):
+        super().__init__()
+        self.position = 0
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema():
+    types = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string(), 'datetime': pa.timestamp('us')}
+    return pa.schema([(name, types[kind]) for name, _, kind in COLUMNS])
+
+
+def arrow_chunks(batches, fmt):
+    """Parquet (one row group per partition) or Arrow IPC stream bytes"""
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if fmt == 'parquet' else pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in batches:
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema
+            )
+            if fmt == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export(fmt='csv', batch_size=DEFAULT_BATCH_SIZE, **filters):
+    """Chunks of the export file in fmt; raises ExportError up front for unusable requests"""
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt != 'csv' and pa is None:
+        raise ExportError(f'{fmt} export needs pyarrow installed')
+    batches = partitions(export_query(**filters), batch_size)
+    return csv_chunks(batches) if fmt == 'csv' else arrow_chunks(batches, fmt)
+
+
+def filename(fmt, **filters):
+    parts = ['bookings']
+    if filters.get('match_id') is not None:
+        parts.append(f"match_{filters['match_id']}")
+    if filters.get('start'):
+        parts.append(f"from_{filters['start']:%Y%m%d}")
+    if filters.get('end'):
+        parts.append(f"to_{filters['end']:%Y%m%d}")
+    return '_'.join(parts) + '.' + FORMATS[fmt][1]
+
+
+def init_app(app):
+    app.config.setdefault('EXPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    @app.cli.command('export-bookings')
+    @click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv')
+    @click.option('--start', help='First booking date, YYYY-MM-DD.')
+    @click.option('--end', help='Last booking date (inclusive), YYYY-MM-DD.')
+    @click.option('--tournament')
+    @click.option('--match-id', type=int)
+    @click.option('--output', '-o', default='-', help='File to write; - for stdout.')
+    def export_bookings_command(fmt, start, end, tournament, match_id, output):
+        """Stream bookings with match, stadium and customer details for finance."""
+        try:
+            chunks = export(fmt, app.config['EXPORT_BATCH_SIZE'], start=parse_date(start, 'start'),
+                            end=parse_date(end, 'end'), tournament=tournament, match_id=match_id)
+        except ExportError as e:
+            raise click.UsageError(str(e))
+        out = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            size = 0
+            for chunk in chunks:
+                out.write(chunk)
+                size += len(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        if output != '-':
+            click.echo(f'Wrote {size} bytes to {output}', err=True)
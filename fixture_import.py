@@ -0,0 +1,350 @@
+"""
+Fixture import
+Bulk load of tournament schedules from CSV, JSON or JSON Lines. Rows are
+read and validated one at a time; stadiums are resolved by name and city
+through an index built with one query, and a row with a new venue plus
+its layout (rows, seats_per_row) creates the stadium. Fixtures are keyed
+by stadium, date and teams: new ones go out in batches of multi-row
+INSERT ... RETURNING, known ones in one executemany UPDATE per batch.
+Rows that fail validation are skipped and listed in the report with the
+reason, and a row is checked in full before its new stadium is inserted;
+everything else commits in one transaction. A file that is not UTF-8 or
+not parseable as CSV part-way through is rejected as a whole.
+"""
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+import click
+from sqlalchemy import bindparam, insert, select, update
+
+from extension import db
+from models import Stadium, Match
+from response_cache import response_cache
+import dashboard_stats
+import match_catalogue
+import pricing
+
+DEFAULT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+MAX_ROWS_PER_STADIUM = 500
+MAX_SEATS_PER_ROW = 500
+FORMATS = ('csv', 'json', 'jsonl')
+
+# Written on insert and compared/updated on re-import
+MATCH_FIELDS = ('ticket_price', 'vip_price', 'premium_price', 'tournament', 'match_type')
+DEFAULT_MATCH_TYPE = Match.__table__.c.match_type.default.arg
+
+
+class FixtureImportError(Exception):
+    """Raised when the file as a whole cannot be read"""
+
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    return {'ndjson': 'jsonl'}.get(extension, extension) if extension in FORMATS + ('ndjson',) else 'csv'
+
+
+def read_rows(stream, fmt='csv'):
+    """(row number, dict) for each record of a binary stream; row 1 is the first record"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    number = 0
+    # Decoding and CSV parsing fail lazily, possibly after rows were fed
+    try:
+        for number, record in _records(text, fmt):
+            yield number, record
+    except UnicodeDecodeError:
+        # Text is decoded ahead in blocks, so the bad byte's row is not known
+        raise FixtureImportError('File is not UTF-8 text; nothing was imported')
+    except csv.Error as e:
+        raise FixtureImportError(f'Unreadable CSV after row {number}: {e}; nothing was imported')
+
+
+def _records(text, fmt):
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if not reader.fieldnames or 'stadium' not in reader.fieldnames:
+            raise FixtureImportError('CSV needs a header row with at least a stadium column')
+        yield from enumerate(reader, 1)
+    elif fmt == 'jsonl':
+        for number, line in enumerate(text, 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as e:
+                    yield number, e
+    elif fmt == 'json':
+        try:
+            records = json.load(text)
+        except ValueError as e:
+            raise FixtureImportError(f'Invalid JSON: {e}')
+        if not isinstance(records, list):
+            raise FixtureImportError('JSON must be a list of fixture objects')
+        yield from enumerate(records, 1)
+    else:
+        raise FixtureImportError(f"format must be one of {', '.join(FORMATS)}")
+
+
+def _text(raw, name, errors, required=False, max_length=100):
+    value = raw.get(name)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            errors.append(f'{name} is required')
+        return None
+    if len(value) > max_length:
+        errors.append(f'{name} is longer than {max_length} characters')
+    if '\x00' in value:
+        errors.append(f'{name} contains a NUL character')
+    return value
+
+
+def _number(raw, name, errors, cast=float, required=False, maximum=None):
+    value = raw.get(name)
+    if value is None or str(value).strip() == '':
+        if required:
+            errors.append(f'{name} is required')
+        return None
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        errors.append(f'{name} must be a number')
+        return None
+    if value <= 0 or (maximum is not None and value > maximum):
+        errors.append(f'{name} must be between 1 and {maximum}' if maximum else f'{name} must be positive')
+        return None
+    return value
+
+
+def _date(raw, errors):
+    value = raw.get('match_date')
+    if value is None or str(value).strip() == '':
+        errors.append('match_date is required')
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        errors.append('match_date must look like 2025-11-02T14:30')
+        return None
+
+
+def _place_key(name, city):
+    return name.casefold(), (city or '').casefold()
+
+
+class FixtureImporter:
+    """Validates rows as they arrive and writes them in batches"""
+
+    def __init__(self, session, batch_size=DEFAULT_BATCH_SIZE):
+        self.session = session
+        self.batch_size = batch_size
+        self.report = {'rows': 0, 'stadiums_created': 0, 'matches_created': 0, 'matches_updated': 0,
+                       'matches_unchanged': 0, 'error_count': 0, 'errors': []}
+        # (name, city) -> id, plus name -> ids for rows that leave the city out
+        self.stadiums = {}
+        self.stadiums_by_name = {}
+        for stadium_id, name, city in session.execute(select(Stadium.id, Stadium.name, Stadium.city)):
+            self._index_stadium(stadium_id, name, city)
+        # (stadium_id, match_date, team1, team2) -> (match_id, {field: value})
+        self.fixtures = {}
+        for row in session.execute(select(Match.id, Match.stadium_id, Match.match_date, Match.team1, Match.team2,
+                                          *(getattr(Match, field) for field in MATCH_FIELDS))):
+            self.fixtures[(row[1], row[2], row[3].casefold(), row[4].casefold())] = \
+                (row[0], dict(zip(MATCH_FIELDS, row[5:])))
+        self._inserts = {}
+        self._updates = {}
+
+    def _index_stadium(self, stadium_id, name, city):
+        key = _place_key(name, city)
+        self.stadiums[key] = stadium_id
+        self.stadiums_by_name.setdefault(key[0], set()).add(stadium_id)
+
+    def _error(self, number, messages):
+        self.report['error_count'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append({'row': number, 'errors': messages})
+
+    def _resolve_stadium(self, raw, errors):
+        """(stadium id, None) for a known venue, (None, values) for one to create, (None, None) on error"""
+        name = _text(raw, 'stadium', errors, required=True, max_length=200)
+        city = _text(raw, 'city', errors)
+        if name is None:
+            return None, None
+        stadium_id = self.stadiums.get(_place_key(name, city))
+        if stadium_id is None and city is None:
+            candidates = self.stadiums_by_name.get(name.casefold(), ())
+            if len(candidates) > 1:
+                errors.append(f"stadium '{name}' exists in several cities; add a city")
+                return None, None
+            stadium_id = next(iter(candidates), None)
+        if stadium_id is not None:
+            return stadium_id, None
+
+        rows = _number(raw, 'rows', errors, int, maximum=MAX_ROWS_PER_STADIUM)
+        seats_per_row = _number(raw, 'seats_per_row', errors, int, maximum=MAX_SEATS_PER_ROW)
+        if rows is None or seats_per_row is None or city is None:
+            errors.append(f"unknown stadium '{name}'; give city, rows and seats_per_row to create it")
+            return None, None
+        capacity = _number(raw, 'capacity', errors, int) or rows * seats_per_row
+        values = {'name': name, 'city': city, 'capacity': capacity, 'rows': rows, 'seats_per_row': seats_per_row}
+        country = _text(raw, 'country', errors)
+        if country:
+            values['country'] = country
+        return None, values
+
+    def _create_stadium(self, values):
+        stadium_id = self.session.execute(insert(Stadium).returning(Stadium.id), values).scalar_one()
+        self._index_stadium(stadium_id, values['name'], values['city'])
+        self.report['stadiums_created'] += 1
+        return stadium_id
+
+    def feed(self, number, raw):
+        self.report['rows'] += 1
+        if isinstance(raw, ValueError):
+            self._error(number, [f'invalid JSON: {raw}'])
+            return
+        if not isinstance(raw, dict):
+            self._error(number, [f'not a fixture object: {raw}'])
+            return
+        errors = []
+        stadium_id, new_stadium = self._resolve_stadium(raw, errors)
+        team1 = _text(raw, 'team1', errors)
+        team2 = _text(raw, 'team2', errors)
+        if team1 is None and team2 is None and not errors:
+            if new_stadium is not None:
+                self._create_stadium(new_stadium)
+            return      # a stadium-only row
+        if team1 is None or team2 is None:
+            errors.append('team1 and team2 are both required for a fixture')
+        elif team1.casefold() == team2.casefold():
+            errors.append('team1 and team2 must differ')
+        match_date = _date(raw, errors)
+        fields = {
+            'ticket_price': _number(raw, 'ticket_price', errors, required=True),
+            'vip_price': _number(raw, 'vip_price', errors),
+            'premium_price': _number(raw, 'premium_price', errors),
+            'tournament': _text(raw, 'tournament', errors),
+            'match_type': _text(raw, 'match_type', errors, max_length=20),
+        }
+        if errors or (stadium_id is None and new_stadium is None):
+            self._error(number, errors)
+            return
+        # Only a row that passed every check may add its stadium
+        if new_stadium is not None:
+            stadium_id = self._create_stadium(new_stadium)
+
+        key = (stadium_id, match_date, team1.casefold(), team2.casefold())
+        existing = self.fixtures.get(key)
+        if existing is None:
+            # A fixture listed twice in one file: the last row wins
+            fields['match_type'] = fields['match_type'] or DEFAULT_MATCH_TYPE
+            self._inserts[key] = {'team1': team1, 'team2': team2, 'stadium_id': stadium_id,
+                                  'match_date': match_date, **fields}
+        else:
+            match_id, current = existing
+            # Columns the file leaves empty keep their current values
+            fields = {field: current[field] if value is None else value for field, value in fields.items()}
+            if all(fields[field] == current[field] for field in MATCH_FIELDS):
+                # Also undoes an earlier row of this batch for the same fixture
+                self._updates.pop(match_id, None)
+                self.report['matches_unchanged'] += 1
+            else:
+                self._updates[match_id] = (key, fields)
+        if len(self._inserts) + len(self._updates) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._inserts:
+            matches = Match.__table__
+            # Returning the key rather than asking for rows in parameter
+            # order lets SQLite batch the VALUES lists as well
+            created = self.session.execute(
+                insert(matches).returning(matches.c.id, matches.c.stadium_id, matches.c.match_date,
+                                          matches.c.team1, matches.c.team2),
+                list(self._inserts.values())
+            ).all()
+            for match_id, stadium_id, match_date, team1, team2 in created:
+                key = (stadium_id, match_date, team1.casefold(), team2.casefold())
+                values = self._inserts[key]
+                self.fixtures[key] = (match_id, {field: values[field] for field in MATCH_FIELDS})
+            match_ids = [row[0] for row in created]
+            pricing.record_current_prices(self.session, match_ids, 'Initial price')
+            dashboard_stats.record_matches(self.session, len(match_ids))
+            self.report['matches_created'] += len(match_ids)
+            self._inserts = {}
+
+        if self._updates:
+            matches = Match.__table__
+            self.session.connection().execute(
+                update(matches).where(matches.c.id == bindparam('match_id'))
+                .values(**{field: bindparam(field) for field in MATCH_FIELDS}),
+                [{'match_id': match_id, **fields} for match_id, (_, fields) in self._updates.items()]
+            )
+            repriced = {category: [] for category in pricing.CATEGORIES}
+            for match_id, (key, fields) in self._updates.items():
+                before = self.fixtures[key][1]
+                old = pricing.category_prices(before['ticket_price'], before['vip_price'], before['premium_price'])
+                new = pricing.category_prices(fields['ticket_price'], fields['vip_price'], fields['premium_price'])
+                for category in pricing.CATEGORIES:
+                    if new[category] != old[category]:
+                        repriced[category].append(match_id)
+                self.fixtures[key] = (match_id, fields)
+            for category, match_ids in repriced.items():
+                pricing.record_current_prices(self.session, match_ids, 'Fixture import', (category,))
+            self.report['matches_updated'] += len(self._updates)
+            self._updates = {}
+
+
+def import_fixtures(rows, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Import (row number, dict) pairs; returns the report. A dry run rolls everything back"""
+    started = time.perf_counter()
+    importer = FixtureImporter(db.session, batch_size)
+    try:
+        for number, raw in rows:
+            importer.feed(number, raw)
+        importer.flush()
+    except Exception:
+        db.session.rollback()
+        raise
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+        # Core writes skip the ORM hooks that drop these
+        match_catalogue.invalidate()
+        response_cache.invalidate()
+    report = importer.report
+    report['dry_run'] = dry_run
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def summary(report):
+    return (f"{report['rows']} rows: {report['matches_created']} matches created, "
+            f"{report['matches_updated']} updated, {report['matches_unchanged']} unchanged, "
+            f"{report['stadiums_created']} stadiums created, {report['error_count']} rows rejected"
+            f"{' [dry run]' if report['dry_run'] else ''} in {report['seconds']:.2f}s")
+
+
+def init_app(app):
+    app.config.setdefault('IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    @app.cli.command('import-fixtures')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+    @click.option('--dry-run', is_flag=True, help='Validate and report without saving anything.')
+    def import_fixtures_command(path, fmt, dry_run):
+        """Bulk import fixtures (and new stadiums) from a CSV, JSON or JSON Lines file."""
+        with open(path, 'rb') as f:
+            try:
+                report = import_fixtures(read_rows(f, fmt or detect_format(path)),
+                                         app.config['IMPORT_BATCH_SIZE'], dry_run)
+            except FixtureImportError as e:
+                raise click.UsageError(str(e))
+        for error in report['errors']:
+            click.echo(f"row {error['row']}: {'; '.join(error['errors'])}", err=True)
+        click.echo(summary(report))
+        if report['error_count']:
+            raise SystemExit(1)
@@ -0,0 +1,196 @@
+"""
+Identity cache
+The Flask-Login user loader returns a lightweight UserSnapshot (id, name,
+email, is_admin, membership_tier) instead of an ORM User. Snapshots live in
+a bounded in-process LRU with a TTL and are dropped when a commit changes
+the user, so a seat-map poll or book_seats call no longer costs a users
+query. With IDENTITY_COOKIE on, the id, name, admin flag and tier also ride
+in the signed session cookie and are trusted for IDENTITY_COOKIE_MAX_AGE
+seconds, so most requests skip even the cache.
+
+Commit-time invalidation only reaches the worker that committed. Other
+workers keep serving a snapshot until it expires: up to IDENTITY_ADMIN_TTL
+seconds (default 10) for an admin, so a demoted admin loses access within
+that window, and up to IDENTITY_CACHE_TTL (or IDENTITY_COOKIE_MAX_AGE) for
+everyone else, so a new name, tier or admin grant can take that long to
+show up.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_request_context, session as flask_session
+from flask_login import UserMixin, user_logged_out
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from extension import db
+from models import User
+from replicas import primary_only
+
+DEFAULT_MAX_SIZE = 10000
+DEFAULT_TTL = 300
+DEFAULT_ADMIN_TTL = 10
+DEFAULT_COOKIE_MAX_AGE = 300
+COOKIE_KEY = 'identity'
+PENDING_KEY = 'identity_invalidations'
+# Marker meaning "every cached user"
+ALL_USERS = object()
+
+SNAPSHOT_COLUMNS = (User.id, User.name, User.email, User.is_admin, User.membership_tier)
+
+
+class UserSnapshot(UserMixin):
+    """The user fields routes and templates need, detached from any session"""
+
+    def __init__(self, id, name, email, is_admin, membership_tier):
+        self.id = id
+        self.name = name
+        self._email = email
+        self.is_admin = bool(is_admin)
+        self.membership_tier = membership_tier or 'Bronze'
+
+    @property
+    def email(self):
+        # Not carried in the cookie; fetched on the rare page that shows it
+        if self._email is None:
+            snapshot = identities.load(self.id)
+            self._email = snapshot.email if snapshot is not None else ''
+        return self._email
+
+    def to_cookie(self):
+        return {'id': self.id, 'name': self.name, 'admin': self.is_admin, 'tier': self.membership_tier,
+                'at': int(time.time())}
+
+    @classmethod
+    def from_cookie(cls, data):
+        return cls(data['id'], data['name'], None, data['admin'], data['tier'])
+
+
+class IdentityCache:
+    """LRU of user snapshots with a TTL"""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL, admin_ttl=DEFAULT_ADMIN_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.admin_ttl = admin_ttl
+        self.cookie_mode = False
+        self.cookie_max_age = DEFAULT_COOKIE_MAX_AGE
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('IDENTITY_CACHE_SIZE', DEFAULT_MAX_SIZE)
+        app.config.setdefault('IDENTITY_CACHE_TTL', DEFAULT_TTL)
+        app.config.setdefault('IDENTITY_ADMIN_TTL', DEFAULT_ADMIN_TTL)
+        app.config.setdefault('IDENTITY_COOKIE', False)
+        app.config.setdefault('IDENTITY_COOKIE_MAX_AGE', DEFAULT_COOKIE_MAX_AGE)
+        self.max_size = app.config['IDENTITY_CACHE_SIZE']
+        self.ttl = app.config['IDENTITY_CACHE_TTL']
+        self.admin_ttl = app.config['IDENTITY_ADMIN_TTL']
+        self.cookie_mode = app.config['IDENTITY_COOKIE']
+        self.cookie_max_age = app.config['IDENTITY_COOKIE_MAX_AGE']
+        user_logged_out.connect(_forget_cookie, app)
+        app.extensions['identity_cache'] = self
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def lifetime(self, is_admin, ttl):
+        """Seconds a snapshot may be trusted; admins get the short window"""
+        return min(ttl, self.admin_ttl) if is_admin else ttl
+
+    def put(self, snapshot):
+        expires_at = time.monotonic() + self.lifetime(snapshot.is_admin, self.ttl)
+        with self._lock:
+            self._entries[snapshot.id] = (snapshot, expires_at)
+            self._entries.move_to_end(snapshot.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            if user_ids is ALL_USERS:
+                self._entries.clear()
+                return
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def load(self, user_id):
+        """Cached snapshot, or one read with a single narrow SELECT; None if no such user"""
+        snapshot = self.get(user_id)
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        with primary_only():
+            row = db.session.execute(select(*SNAPSHOT_COLUMNS).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        snapshot = UserSnapshot(*row)
+        self.put(snapshot)
+        return snapshot
+
+    def load_user(self, user_id):
+        """Flask-Login user_loader"""
+        user_id = int(user_id)
+        if self.cookie_mode and has_request_context():
+            data = flask_session.get(COOKIE_KEY)
+            max_age = self.lifetime(bool(data and data.get('admin')), self.cookie_max_age)
+            if data and data.get('id') == user_id and data.get('at', 0) + max_age > time.time():
+                return UserSnapshot.from_cookie(data)
+        snapshot = self.load(user_id)
+        if snapshot is not None and self.cookie_mode and has_request_context():
+            flask_session[COOKIE_KEY] = snapshot.to_cookie()
+        return snapshot
+
+
+identities = IdentityCache()
+
+
+def invalidate_on_commit(session, user_ids):
+    """Drop the users' snapshots once the session commits (for Core updates)"""
+    pending = session.info.setdefault(PENDING_KEY, set())
+    if user_ids is ALL_USERS or pending is ALL_USERS:
+        session.info[PENDING_KEY] = ALL_USERS
+    else:
+        pending.update(user_ids)
+
+
+def _forget_cookie(sender, user, **extra):
+    flask_session.pop(COOKIE_KEY, None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_user_changes(session, flush_context):
+    changed = [
+        obj.id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, User) and (obj in session.deleted or inspect(obj).modified)
+    ]
+    if changed:
+        invalidate_on_commit(session, changed)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_user_changes(state):
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None and state.bind_mapper.class_ is User:
+        invalidate_on_commit(state.session, ALL_USERS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        identities.invalidate(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,291 @@
+"""
+Instrumentation
+Per-request metrics kept in process memory: latency by endpoint, SQL
+statement count and time (from engine events), template render time and
+N+1 warnings when one SELECT repeats within a request. Exposed in
+Prometheus text format by the admin-only /metrics route. With
+PROFILE_SLOW_REQUESTS set, a sampling profiler records the stacks of
+requests in flight and writes folded stacks (flamegraph.pl / speedscope
+input) for those slower than the threshold.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PREFIX = 'crickettix_'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+DEFAULT_N_PLUS_ONE_THRESHOLD = 10
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# name: (type, label names, buckets, help)
+FAMILIES = {
+    'request_duration_seconds': (
+        'histogram', ('endpoint',), LATENCY_BUCKETS, 'Time to produce the response'),
+    'requests_total': (
+        'counter', ('endpoint', 'method', 'status'), None, 'Responses sent'),
+    'request_sql_statements': (
+        'histogram', ('endpoint',), STATEMENT_BUCKETS, 'SQL statements executed per request'),
+    'request_sql_seconds': (
+        'histogram', ('endpoint',), LATENCY_BUCKETS, 'Time spent executing SQL per request'),
+    'n_plus_one_total': (
+        'counter', ('endpoint',), None, 'Requests that repeated one SELECT at least the N+1 threshold'),
+    'template_render_seconds': (
+        'histogram', ('template',), LATENCY_BUCKETS, 'Template render time'),
+    'slow_request_profiles_total': (
+        'counter', ('endpoint',), None, 'Folded-stack profiles written for slow requests'),
+    'auth_events_total': (
+        'counter', ('outcome',), None, 'Sign-ins throttled, turned away for lack of a hashing slot, or rehashed'),
+    'response_cache_total': (
+        'counter', ('result',), None, 'Anonymous page requests served from the response cache, filled, or answered 304'),
+}
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed upper bounds"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """Registry for the FAMILIES above, keyed by label values"""
+
+    def __init__(self):
+        self._series = {name: {} for name in FAMILIES}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value):
+        buckets = FAMILIES[name][2]
+        with self._lock:
+            series = self._series[name]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self._series[name]
+            series[labels] = series.get(labels, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._series = {name: {} for name in FAMILIES}
+
+    def render(self):
+        """Every series in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (kind, label_names, buckets, help_text) in FAMILIES.items():
+                full = PREFIX + name
+                lines.append(f'# HELP {full} {help_text}')
+                lines.append(f'# TYPE {full} {kind}')
+                for labels, value in sorted(self._series[name].items()):
+                    if kind == 'counter':
+                        lines.append(f'{full}{_label_text(label_names, labels)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), value.counts):
+                        cumulative += count
+                        lines.append(f'{full}_bucket{_label_text(label_names, labels, [("le", bound)])} {cumulative}')
+                    lines.append(f'{full}_sum{_label_text(label_names, labels)} {value.sum}')
+                    lines.append(f'{full}_count{_label_text(label_names, labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class RequestStats:
+    """What one request has done so far; lives on flask.g"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.selects = Counter()
+        self.templates = []
+        self.samples = None
+        self.finished = False
+
+
+def _stats():
+    return g.get('request_stats') if has_request_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    stats = _stats()
+    if stats is None:
+        return
+    stats.sql_count += 1
+    stats.sql_time += elapsed
+    # Same SELECT text with different parameters, over and over, is the
+    # signature of a lazy load inside a loop
+    if not executemany and statement.lstrip()[:6].upper() == 'SELECT':
+        stats.selects[statement] += 1
+
+
+def _template_started(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None:
+        stats.templates.append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    stats = _stats()
+    if stats is not None and stats.templates:
+        metrics.observe('template_render_seconds', (template.name or 'string',),
+                        time.perf_counter() - stats.templates.pop())
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples the stack of every thread currently serving a request"""
+
+    def __init__(self, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.interval = interval
+        self.active = {}
+        self.stopped = threading.Event()
+
+    def track(self, ident):
+        samples = self.active[ident] = Counter()
+        return samples
+
+    def untrack(self, ident):
+        self.active.pop(ident, None)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.active:
+                continue
+            frames = sys._current_frames()
+            for ident, samples in list(self.active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples[fold(frame)] += 1
+
+    def stop(self):
+        self.stopped.set()
+
+
+def fold(frame):
+    """Stack as 'outermost;...;innermost' frame names"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_profile(directory, endpoint, duration, samples):
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    path = os.path.join(directory, f'{stamp}-{endpoint}-{int(duration * 1000)}ms.folded')
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+def init_app(app):
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.config.setdefault('METRICS_N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+    # Seconds; requests slower than this get a folded-stack profile. None disables sampling.
+    app.config.setdefault('PROFILE_SLOW_REQUESTS', None)
+    app.config.setdefault('PROFILE_SAMPLE_INTERVAL', DEFAULT_SAMPLE_INTERVAL)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+    threshold = app.config['METRICS_N_PLUS_ONE_THRESHOLD']
+    slow = app.config['PROFILE_SLOW_REQUESTS']
+    profiler = None
+    if slow is not None:
+        profiler = SamplingProfiler(app.config['PROFILE_SAMPLE_INTERVAL'])
+        profiler.start()
+
+    def finish(stats, status):
+        if stats.finished:
+            return
+        stats.finished = True
+        duration = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe('request_duration_seconds', (endpoint,), duration)
+        metrics.inc('requests_total', (endpoint, request.method, str(status)))
+        metrics.observe('request_sql_statements', (endpoint,), stats.sql_count)
+        metrics.observe('request_sql_seconds', (endpoint,), stats.sql_time)
+
+        repeated = [(statement, count) for statement, count in stats.selects.items() if count >= threshold]
+        if repeated:
+            metrics.inc('n_plus_one_total', (endpoint,))
+            for statement, count in repeated:
+                logging.warning("Possible N+1 in %s: the same SELECT ran %d times\n%s",
+                                endpoint, count, ' '.join(statement.split())[:300])
+
+        if profiler is not None:
+            profiler.untrack(threading.get_ident())
+            if duration >= slow and stats.samples:
+                path = write_profile(app.config['PROFILE_DIR'], endpoint, duration, stats.samples)
+                metrics.inc('slow_request_profiles_total', (endpoint,))
+                logging.info("Slow request %s took %.0fms, profile written to %s",
+                             request.path, duration * 1000, path)
+        return duration
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = stats = RequestStats()
+        if profiler is not None:
+            stats.samples = profiler.track(threading.get_ident())
+
+    @app.after_request
+    def record_request_stats(response):
+        stats = g.get('request_stats')
+        if stats is not None:
+            duration = finish(stats, response.status_code)
+            # Streamed responses are timed to their first byte
+            response.headers['Server-Timing'] = (
+                f'app;dur={duration * 1000:.1f}, db;dur={stats.sql_time * 1000:.1f};desc="{stats.sql_count} queries"'
+            )
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exc):
+        stats = g.get('request_stats')
+        if stats is not None:
+            finish(stats, 500)
+
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.extensions['instrumentation'] = metrics
+    if profiler is not None:
+        app.extensions['request_profiler'] = profiler
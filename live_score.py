@@ -0,0 +1,374 @@
+"""
+Live score
+Ball-by-ball score ingestion with the current state of each match held in
+memory. Match.live_score is written by a background thread at most once
+per LIVE_SCORE_FLUSH_INTERVAL, however many balls arrive. Viewers are
+served over server-sent events by a single asyncio broadcaster that owns
+every viewer socket (LIVE_SCORE_STREAM_PORT), so a thousand viewers cost
+a thousand sockets rather than a thousand request threads. Without a
+stream port, the in-app SSE route is used instead.
+
+Each worker holds its own copy of the scores. The same background thread
+that flushes also re-reads, every LIVE_SCORE_FLUSH_INTERVAL, the stored
+score of every match this worker serves (and has no unflushed balls for)
+and adopts it when its seq is not behind. Viewers on a worker that did
+not ingest a ball therefore see it within about two flush intervals. The
+stream port can be bound by one worker only; the others log a warning
+and their viewers must use LIVE_SCORE_STREAM_URL (pointing at the worker
+that bound it) or the in-app route.
+"""
+import asyncio
+import json
+import logging
+import re
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, select, update
+
+from extension import db
+from models import Match
+from replicas import primary_only
+
+DEFAULT_FLUSH_INTERVAL = 2.0
+RECENT_BALLS = 12
+KEEP_ALIVE_SECONDS = 15
+# Viewers that stop reading are dropped once this much output is queued
+MAX_VIEWER_BUFFER = 256 * 1024
+
+# Extras that do not count as a legal delivery
+ILLEGAL_EXTRAS = {'wd', 'nb'}
+# Fields a full snapshot may set, by type ('recent' is handled separately)
+INTEGER_FIELDS = ('seq', 'innings', 'runs', 'wickets', 'balls')
+TEXT_FIELDS = ('batting', 'commentary', 'overs', 'updated_at')
+
+
+def empty_score():
+    return {
+        'seq': 0, 'innings': 1, 'batting': None, 'runs': 0, 'wickets': 0,
+        'balls': 0, 'overs': '0.0', 'recent': [], 'commentary': None, 'updated_at': None,
+    }
+
+
+def stored_score(live_score):
+    """Score from a Match.live_score column value"""
+    stored = json.loads(live_score) if live_score else {}
+    score = empty_score()
+    score.update({key: value for key, value in stored.items() if key in score})
+    return score
+
+
+def _text(value):
+    if value is not None and not isinstance(value, str):
+        raise TypeError('expected a string')
+    return value
+
+
+def parse_update(update):
+    """Validated, typed copy of one feed update; raises TypeError or
+    ValueError, so a malformed update is rejected before anything changes"""
+    if not isinstance(update, dict):
+        raise TypeError('an update must be an object')
+    parsed = {
+        'seq': None if update.get('seq') is None else int(update['seq']),
+        'batting': _text(update.get('batting')),
+        'commentary': _text(update.get('commentary')),
+    }
+    if 'score' in update:
+        if not isinstance(update['score'], dict):
+            raise TypeError('score must be an object')
+        snapshot = {key: value for key, value in update['score'].items() if key in INTEGER_FIELDS + TEXT_FIELDS}
+        for key in INTEGER_FIELDS:
+            if key in snapshot:
+                snapshot[key] = int(snapshot[key])
+        for key in TEXT_FIELDS:
+            if key in snapshot:
+                _text(snapshot[key])
+        if 'recent' in update['score']:
+            if not isinstance(update['score']['recent'], list):
+                raise TypeError('recent must be a list')
+            snapshot['recent'] = [str(code) for code in update['score']['recent']][-RECENT_BALLS:]
+        parsed['score'] = snapshot
+    else:
+        extra = _text(update.get('extra'))
+        parsed.update(
+            innings=int(update['innings']) if update.get('innings') else None,
+            extra=extra,
+            runs=int(update.get('runs', 0)),
+            extras=int(update.get('extras', 1 if extra in ILLEGAL_EXTRAS else 0)),
+            wicket=bool(update.get('wicket')),
+        )
+    return parsed
+
+
+def apply_update(score, update):
+    """Apply one parsed update (see parse_update) to a score dict in place;
+    False if it was a replay (seq not newer than the last one applied)"""
+    seq = update['seq']
+    if seq is not None:
+        if seq <= score['seq']:
+            return False
+        score['seq'] = seq
+    if 'score' in update:
+        # Full snapshot from the feed, e.g. after a correction
+        score.update(update['score'])
+    else:
+        if update['innings'] and update['innings'] != score['innings']:
+            score.update(innings=update['innings'], runs=0, wickets=0, balls=0, recent=[])
+        extra = update['extra']
+        runs = update['runs']
+        extras = update['extras']
+        score['runs'] += runs + extras
+        if extra not in ILLEGAL_EXTRAS:
+            score['balls'] += 1
+        if update['wicket']:
+            score['wickets'] += 1
+        code = 'W' if update['wicket'] else f"{runs + extras}{extra or ''}"
+        score['recent'] = (score['recent'] + [code])[-RECENT_BALLS:]
+    if update['batting']:
+        score['batting'] = update['batting']
+    if update['commentary']:
+        score['commentary'] = update['commentary']
+    score['overs'] = f"{score['balls'] // 6}.{score['balls'] % 6}"
+    score['updated_at'] = datetime.utcnow().isoformat()
+    return True
+
+
+class Broadcaster:
+    """asyncio SSE server on its own thread and port: GET /live/<match_id>"""
+
+    def __init__(self, scoreboard):
+        self.scoreboard = scoreboard
+        self.loop = None
+        self.viewers = {}
+
+    def start(self, host, port):
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(host, port, ready), name='live-score-broadcaster',
+                         daemon=True).start()
+        ready.wait(5)
+
+    def _run(self, host, port, ready):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(asyncio.start_server(self._serve, host, port))
+        except OSError as e:
+            logging.warning("Live score broadcaster not started on %s:%s: %s", host, port, e)
+            self.loop = None
+            ready.set()
+            return
+        self.loop.create_task(self._keep_alive())
+        ready.set()
+        self.loop.run_forever()
+
+    def publish(self, match_id, score):
+        """Thread-safe: send a score to every viewer of the match"""
+        if self.loop is not None and self.viewers.get(match_id):
+            data = f"event: score\ndata: {json.dumps(score)}\n\n".encode()
+            self.loop.call_soon_threadsafe(self._send, match_id, data)
+
+    def _send(self, match_id, data):
+        for writer in list(self.viewers.get(match_id, ())):
+            if writer.transport.get_write_buffer_size() > MAX_VIEWER_BUFFER:
+                self._drop(match_id, writer)
+            else:
+                writer.write(data)
+
+    def _drop(self, match_id, writer):
+        viewers = self.viewers.get(match_id)
+        if viewers is not None:
+            viewers.discard(writer)
+        writer.close()
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(KEEP_ALIVE_SECONDS)
+            for match_id in list(self.viewers):
+                self._send(match_id, b": keep-alive\n\n")
+
+    async def _serve(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            while (await asyncio.wait_for(reader.readline(), 10)) not in (b'\r\n', b'\n', b''):
+                pass
+        except (asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        found = re.match(rb'GET /live/(\d+)[ ?]', request_line)
+        if not found:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            writer.close()
+            return
+        match_id = int(found.group(1))
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+        score = self.scoreboard.peek(match_id)
+        if score is not None:
+            writer.write(f"event: score\ndata: {json.dumps(score)}\n\n".encode())
+        self.viewers.setdefault(match_id, set()).add(writer)
+        try:
+            # Viewers send nothing; EOF means they went away
+            await reader.read()
+        except ConnectionError:
+            pass
+        finally:
+            self._drop(match_id, writer)
+            if not self.viewers.get(match_id):
+                self.viewers.pop(match_id, None)
+
+    def viewer_count(self, match_id=None):
+        if match_id is not None:
+            return len(self.viewers.get(match_id, ()))
+        return sum(len(viewers) for viewers in self.viewers.values())
+
+
+class ScoreBoard:
+    """Current score per match, with coalesced persistence"""
+
+    def __init__(self):
+        self._scores = {}
+        self._versions = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self.changed = threading.Condition(self._lock)
+        self.broadcaster = Broadcaster(self)
+
+    def init_app(self, app):
+        app.config.setdefault('LIVE_SCORE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        app.config.setdefault('LIVE_SCORE_FEED_KEY', None)
+        app.config.setdefault('LIVE_SCORE_STREAM_HOST', '0.0.0.0')
+        app.config.setdefault('LIVE_SCORE_STREAM_PORT', None)
+        # Public URL template for the broadcaster, e.g. https://live.example.com/live/{match_id}
+        app.config.setdefault('LIVE_SCORE_STREAM_URL', None)
+        writer = ScoreWriter(app, self, app.config['LIVE_SCORE_FLUSH_INTERVAL'])
+        writer.start()
+        if app.config['LIVE_SCORE_STREAM_PORT']:
+            self.broadcaster.start(app.config['LIVE_SCORE_STREAM_HOST'], app.config['LIVE_SCORE_STREAM_PORT'])
+        app.extensions['live_score'] = self
+
+    def peek(self, match_id):
+        """In-memory score (no database access), or None"""
+        with self._lock:
+            score = self._scores.get(match_id)
+            return dict(score, version=self._versions[match_id]) if score is not None else None
+
+    def get(self, match_id):
+        """Current score, loaded from Match.live_score on first use (None if no such match)"""
+        score = self.peek(match_id)
+        if score is not None:
+            return score
+        with primary_only():
+            row = db.session.execute(select(Match.live_score).where(Match.id == match_id)).first()
+        if row is None:
+            return None
+        with self._lock:
+            if match_id not in self._scores:
+                self._scores[match_id] = stored_score(row.live_score)
+                self._versions[match_id] = 0
+        return self.peek(match_id)
+
+    def sync(self):
+        """Adopt scores other workers stored for the matches this worker
+        serves; returns how many changed"""
+        with self._lock:
+            match_ids = (set(self._scores) | set(self.broadcaster.viewers)) - self._dirty
+        if not match_ids:
+            return 0
+        rows = db.session.execute(
+            select(Match.id, Match.live_score).where(Match.id.in_(match_ids), Match.live_score.isnot(None))
+        ).all()
+        changed = []
+        with self._lock:
+            for match_id, live_score in rows:
+                score = stored_score(live_score)
+                current = self._scores.get(match_id)
+                # Balls ingested here since the SELECT are newer than what it saw
+                if match_id in self._dirty or current == score or \
+                        (current is not None and score['seq'] < current['seq']):
+                    continue
+                self._scores[match_id] = score
+                self._versions[match_id] = self._versions.get(match_id, 0) + 1
+                changed.append(match_id)
+            if changed:
+                self.changed.notify_all()
+        for match_id in changed:
+            self.broadcaster.publish(match_id, self.peek(match_id))
+        return len(changed)
+
+    def ingest(self, match_id, updates):
+        """Apply feed updates in order; returns (applied count, score) or None
+        if no such match. A malformed update raises TypeError or ValueError
+        and none of the batch is applied, so the feed can resend it."""
+        parsed = [parse_update(update) for update in updates]
+        if self.get(match_id) is None:
+            return None
+        with self._lock:
+            score = dict(self._scores[match_id], recent=list(self._scores[match_id]['recent']))
+            applied = sum(1 for update in parsed if apply_update(score, update))
+            if applied:
+                self._scores[match_id] = score
+                self._versions[match_id] += 1
+                self._dirty.add(match_id)
+                self.changed.notify_all()
+        result = self.peek(match_id)
+        if applied:
+            self.broadcaster.publish(match_id, result)
+        return applied, result
+
+    def wait_for_change(self, match_id, version, timeout):
+        with self._lock:
+            return self.changed.wait_for(lambda: self._versions.get(match_id) != version, timeout)
+
+    def flush(self):
+        """Write every score changed since the last flush in one executemany UPDATE"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            params = [{'mid': match_id, 'score': json.dumps(self._scores[match_id])} for match_id in dirty]
+        if not params:
+            return 0
+        matches = Match.__table__
+        try:
+            db.session.connection().execute(
+                update(matches).where(matches.c.id == bindparam('mid')).values(live_score=bindparam('score')),
+                params
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._dirty |= dirty
+            raise
+        return len(params)
+
+
+class ScoreWriter(threading.Thread):
+    """Daemon thread that persists changed scores and picks up scores
+    stored by other workers every interval seconds"""
+
+    def __init__(self, app, scoreboard, interval):
+        super().__init__(name='live-score-writer', daemon=True)
+        self.app = app
+        self.scoreboard = scoreboard
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    self.scoreboard.flush()
+                    self.scoreboard.sync()
+            except Exception:
+                logging.exception("Live score flush failed")
+
+    def stop(self):
+        self.stopped.set()
+
+
+scoreboard = ScoreBoard()
@@ -0,0 +1,301 @@
+"""
+Loyalty ledger
+Bookings append point events to loyalty_events instead of updating the
+users row inline, so on-sales do not queue on hot user rows. A settler
+folds unsettled events into User.loyalty_points with one executemany
+UPDATE per batch and promotes the users it touched to the tier their new
+balance reaches. Events are claimed with a conditional UPDATE before they
+are applied, so settlers in several workers (and the CLI) never apply the
+same event twice. reconcile() rebuilds every balance from the ledger,
+first recording points the ledger does not explain as an opening balance.
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import click
+from sqlalchemy import bindparam, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from extension import db
+from identity import invalidate_on_commit
+from models import User, Booking, LoyaltyEvent
+
+POINTS_PER_DOLLAR = 1
+DEFAULT_SETTLE_INTERVAL = 60
+DEFAULT_SETTLE_BATCH = 5000
+BOOKING_REASON = 'Booking'
+OPENING_REASON = 'Opening balance'
+
+# Minimum balance per tier, lowest first. Tiers are only ever raised
+# automatically; demotions are a manual decision.
+TIERS = (
+    ('Bronze', 0),
+    ('Silver', 500),
+    ('Gold', 2000),
+    ('Platinum', 5000),
+)
+TIER_RANK = {name: rank for rank, (name, _) in enumerate(TIERS)}
+
+
+def points_for(amount):
+    return int((amount or 0) * POINTS_PER_DOLLAR)
+
+
+def tier_for(balance, current=None):
+    """Highest tier the balance reaches, never below the current tier"""
+    tier = TIERS[0][0]
+    for name, threshold in TIERS:
+        if balance >= threshold:
+            tier = name
+    if current in TIER_RANK and TIER_RANK[current] > TIER_RANK[tier]:
+        return current
+    return tier
+
+
+def record_bookings(session, user_id, booking_ids, points):
+    """Append one event per booking written outside the ORM unit of work"""
+    rows = [
+        {'user_id': user_id, 'booking_id': booking_id, 'points': earned, 'reason': BOOKING_REASON}
+        for booking_id, earned in zip(booking_ids, points)
+        if earned
+    ]
+    if rows:
+        session.connection().execute(insert(LoyaltyEvent), rows)
+
+
+@event.listens_for(Session, 'before_flush')
+def _award_points(session, flush_context, instances):
+    for obj in session.new:
+        if isinstance(obj, Booking) and not obj.loyalty_points_earned:
+            obj.loyalty_points_earned = points_for(obj.total_amount)
+
+
+@event.listens_for(Session, 'after_flush')
+def _append_booking_events(session, flush_context):
+    rows = [
+        {'user_id': obj.user_id, 'booking_id': obj.id, 'points': obj.loyalty_points_earned,
+         'reason': BOOKING_REASON}
+        for obj in session.new
+        if isinstance(obj, Booking) and obj.loyalty_points_earned
+    ]
+    if rows:
+        session.connection().execute(insert(LoyaltyEvent), rows)
+
+
+def _apply_balances(params, touched):
+    """Add point deltas to balances, then promote the touched users whose
+    new balance reaches a higher tier; returns the number promoted"""
+    users = User.__table__
+    if params:
+        db.session.connection().execute(
+            update(users).where(users.c.id == bindparam('uid'))
+            .values(loyalty_points=users.c.loyalty_points + bindparam('delta')),
+            params
+        )
+    promotions = []
+    touched = list(touched)
+    for start in range(0, len(touched), 500):
+        rows = db.session.execute(
+            select(User.id, User.loyalty_points, User.membership_tier)
+            .where(User.id.in_(touched[start:start + 500]))
+        )
+        for user_id, balance, current in rows:
+            tier = tier_for(balance or 0, current)
+            if tier != current:
+                promotions.append({'uid': user_id, 'tier': tier})
+    if promotions:
+        db.session.connection().execute(
+            update(users).where(users.c.id == bindparam('uid')).values(membership_tier=bindparam('tier')),
+            promotions
+        )
+        invalidate_on_commit(db.session, [row['uid'] for row in promotions])
+    return len(promotions)
+
+
+def settle(batch_size=DEFAULT_SETTLE_BATCH):
+    """Fold up to batch_size unsettled events into user balances; returns
+    (events settled, users updated, users promoted)"""
+    event_ids = db.session.scalars(
+        select(LoyaltyEvent.id)
+        .where(LoyaltyEvent.settled_at.is_(None))
+        .order_by(LoyaltyEvent.id)
+        .limit(batch_size)
+    ).all()
+    if not event_ids:
+        return 0, 0, 0
+    # Claim before applying: an event another settler marked first (even
+    # one that was waiting on its lock) fails the settled_at IS NULL test
+    # and is left out, so only events claimed here are summed
+    events = LoyaltyEvent.__table__
+    now = datetime.utcnow()
+    claimed = []
+    for start in range(0, len(event_ids), 500):
+        claimed.extend(db.session.connection().execute(
+            update(events)
+            .where(events.c.id.in_(event_ids[start:start + 500]), events.c.settled_at.is_(None))
+            .values(settled_at=now)
+            .returning(events.c.user_id, events.c.points)
+        ))
+    if not claimed:
+        db.session.rollback()
+        return 0, 0, 0
+    deltas = defaultdict(int)
+    for user_id, points in claimed:
+        deltas[user_id] += points
+    promoted = _apply_balances([{'uid': uid, 'delta': delta} for uid, delta in deltas.items()], deltas)
+    db.session.commit()
+    return len(claimed), len(deltas), promoted
+
+
+def settle_all(batch_size=DEFAULT_SETTLE_BATCH):
+    totals = [0, 0, 0]
+    while True:
+        result = settle(batch_size)
+        if not result[0]:
+            return tuple(totals)
+        totals = [total + value for total, value in zip(totals, result)]
+
+
+def _chunks(query, key, chunk_size):
+    """Run a select in keyset-paginated chunks of at most chunk_size rows"""
+    last = None
+    while True:
+        stmt = query if last is None else query.where(key > last)
+        rows = db.session.execute(stmt.order_by(key).limit(chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def _record_opening_balances(chunk_size):
+    """Add a settled 'Opening balance' event for the part of each balance
+    the settled ledger does not explain (seeded or pre-ledger points);
+    once per user, so later runs still correct drift"""
+    now = datetime.utcnow()
+    settled = dict(db.session.execute(
+        select(LoyaltyEvent.user_id, func.sum(LoyaltyEvent.points))
+        .where(LoyaltyEvent.settled_at.is_not(None))
+        .group_by(LoyaltyEvent.user_id)
+    ).all())
+    opened = set(db.session.scalars(
+        select(LoyaltyEvent.user_id).where(LoyaltyEvent.reason == OPENING_REASON).distinct()
+    ))
+    recorded = 0
+    for chunk in _chunks(select(User.id, User.loyalty_points), User.id, chunk_size):
+        rows = [
+            {'user_id': user_id, 'booking_id': None, 'points': (balance or 0) - settled.get(user_id, 0),
+             'reason': OPENING_REASON, 'settled_at': now}
+            for user_id, balance in chunk
+            if user_id not in opened and (balance or 0) != settled.get(user_id, 0)
+        ]
+        if rows:
+            db.session.connection().execute(insert(LoyaltyEvent), rows)
+            recorded += len(rows)
+    return recorded
+
+
+def reconcile(chunk_size=DEFAULT_SETTLE_BATCH):
+    """Rebuild balances from the ledger: record opening balances, stream
+    completed bookings to add events missing for them, then set every
+    balance to its ledger total"""
+    opening = _record_opening_balances(chunk_size)
+    backfilled = 0
+    missing = (
+        select(Booking.id, Booking.user_id, Booking.total_amount, Booking.loyalty_points_earned)
+        .outerjoin(LoyaltyEvent, LoyaltyEvent.booking_id == Booking.id)
+        .where(LoyaltyEvent.id.is_(None), Booking.payment_status == 'completed')
+    )
+    for chunk in _chunks(missing, Booking.id, chunk_size):
+        rows = [
+            {'user_id': user_id, 'booking_id': booking_id, 'points': earned or points_for(amount),
+             'reason': BOOKING_REASON}
+            for booking_id, user_id, amount, earned in chunk
+            if earned or points_for(amount)
+        ]
+        if rows:
+            db.session.connection().execute(insert(LoyaltyEvent), rows)
+            backfilled += len(rows)
+
+    db.session.execute(update(LoyaltyEvent).where(LoyaltyEvent.settled_at.is_(None))
+                       .values(settled_at=datetime.utcnow()))
+    ledger = dict(db.session.execute(
+        select(LoyaltyEvent.user_id, func.sum(LoyaltyEvent.points)).group_by(LoyaltyEvent.user_id)
+    ).all())
+
+    users = User.__table__
+    corrected = 0
+    promoted = 0
+    for chunk in _chunks(select(User.id, User.loyalty_points, User.membership_tier), User.id, chunk_size):
+        balances = []
+        tiers = []
+        for user_id, balance, current in chunk:
+            total = ledger.get(user_id, 0)
+            if total != balance:
+                balances.append({'uid': user_id, 'points': total})
+            tier = tier_for(total, current)
+            if tier != current:
+                tiers.append({'uid': user_id, 'tier': tier})
+        if balances:
+            db.session.connection().execute(
+                update(users).where(users.c.id == bindparam('uid')).values(loyalty_points=bindparam('points')),
+                balances
+            )
+        if tiers:
+            db.session.connection().execute(
+                update(users).where(users.c.id == bindparam('uid')).values(membership_tier=bindparam('tier')),
+                tiers
+            )
+            invalidate_on_commit(db.session, [row['uid'] for row in tiers])
+        corrected += len(balances)
+        promoted += len(tiers)
+    db.session.commit()
+    return {'opening': opening, 'backfilled': backfilled, 'corrected': corrected, 'promoted': promoted}
+
+
+class LoyaltySettler(threading.Thread):
+    """Daemon thread that settles the ledger every interval seconds"""
+
+    def __init__(self, app, interval, batch_size):
+        super().__init__(name='loyalty-settler', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    settled, users, promoted = settle_all(self.batch_size)
+                if settled:
+                    logging.info("Settled %d loyalty events for %d users (%d promoted)",
+                                 settled, users, promoted)
+            except Exception:
+                logging.exception("Loyalty settlement failed")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def init_app(app):
+    app.config.setdefault('LOYALTY_SETTLE_INTERVAL', DEFAULT_SETTLE_INTERVAL)
+    app.config.setdefault('LOYALTY_SETTLE_BATCH', DEFAULT_SETTLE_BATCH)
+
+    @app.cli.command('settle-loyalty')
+    def settle_loyalty_command():
+        """Settle pending loyalty events into user balances."""
+        settled, users, promoted = settle_all(app.config['LOYALTY_SETTLE_BATCH'])
+        click.echo(f'{settled} events settled for {users} users, {promoted} promoted')
+
+    @app.cli.command('reconcile-loyalty')
+    def reconcile_loyalty_command():
+        """Rebuild loyalty balances and tiers from the ledger."""
+        result = reconcile(app.config['LOYALTY_SETTLE_BATCH'])
+        click.echo(', '.join(f'{name}={value}' for name, value in result.items()))
+
+    settler = LoyaltySettler(app, app.config['LOYALTY_SETTLE_INTERVAL'], app.config['LOYALTY_SETTLE_BATCH'])
+    settler.start()
+    app.extensions['loyalty_settler'] = settler
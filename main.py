@@ -1,4 +1,9 @@
-from app import app
+import multiprocessing
+
+# Ticket render workers (forkserver) import this script as __mp_main__;
+# only the main process builds the app and its background threads
+if multiprocessing.current_process().name == 'MainProcess':
+    from app import app
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,155 @@
+"""
+Match catalogue
+Upcoming-match listing with stadium eager loading, keyset pagination and
+filters, served from a short-lived cache that is dropped whenever a
+match row is written. The cache is shared by every request in the
+process, so pages are always read from the primary, even when the view
+is marked @read_replica.
+"""
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import and_, event, or_
+from sqlalchemy.orm import Session, contains_eager
+
+from models import Match, Stadium
+from replicas import primary_only
+
+DEFAULT_PAGE_SIZE = 24
+DEFAULT_TTL_SECONDS = 30
+MAX_CACHE_ENTRIES = 512
+
+
+class TTLCache:
+    """Small thread-safe dict cache with per-entry expiry and a generation
+    counter so fills that raced an invalidation are not stored"""
+
+    def __init__(self, ttl, max_entries=MAX_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key, value, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            if len(self._data) >= self.max_entries:
+                self._data.clear()
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+
+cache = TTLCache(DEFAULT_TTL_SECONDS)
+
+
+def encode_cursor(card):
+    return f"{card.match_date.isoformat()}_{card.id}"
+
+
+def decode_cursor(cursor):
+    try:
+        date_part, id_part = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _card(match):
+    """Detached snapshot of the fields matches.html renders"""
+    stadium = match.stadium
+    return SimpleNamespace(
+        id=match.id,
+        team1=match.team1,
+        team2=match.team2,
+        match_date=match.match_date,
+        match_type=match.match_type,
+        tournament=match.tournament,
+        ticket_price=match.ticket_price,
+        vip_price=match.vip_price,
+        premium_price=match.premium_price,
+        status=match.status,
+        weather_forecast=match.weather_forecast,
+        stadium=SimpleNamespace(
+            id=stadium.id, name=stadium.name, city=stadium.city, capacity=stadium.capacity
+        ),
+    )
+
+
+def _query_page(filters, after, limit):
+    query = Match.query.join(Match.stadium).options(contains_eager(Match.stadium)) \
+        .filter(Match.match_date > datetime.utcnow())
+    if filters.get('tournament'):
+        query = query.filter(Match.tournament == filters['tournament'])
+    if filters.get('match_type'):
+        query = query.filter(Match.match_type == filters['match_type'])
+    if filters.get('city'):
+        query = query.filter(Stadium.city == filters['city'])
+    if after:
+        after_date, after_id = after
+        query = query.filter(or_(
+            Match.match_date > after_date,
+            and_(Match.match_date == after_date, Match.id > after_id)
+        ))
+    # Rows this session already holds may have been read from a replica
+    rows = query.order_by(Match.match_date, Match.id).limit(limit + 1) \
+        .execution_options(populate_existing=True).all()
+    cards = [_card(match) for match in rows[:limit]]
+    next_cursor = encode_cursor(cards[-1]) if len(rows) > limit else None
+    return cards, next_cursor
+
+
+def upcoming_matches(tournament=None, match_type=None, city=None, cursor=None,
+                     limit=DEFAULT_PAGE_SIZE):
+    """Return (cards, next_cursor) for one page of upcoming matches"""
+    filters = {'tournament': tournament, 'match_type': match_type, 'city': city}
+    after = decode_cursor(cursor) if cursor else None
+    key = (tournament, match_type, city, after, limit)
+    page = cache.get(key)
+    if page is None:
+        generation = cache.generation
+        with primary_only():
+            page = _query_page(filters, after, limit)
+        cache.set(key, page, generation)
+    return page
+
+
+def invalidate():
+    cache.clear()
+
+
+def init_app(app):
+    app.config.setdefault('MATCH_CATALOGUE_TTL', DEFAULT_TTL_SECONDS)
+    cache.ttl = app.config['MATCH_CATALOGUE_TTL']
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_match_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Match):
+            session.info['match_catalogue_dirty'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('match_catalogue_dirty', False):
+        invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('match_catalogue_dirty', None)
@@ -29,7 +29,7 @@ class Stadium(db.Model):
     __tablename__ = 'stadiums'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
-    city = db.Column(db.String(100), nullable=False)
+    city = db.Column(db.String(100), nullable=False, index=True)
     country = db.Column(db.String(100), nullable=False, default='India')
     capacity = db.Column(db.Integer, nullable=False)
     rows = db.Column(db.Integer, nullable=False)
@@ -66,6 +66,12 @@ class Match(db.Model):
 
     bookings = db.relationship('Booking', backref='match', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_matches_date_id', 'match_date', 'id'),
+        db.Index('ix_matches_status_date', 'status', 'match_date'),
+        db.Index('ix_matches_tournament_date', 'tournament', 'match_date'),
+    )
+
     def get_live_score(self):
         return json.loads(self.live_score) if self.live_score else {}
 
@@ -75,7 +81,7 @@ class Match(db.Model):
 class Booking(db.Model):
     __tablename__ = 'bookings'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False)
     seat_row = db.Column(db.Integer, nullable=False)
     seat_number = db.Column(db.Integer, nullable=False)
@@ -83,7 +89,7 @@ class Booking(db.Model):
     total_amount = db.Column(db.Float, nullable=False)
     discount_applied = db.Column(db.Float, default=0.0)
     loyalty_points_earned = db.Column(db.Integer, default=0)
-    booking_date = db.Column(db.DateTime, default=datetime.utcnow)
+    booking_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     payment_status = db.Column(db.String(20), default='completed')
     qr_code = db.Column(db.String(255), nullable=True)
     check_in_time = db.Column(db.DateTime, nullable=True)
@@ -114,10 +120,18 @@ class SeatCategory(db.Model):
     def get_benefits(self):
         return json.loads(self.benefits) if self.benefits else []
 
+class StadiumSection(db.Model):
+    __tablename__ = 'stadium_sections'
+    id = db.Column(db.Integer, primary_key=True)
+    stadium_id = db.Column(db.Integer, db.ForeignKey('stadiums.id', ondelete='CASCADE'), nullable=False, index=True)
+    seat_category = db.Column(db.String(20), nullable=False)
+    first_row = db.Column(db.Integer, nullable=False)
+    last_row = db.Column(db.Integer, nullable=False)
+
 class PriceHistory(db.Model):
     __tablename__ = 'price_history'
     id = db.Column(db.Integer, primary_key=True)
-    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False, index=True)
     seat_category = db.Column(db.String(20), nullable=False)
     price = db.Column(db.Float, nullable=False)
     date_changed = db.Column(db.DateTime, default=datetime.utcnow)
@@ -134,3 +148,62 @@ class Notification(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship('User', backref='notifications', lazy=True)
+
+    __table_args__ = (db.Index('ix_notifications_user_read', 'user_id', 'is_read'),)
+
+class SeatHold(db.Model):
+    __tablename__ = 'seat_holds'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False)
+    seat_row = db.Column(db.Integer, nullable=False)
+    seat_number = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (db.UniqueConstraint('match_id', 'seat_row', 'seat_number'),)
+
+class LoyaltyEvent(db.Model):
+    __tablename__ = 'loyalty_events'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id', ondelete='SET NULL'), nullable=True, index=True)
+    points = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    settled_at = db.Column(db.DateTime, nullable=True, index=True)
+
+class WaitingRoomQueue(db.Model):
+    __tablename__ = 'waiting_room_queues'
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id', ondelete='CASCADE'), primary_key=True)
+    epoch = db.Column(db.String(16), nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+    burst = db.Column(db.Integer, nullable=False)
+    issued = db.Column(db.Integer, nullable=False, default=0)
+    frontier = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)
+
+class JobLease(db.Model):
+    __tablename__ = 'job_leases'
+    name = db.Column(db.String(50), primary_key=True)
+    next_run_at = db.Column(db.DateTime, nullable=False)
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counters'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+class StatDelta(db.Model):
+    __tablename__ = 'stat_deltas'
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id', ondelete='CASCADE'), nullable=True)
+    users = db.Column(db.Integer, nullable=False, default=0)
+    matches = db.Column(db.Integer, nullable=False, default=0)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class MatchBookingStat(db.Model):
+    __tablename__ = 'match_booking_stats'
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id', ondelete='CASCADE'), primary_key=True)
+    booking_count = db.Column(db.Integer, nullable=False, default=0, index=True)
+    revenue = db.Column(db.Float, nullable=False, default=0)
@@ -0,0 +1,170 @@
+"""
+Notifications
+Fan-out of per-match events (status changes, weather updates, rain delays)
+to every ticket holder. Events are queued and a background worker streams
+the match's distinct booked user ids through a server-side cursor,
+inserting Notification rows in executemany chunks in one transaction.
+Unread counts come from a per-user cached counter rather than COUNT(*).
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from extension import db
+from models import Match, Booking, Notification
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_COUNTER_TTL = 60
+PENDING_KEY = 'notification_events'
+COUNTS_KEY = 'notification_unread_deltas'
+
+# Match columns whose changes are announced to ticket holders
+WATCHED_COLUMNS = {
+    'status': 'Match status: {}',
+    'weather_forecast': 'Weather update: {}',
+}
+
+
+class UnreadCounter:
+    """Unread notifications per user, loaded with one COUNT on first use
+    and then adjusted in place; entries expire so other processes'
+    writes are picked up"""
+
+    def __init__(self, ttl=DEFAULT_COUNTER_TTL):
+        self.ttl = ttl
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self._counts.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        count = db.session.scalar(
+            select(func.count(Notification.id))
+            .where(Notification.user_id == user_id, Notification.is_read.is_(False))
+        )
+        with self._lock:
+            self._counts[user_id] = (count, time.monotonic() + self.ttl)
+        return count
+
+    def add(self, deltas):
+        """Apply {user_id: delta} to cached counts (uncached users are skipped)"""
+        with self._lock:
+            for user_id, delta in deltas.items():
+                entry = self._counts.get(user_id)
+                if entry is not None:
+                    self._counts[user_id] = (max(entry[0] + delta, 0), entry[1])
+
+    def reset(self, user_id, count=0):
+        with self._lock:
+            self._counts[user_id] = (count, time.monotonic() + self.ttl)
+
+
+class NotificationDispatcher:
+
+    def __init__(self):
+        self.app = None
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        self.counter = UnreadCounter()
+        self.queue = queue.Queue()
+        self._worker = None
+
+    def init_app(self, app):
+        app.config.setdefault('NOTIFICATION_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        app.config.setdefault('NOTIFICATION_COUNTER_TTL', DEFAULT_COUNTER_TTL)
+        self.app = app
+        self.chunk_size = app.config['NOTIFICATION_CHUNK_SIZE']
+        self.counter.ttl = app.config['NOTIFICATION_COUNTER_TTL']
+        self._worker = threading.Thread(target=self._run, name='notification-dispatcher', daemon=True)
+        self._worker.start()
+        app.extensions['notification_dispatcher'] = self
+
+    def publish(self, match_id, title, message, notification_type='info'):
+        """Queue a notification for every user holding a ticket to the match"""
+        self.queue.put((match_id, title, message, notification_type))
+
+    def fan_out(self, match_id, title, message, notification_type='info'):
+        """Insert one notification per booked user; returns the number written"""
+        conn = db.session.connection()
+        # Server-side cursor: user ids arrive chunk by chunk, never all at once
+        user_ids = conn.execution_options(stream_results=True, yield_per=self.chunk_size).execute(
+            select(Booking.user_id).where(Booking.match_id == match_id).distinct()
+        ).scalars()
+        created_at = datetime.utcnow()
+        delivered = []
+        for chunk in user_ids.partitions():
+            conn.execute(insert(Notification), [
+                {'user_id': user_id, 'title': title, 'message': message,
+                 'notification_type': notification_type, 'is_read': False, 'created_at': created_at}
+                for user_id in chunk
+            ])
+            delivered.extend(chunk)
+        db.session.commit()
+        self.counter.add({user_id: 1 for user_id in delivered})
+        return len(delivered)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                with self.app.app_context():
+                    started = time.perf_counter()
+                    count = self.fan_out(*job)
+                logging.info("Sent '%s' to %d ticket holders of match %d in %.2fs",
+                             job[1], count, job[0], time.perf_counter() - started)
+            except Exception:
+                logging.exception("Notification fan-out for match %d failed", job[0])
+
+    def unread_count(self, user_id):
+        return self.counter.get(user_id)
+
+    def mark_all_read(self, user_id):
+        db.session.execute(
+            update(Notification)
+            .where(Notification.user_id == user_id, Notification.is_read.is_(False))
+            .values(is_read=True)
+        )
+        db.session.commit()
+        self.counter.reset(user_id)
+
+
+dispatcher = NotificationDispatcher()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_match_events(session, flush_context):
+    pending = session.info.setdefault(PENDING_KEY, [])
+    deltas = session.info.setdefault(COUNTS_KEY, Counter())
+    for obj in session.dirty:
+        if isinstance(obj, Match):
+            state = inspect(obj)
+            for column, template in WATCHED_COLUMNS.items():
+                value = getattr(obj, column)
+                if state.attrs[column].history.has_changes() and value:
+                    pending.append((obj.id, f'{obj.team1} vs {obj.team2}', template.format(value)))
+        elif isinstance(obj, Notification) and inspect(obj).attrs.is_read.history.has_changes():
+            deltas[obj.user_id] += -1 if obj.is_read else 1
+    for obj in session.new:
+        if isinstance(obj, Notification) and not obj.is_read:
+            deltas[obj.user_id] += 1
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_on_commit(session):
+    for match_id, title, message in session.info.pop(PENDING_KEY, None) or ():
+        dispatcher.publish(match_id, title, message)
+    deltas = session.info.pop(COUNTS_KEY, None)
+    if deltas:
+        dispatcher.counter.add(deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop(PENDING_KEY, None)
+    session.info.pop(COUNTS_KEY, None)
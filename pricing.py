@@ -0,0 +1,373 @@
+"""
+Pricing
+Seat categories per stadium region, loyalty-tier discounts and a per-match
+price grid built once and reused for every order, so pricing a basket is
+a list lookup per seat instead of a query. Price changes are appended to
+price_history with one multi-row INSERT per flush.
+
+Grids are per process. The committing process drops its own grids at
+once; every PRICE_SYNC_INTERVAL seconds each process also drops the grids
+of matches with price_history rows newer than the last it saw, so changes
+made by other workers or the CLI are charged within that interval. Grids
+older than PRICE_GRID_TTL are rebuilt regardless, which also picks up
+section edits made elsewhere.
+
+Sections are laid out per stadium with the set-sections CLI command
+(set_sections); a stadium with none uses the default category bands.
+"""
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import click
+from sqlalchemy import DateTime, event, func, insert, inspect, literal, select
+from sqlalchemy.orm import Session
+
+from extension import db
+from models import Stadium, Match, StadiumSection, PriceHistory
+from replicas import primary_only
+from response_cache import response_cache
+
+CATEGORIES = ('Premium', 'VIP', 'Regular')
+DEFAULT_CATEGORY = 'Regular'
+PENDING_KEY = 'pricing_dirty_matches'
+DEFAULT_SYNC_INTERVAL = 2
+DEFAULT_GRID_TTL = 300
+
+# Default layout for stadiums without sections: fraction of rows (from
+# the field outwards) that belongs to each category
+CATEGORY_BANDS = {
+    'Premium': (0.0, 0.2),
+    'VIP': (0.2, 0.4),
+    'Regular': (0.4, 1.0),
+}
+
+# Discount rate per User.membership_tier
+TIER_DISCOUNTS = {
+    'Bronze': 0.0,
+    'Silver': 0.05,
+    'Gold': 0.10,
+    'Platinum': 0.15,
+}
+
+PRICE_COLUMNS = {
+    'Regular': 'ticket_price',
+    'VIP': 'vip_price',
+    'Premium': 'premium_price',
+}
+
+SECTION_PATTERN = re.compile(r'^(\w+):(\d+)-(\d+)$')
+
+QuoteLine = namedtuple('QuoteLine', 'row seat category price discount amount')
+Quote = namedtuple('Quote', 'lines subtotal discount total')
+
+
+def default_sections(total_rows):
+    """[(category, first_row, last_row)] from CATEGORY_BANDS"""
+    sections = []
+    for category, (start, end) in CATEGORY_BANDS.items():
+        first = int(total_rows * start) + 1
+        last = min(max(first, int(total_rows * end)), total_rows)
+        if first <= total_rows:
+            sections.append((category, first, last))
+    return sections
+
+
+class SectionError(ValueError):
+    """Raised for a section layout that does not fit its stadium"""
+
+
+def set_sections(stadium_id, sections):
+    """Replace a stadium's [(category, first_row, last_row)] sections; an
+    empty list restores the default bands. Grids of its matches are
+    dropped on commit."""
+    stadium = db.session.get(Stadium, stadium_id)
+    if stadium is None:
+        raise SectionError(f'No stadium with id {stadium_id}')
+    covered = set()
+    for category, first, last in sections:
+        if category not in CATEGORIES:
+            raise SectionError(f"Unknown seat category '{category}' (expected one of {', '.join(CATEGORIES)})")
+        if not 1 <= first <= last <= stadium.rows:
+            raise SectionError(f'Rows {first}-{last} are not within rows 1-{stadium.rows}')
+        rows = set(range(first, last + 1))
+        if rows & covered:
+            raise SectionError(f'Rows {first}-{last} overlap another section')
+        covered |= rows
+    # Through the ORM so _record_match_prices sees the edit
+    for section in db.session.scalars(select(StadiumSection).where(StadiumSection.stadium_id == stadium_id)):
+        db.session.delete(section)
+    db.session.add_all(
+        StadiumSection(stadium_id=stadium_id, seat_category=category, first_row=first, last_row=last)
+        for category, first, last in sections
+    )
+    db.session.commit()
+
+
+def category_prices(ticket_price, vip_price=None, premium_price=None):
+    """Price per category; unset VIP/Premium prices fall back to the tier below"""
+    vip = vip_price or ticket_price
+    return {
+        'Regular': ticket_price,
+        'VIP': vip,
+        'Premium': premium_price or vip,
+    }
+
+
+def discount_rate(tier):
+    return TIER_DISCOUNTS.get(tier or 'Bronze', 0.0)
+
+
+class PriceGrid:
+    """Category and price of every row of one match"""
+
+    def __init__(self, match_id, rows, sections, prices):
+        self.match_id = match_id
+        self.rows = rows
+        self.prices = prices
+        # Index 0 is unused so rows can be looked up directly
+        self.row_categories = [DEFAULT_CATEGORY] * (rows + 1)
+        for category, first, last in sections:
+            for row in range(max(first, 1), min(last, rows) + 1):
+                self.row_categories[row] = category
+        self.row_prices = [prices[category] for category in self.row_categories]
+        self.category_rows = {category: [] for category in CATEGORIES}
+        for row in range(1, rows + 1):
+            self.category_rows[self.row_categories[row]].append(row)
+
+    def category_of(self, row):
+        return self.row_categories[row]
+
+    def rows_of(self, category):
+        """Ascending rows that belong to a category"""
+        return self.category_rows.get(category, [])
+
+    def quote(self, seats, tier=None, unit_price=None):
+        """Price (row, seat) pairs for a member of the given tier"""
+        rate = discount_rate(tier)
+        lines = []
+        for row, seat in seats:
+            row, seat = int(row), int(seat)
+            price = self.row_prices[row] if unit_price is None else unit_price
+            discount = round(price * rate, 2)
+            lines.append(QuoteLine(row, seat, self.row_categories[row], price, discount, round(price - discount, 2)))
+        return Quote(
+            lines,
+            round(sum(line.price for line in lines), 2),
+            round(sum(line.discount for line in lines), 2),
+            round(sum(line.amount for line in lines), 2),
+        )
+
+
+class PricingEngine:
+    """PriceGrid per match, built on first use and dropped when a match's
+    prices or its stadium's sections change"""
+
+    def __init__(self):
+        self.sync_interval = DEFAULT_SYNC_INTERVAL
+        self.ttl = DEFAULT_GRID_TTL
+        self.generation = 0
+        self._grids = {}
+        self._match_generations = {}
+        self._history_mark = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('PRICE_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL)
+        app.config.setdefault('PRICE_GRID_TTL', DEFAULT_GRID_TTL)
+        self.sync_interval = app.config['PRICE_SYNC_INTERVAL']
+        self.ttl = app.config['PRICE_GRID_TTL']
+        app.extensions['pricing_engine'] = self
+
+        @app.cli.command('set-sections')
+        @click.argument('stadium_id', type=int)
+        @click.argument('sections', nargs=-1)
+        def set_sections_command(stadium_id, sections):
+            """Lay out a stadium's seat categories, e.g. Premium:1-8 VIP:9-16 Regular:17-40.
+
+            With no sections the default bands are restored. Other processes
+            charge the new layout once their grids expire (PRICE_GRID_TTL).
+            """
+            parsed = []
+            for section in sections:
+                parts = SECTION_PATTERN.match(section)
+                if parts is None:
+                    raise click.BadParameter(f"'{section}' is not CATEGORY:FIRST-LAST", param_hint='SECTIONS')
+                parsed.append((parts.group(1), int(parts.group(2)), int(parts.group(3))))
+            try:
+                set_sections(stadium_id, parsed)
+            except SectionError as e:
+                raise click.UsageError(str(e))
+            layout = parsed or default_sections(db.session.get(Stadium, stadium_id).rows)
+            click.echo(', '.join(f'{category} {first}-{last}' for category, first, last in layout))
+
+    def grid(self, match_id):
+        """PriceGrid for a match (None if the match does not exist)"""
+        self._sync()
+        entry = self._grids.get(match_id)
+        if entry is None or entry[0] < time.monotonic():
+            return self._load(match_id)
+        return entry[1]
+
+    def _sync(self):
+        """Drop grids of matches repriced by any process since the last check"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._synced_at < self.sync_interval:
+                return
+            self._synced_at = now
+            seen = self._history_mark
+        with primary_only():
+            mark = db.session.scalar(select(func.max(PriceHistory.id))) or 0
+            changed = []
+            if seen is not None and mark > seen:
+                changed = db.session.scalars(
+                    select(PriceHistory.match_id).where(PriceHistory.id > seen).distinct()
+                ).all()
+        if changed:
+            self.invalidate(changed)
+        with self._lock:
+            if self._history_mark is None or mark > self._history_mark:
+                self._history_mark = mark
+
+    def _load(self, match_id):
+        generations = (self.generation, self._match_generations.get(match_id, 0))
+        with primary_only():
+            return self._fill(match_id, generations)
+
+    def _fill(self, match_id, generations):
+        row = db.session.execute(
+            select(Match.stadium_id, Match.ticket_price, Match.vip_price, Match.premium_price, Stadium.rows)
+            .join(Stadium, Match.stadium_id == Stadium.id)
+            .where(Match.id == match_id)
+        ).first()
+        if row is None:
+            return None
+        sections = db.session.execute(
+            select(StadiumSection.seat_category, StadiumSection.first_row, StadiumSection.last_row)
+            .where(StadiumSection.stadium_id == row.stadium_id)
+            .order_by(StadiumSection.first_row)
+        ).all() or default_sections(row.rows)
+        grid = PriceGrid(match_id, row.rows, sections,
+                         category_prices(row.ticket_price, row.vip_price, row.premium_price))
+        with self._lock:
+            # A fill that raced an invalidation is used once but not kept
+            if generations == (self.generation, self._match_generations.get(match_id, 0)):
+                self._grids[match_id] = (time.monotonic() + self.ttl, grid)
+        return grid
+
+    def quote(self, match_id, seats, tier=None, unit_price=None):
+        grid = self.grid(match_id)
+        if grid is None:
+            return None
+        return grid.quote(seats, tier, unit_price)
+
+    def invalidate(self, match_ids=None):
+        """Drop grids for some matches (or all) so they are rebuilt on next use"""
+        with self._lock:
+            if match_ids is None:
+                self.generation += 1
+                self._grids.clear()
+            else:
+                for match_id in match_ids:
+                    self._match_generations[match_id] = self._match_generations.get(match_id, 0) + 1
+                    self._grids.pop(match_id, None)
+
+
+engine = PricingEngine()
+
+
+def record_price_changes(session, changes, reason=None):
+    """Append (match_id, seat_category, price) rows to price_history in one
+    statement; for prices written outside the ORM unit of work"""
+    now = datetime.utcnow()
+    rows = [
+        {'match_id': match_id, 'seat_category': category, 'price': price,
+         'date_changed': now, 'reason': reason}
+        for match_id, category, price in changes
+    ]
+    if not rows:
+        return
+    session.connection().execute(insert(PriceHistory), rows)
+    session.info.setdefault(PENDING_KEY, set()).update(row['match_id'] for row in rows)
+
+
+def record_current_prices(session, match_ids, reason=None, categories=CATEGORIES):
+    """Copy the category prices of these matches into price_history with
+    INSERT ... SELECT, one statement per category; for bulk writes"""
+    if not match_ids:
+        return
+    vip = func.coalesce(Match.vip_price, Match.ticket_price)
+    expressions = {'Regular': Match.ticket_price, 'VIP': vip, 'Premium': func.coalesce(Match.premium_price, vip)}
+    now = datetime.utcnow()
+    conn = session.connection()
+    for category in categories:
+        conn.execute(insert(PriceHistory).from_select(
+            ['match_id', 'seat_category', 'price', 'date_changed', 'reason'],
+            select(Match.id, literal(category), expressions[category], literal(now, DateTime), literal(reason))
+            .where(Match.id.in_(match_ids))
+        ))
+    session.info.setdefault(PENDING_KEY, set()).update(match_ids)
+
+
+def _effective_prices(obj, attrs=None):
+    """Category prices of a Match, before this flush if attrs are given"""
+    values = {}
+    for column in PRICE_COLUMNS.values():
+        value = getattr(obj, column)
+        if attrs is not None:
+            history = attrs[column].history
+            if history.deleted:
+                value = history.deleted[0]
+        values[column] = value
+    return category_prices(values['ticket_price'], values['vip_price'], values['premium_price'])
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_match_prices(session, flush_context):
+    created = []
+    updated = []
+    for obj in session.new:
+        if isinstance(obj, Match):
+            prices = _effective_prices(obj)
+            created.extend((obj.id, category, prices[category]) for category in CATEGORIES)
+    for obj in session.dirty:
+        if not isinstance(obj, Match):
+            continue
+        attrs = inspect(obj).attrs
+        if not any(attrs[column].history.has_changes() for column in PRICE_COLUMNS.values()):
+            continue
+        before, after = _effective_prices(obj, attrs), _effective_prices(obj)
+        updated.extend(
+            (obj.id, category, after[category]) for category in CATEGORIES
+            if after[category] != before[category]
+        )
+    record_price_changes(session, created, 'Initial price')
+    record_price_changes(session, updated, 'Price updated')
+
+    # Section edits change the grid of every match at that stadium
+    stadium_ids = {
+        obj.stadium_id for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, StadiumSection)
+    }
+    if stadium_ids:
+        session.info.setdefault(PENDING_KEY, set()).update(session.connection().execute(
+            select(Match.id).where(Match.stadium_id.in_(stadium_ids))
+        ).scalars())
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    match_ids = session.info.pop(PENDING_KEY, None)
+    if match_ids:
+        engine.invalidate(match_ids)
+        # Prices appear on the cached matches page and seat-page fragments
+        response_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,217 @@
+"""
+Read replicas
+Routes SELECTs issued by views marked @read_replica to replica engines
+(SQLALCHEMY_BINDS keys starting with 'replica'), everything else to the
+primary. Fills of process-wide caches run on the primary (primary_only()
+for price grids and identity snapshots, reread_from_primary() for
+template fragments) so a lagging replica is never cached for every later
+request. A visitor whose request committed a write reads from the primary
+for REPLICA_READ_YOUR_WRITES seconds, so a booking shows up on /tickets
+straight away. A replica that raises a database error is taken out of
+rotation for REPLICA_RETRY_AFTER seconds and the statement is rerun on
+the primary. For local testing, SQLite replicas can be refreshed from the
+primary file every REPLICA_SYNC_INTERVAL seconds (or with flask
+sync-replicas).
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import click
+from flask import g, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+PREFIX = 'replica'
+WROTE_KEY = 'wrote_primary'
+COOKIE_KEY = 'read_primary_until'
+DEFAULT_READ_YOUR_WRITES = 10
+DEFAULT_RETRY_AFTER = 30
+
+
+class RoutingSession(Session):
+    """Session that notes when it may have written to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # Flushes, DML and raw connection() calls (Core bulk writes) all
+        # count as writes for read-your-writes
+        if bind is None and (self._flushing or clause is None or clause.is_dml):
+            self.info[WROTE_KEY] = True
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaSet:
+
+    def __init__(self):
+        self.engines = {}
+        self.read_your_writes = DEFAULT_READ_YOUR_WRITES
+        self.retry_after = DEFAULT_RETRY_AFTER
+        self._down_until = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        app.config.setdefault('REPLICA_READ_YOUR_WRITES', DEFAULT_READ_YOUR_WRITES)
+        app.config.setdefault('REPLICA_RETRY_AFTER', DEFAULT_RETRY_AFTER)
+        app.config.setdefault('REPLICA_SYNC_INTERVAL', None)
+        self.read_your_writes = app.config['REPLICA_READ_YOUR_WRITES']
+        self.retry_after = app.config['REPLICA_RETRY_AFTER']
+        with app.app_context():
+            self.engines = {key: engine for key, engine in db.engines.items()
+                            if key is not None and key.startswith(PREFIX)}
+            primary = db.engine
+        if self.engines:
+            logging.info("Routing read-only views to %d replica(s)", len(self.engines))
+
+        @app.cli.command('sync-replicas')
+        def sync_replicas_command():
+            """Copy the SQLite primary over every SQLite replica (local testing)."""
+            for key in copy_sqlite(primary, self.engines):
+                click.echo(f'{key} refreshed')
+
+        interval = app.config['REPLICA_SYNC_INTERVAL']
+        if interval and self.engines:
+            syncer = ReplicaSyncer(primary, self.engines, interval)
+            syncer.start()
+            app.extensions['replica_syncer'] = syncer
+        app.extensions['read_replicas'] = self
+
+    def choose(self):
+        """A healthy replica engine at random, or None"""
+        now = time.monotonic()
+        healthy = [engine for key, engine in self.engines.items() if self._down_until.get(key, 0) <= now]
+        return random.choice(healthy) if healthy else None
+
+    def mark_down(self, engine):
+        for key, candidate in self.engines.items():
+            if candidate is engine:
+                with self._lock:
+                    self._down_until[key] = time.monotonic() + self.retry_after
+                logging.warning("Replica %s failed; reading from the primary for %ss", key, self.retry_after)
+
+    def status(self):
+        now = time.monotonic()
+        return {key: self._down_until.get(key, 0) <= now for key in self.engines}
+
+
+replicas = ReplicaSet()
+
+
+def read_replica(view):
+    """Let this view's SELECTs go to a replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def primary_reads():
+    """Keep the rest of this request's reads on the primary"""
+    g.primary_reads = True
+
+
+@contextmanager
+def primary_only():
+    """Read from the primary inside this block (fills of process-wide caches)"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('primary_reads', False)
+    g.primary_reads = True
+    try:
+        yield
+    finally:
+        g.primary_reads = previous
+
+
+def reread_from_primary(session):
+    """Send the rest of this request's reads to the primary and, when they
+    may have come from a replica, expire loaded objects so they are re-read"""
+    if not has_request_context():
+        return
+    from_replica = reads_allowed(session)
+    primary_reads()
+    if from_replica and not (session.new or session.dirty or session.deleted):
+        session.expire_all()
+
+
+def reads_allowed(session):
+    if not replicas.engines or not has_request_context() or not g.get('read_replica'):
+        return False
+    if g.get('primary_reads'):
+        return False
+    if session.info.get(WROTE_KEY):
+        return False
+    return flask_session.get(COOKIE_KEY, 0) <= time.time()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _route_reads(state):
+    if not state.is_select or state.bind_arguments.get('bind') is not None or not reads_allowed(state.session):
+        return None
+    engine = replicas.choose()
+    if engine is None:
+        return None
+    try:
+        return state.invoke_statement(bind_arguments={'bind': engine})
+    except OperationalError:
+        replicas.mark_down(engine)
+        return state.invoke_statement(bind_arguments={'bind': state.session.get_bind(clause=state.statement)})
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    if session.info.pop(WROTE_KEY, False) and has_request_context():
+        flask_session[COOKIE_KEY] = time.time() + replicas.read_your_writes
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop(WROTE_KEY, None)
+
+
+def copy_sqlite(primary, engines):
+    """Online-backup the primary SQLite file into each SQLite replica; returns the keys refreshed"""
+    refreshed = []
+    if primary.dialect.name != 'sqlite':
+        return refreshed
+    source = sqlite3.connect(primary.url.database)
+    try:
+        for key, engine in engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            target = sqlite3.connect(engine.url.database, timeout=30)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+            refreshed.append(key)
+    finally:
+        source.close()
+    return refreshed
+
+
+class ReplicaSyncer(threading.Thread):
+    """Daemon thread standing in for replication between local SQLite files"""
+
+    def __init__(self, primary, engines, interval):
+        super().__init__(name='replica-syncer', daemon=True)
+        self.primary = primary
+        self.engines = engines
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                copy_sqlite(self.primary, self.engines)
+            except Exception:
+                logging.exception("Replica sync failed")
+
+    def stop(self):
+        self.stopped.set()
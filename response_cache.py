@@ -0,0 +1,251 @@
+"""
+Response cache
+Full pages for anonymous visitors (@cached_page) and template fragments
+({% cache 'name', key %}...{% endcache %}) kept in a pluggable backend:
+an in-process LRU by default, or files under RESPONSE_CACHE_DIR that
+every worker on the host shares. Cached pages carry an ETag and
+Last-Modified so repeat visits revalidate with a 304. Entries live for
+RESPONSE_CACHE_TTL seconds and are dropped when an admin route marked
+@invalidates_pages succeeds or a match price changes. Pages and fragments
+are rendered from the primary on a miss, even inside @read_replica views.
+
+invalidate() only clears the worker it runs in when the backend is
+'memory': other workers keep their copies for up to RESPONSE_CACHE_TTL.
+Deployments with several workers per host should set
+RESPONSE_CACHE_BACKEND='disk' so every worker sees the invalidation.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import make_response, request, session as flask_session
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from extension import db
+from instrumentation import metrics
+from replicas import primary_reads, reread_from_primary
+
+DEFAULT_BACKEND = 'memory'
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class MemoryBackend:
+    """LRU dict private to this process"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskBackend:
+    """One pickle per entry in a directory shared by the workers of a host;
+    least recently read files are removed past max_entries"""
+
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.cache')
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.cache'):
+                    yield entry.path, entry.stat().st_mtime
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+            if expires_at <= time.time():
+                return None
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + ttl, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        entries = list(self._entries())
+        if len(entries) > self.max_entries:
+            entries.sort(key=lambda entry: entry[1])
+            for path, _ in entries[:len(entries) - self.max_entries]:
+                self._remove(path)
+
+    def clear(self):
+        for path, _ in list(self._entries()):
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = DEFAULT_TTL
+        # Bumped by invalidate() so a fill that raced it is not stored
+        self.generation = 0
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', DEFAULT_BACKEND)
+        app.config.setdefault('RESPONSE_CACHE_TTL', DEFAULT_TTL)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        app.config.setdefault('RESPONSE_CACHE_DIR', os.path.join(app.instance_path, 'response_cache'))
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        max_entries = app.config['RESPONSE_CACHE_MAX_ENTRIES']
+        if backend == 'memory':
+            backend = MemoryBackend(max_entries)
+        elif backend == 'disk':
+            backend = DiskBackend(app.config['RESPONSE_CACHE_DIR'], max_entries)
+        # Anything else with get/set/clear is used as given; None disables caching
+        self.backend = backend
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.extensions['response_cache'] = self
+
+    def get(self, key):
+        return self.backend.get(key) if self.backend is not None else None
+
+    def set(self, key, value, generation):
+        if self.backend is not None and generation == self.generation:
+            self.backend.set(key, value, self.ttl)
+
+    def invalidate(self):
+        """Drop every entry (with the memory backend, only this worker's)"""
+        self.generation += 1
+        if self.backend is not None:
+            self.backend.clear()
+
+    def fragment(self, key, render):
+        """Cached output of a template block, rendering it on a miss"""
+        html = self.get(key)
+        if html is None:
+            generation = self.generation
+            # Objects the view read from a replica are re-read before caching
+            reread_from_primary(db.session)
+            html = str(render())
+            self.set(key, html, generation)
+        return Markup(html)
+
+
+response_cache = ResponseCache()
+
+
+def page_key():
+    args = urlencode(sorted(request.args.items(multi=True)))
+    return f'page:{request.path}?{args}'
+
+
+def cacheable_request():
+    # Signed-in pages show the user's name and links; pending flash
+    # messages are consumed by the render
+    return (request.method == 'GET' and response_cache.backend is not None
+            and not current_user.is_authenticated and '_flashes' not in flask_session)
+
+
+def cached_page(view):
+    """Serve this view's HTML to anonymous visitors from the response cache"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not cacheable_request():
+            return view(*args, **kwargs)
+        key = page_key()
+        page = response_cache.get(key)
+        if page is None:
+            metrics.inc('response_cache_total', ('miss',))
+            generation = response_cache.generation
+            # A replica that has not caught up would pin a stale page for the TTL
+            primary_reads()
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+            body = response.get_data()
+            page = {'body': body, 'mimetype': response.mimetype, 'etag': hashlib.sha1(body).hexdigest(),
+                    'stored_at': int(time.time())}
+            response_cache.set(key, page, generation)
+        else:
+            metrics.inc('response_cache_total', ('hit',))
+            response = make_response(page['body'])
+            response.mimetype = page['mimetype']
+        response.set_etag(page['etag'])
+        response.last_modified = page['stored_at']
+        # Browsers revalidate every time; the cookie decides who gets the cached copy
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            metrics.inc('response_cache_total', ('not_modified',))
+        return response
+    return wrapper
+
+
+def invalidates_pages(view):
+    """Drop cached pages and fragments after this admin view succeeds"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        # Access-denied answers come back as 200 JSON, hence the admin check
+        if response.status_code < 400 and current_user.is_admin:
+            response_cache.invalidate()
+        return response
+    return wrapper
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache 'seats-header', match.id %}...{% endcache %}"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render', [nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        return response_cache.fragment('fragment:' + ':'.join(str(part) for part in parts), caller)
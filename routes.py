@@ -1,13 +1,35 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify, make_response
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, make_response, send_file, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager, joinedload
 from app import app, db
-from models import User, Stadium, Match, Booking
-from utils import generate_ticket_pdf
+from models import User, Stadium, Match, Booking, Notification
+import ticket_renderer
+from ticket_cache import ticket_cache, key_for as ticket_cache_key
+from checkin import gate
+from seat_inventory import inventory
+from seat_allocator import allocator, SCORERS
+import seat_holds
+import booking_service
+import pricing
+import match_catalogue
+import dashboard_stats
+import finance_export
+import fixture_import
+import instrumentation
+from waiting_room import waiting_room, session_token, store_token
+from notifications import dispatcher
+from live_score import scoreboard
+from replicas import read_replica
+from auth_service import auth, AuthBusy, AuthThrottled
+from response_cache import cached_page, invalidates_pages
 from datetime import datetime
+from io import BytesIO
+import hmac
 import json
 
 @app.route('/')
+@cached_page
 def index():
     return render_template('index.html')
 
@@ -18,16 +40,28 @@ def register():
         email = request.form['email']
         password = request.form['password']
         
+        try:
+            auth.throttle(request.remote_addr)
+        except AuthThrottled as e:
+            flash(f'Too many attempts. Please try again in {e.retry_after} seconds.', 'error')
+            return render_template('register.html'), 429, {'Retry-After': str(e.retry_after)}
+        
         # Check if user already exists
         if User.query.filter_by(email=email).first():
             flash('Email already registered. Please use a different email.', 'error')
             return render_template('register.html')
         
+        try:
+            password_hash = auth.hash_password(password)
+        except AuthBusy:
+            flash('We are handling a lot of sign-ups right now. Please try again in a moment.', 'error')
+            return render_template('register.html'), 503, {'Retry-After': '5'}
+        
         # Create new user
         user = User(
             name=name,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=password_hash,
             is_admin=False
         )
         
@@ -45,9 +79,18 @@ def login():
         email = request.form['email']
         password = request.form['password']
         
-        user = User.query.filter_by(email=email).first()
+        try:
+            auth.throttle(request.remote_addr, email)
+            user = User.query.filter_by(email=email).first()
+            verified = user is not None and auth.verify(user, password)
+        except AuthThrottled as e:
+            flash(f'Too many sign-in attempts. Please try again in {e.retry_after} seconds.', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(e.retry_after)}
+        except AuthBusy:
+            flash('We are handling a lot of sign-ins right now. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '5'}
         
-        if user and check_password_hash(user.password_hash, password):
+        if verified:
             login_user(user)
             next_page = request.args.get('next')
             if user.is_admin:
@@ -66,56 +109,231 @@ def logout():
     return redirect(url_for('index'))
 
 @app.route('/matches')
+@cached_page
+@read_replica
 def matches():
-    matches = Match.query.join(Stadium).filter(Match.match_date > datetime.utcnow()).all()
-    return render_template('matches.html', matches=matches)
+    filters = {
+        'tournament': request.args.get('tournament') or None,
+        'match_type': request.args.get('match_type') or None,
+        'city': request.args.get('city') or None,
+    }
+    matches, next_cursor = match_catalogue.upcoming_matches(cursor=request.args.get('after'), **filters)
+    return render_template('matches.html', matches=matches, filters=filters, next_cursor=next_cursor)
 
 @app.route('/seats/<int:match_id>')
+@read_replica
 @login_required
 def seats(match_id):
+    # Hot matches sit behind the waiting room until the visitor is admitted
+    if not waiting_room.is_admitted(match_id, session_token(session, match_id)):
+        return redirect(url_for('queue', match_id=match_id))
+    
     match = Match.query.get_or_404(match_id)
     stadium = match.stadium
     
-    # Get booked seats
-    bookings = Booking.query.filter_by(match_id=match_id).all()
-    booked_seats = [[booking.seat_row, booking.seat_number] for booking in bookings]
+    # Booked seats are fetched by the page from the availability feed;
+    # only seats other customers are holding right now are embedded
+    held_seats = seat_holds.held_seats(match_id, exclude_user_id=current_user.id)
     
-    return render_template('seats.html', match=match, stadium=stadium, booked_seats=booked_seats)
+    return render_template('seats.html', match=match, stadium=stadium, held_seats=held_seats,
+                           price_grid=pricing.engine.grid(match_id),
+                           discount_rate=pricing.discount_rate(current_user.membership_tier))
+
+@app.route('/api/matches/<int:match_id>/seats')
+def seat_availability(match_id):
+    """Encoded seat-map snapshot, or only the changes since ?since=<version>&epoch=<epoch>"""
+    result = inventory.availability(
+        match_id,
+        since=request.args.get('since', type=int),
+        epoch=request.args.get('epoch'),
+        encoding=request.args.get('encoding', 'bitmap')
+    )
+    if result is None:
+        return jsonify({'success': False, 'message': 'Match not found'}), 404
+    return jsonify(result)
+
+@app.route('/matches/<int:match_id>/best_available')
+@login_required
+def best_available(match_id):
+    count = request.args.get('count', 2, type=int)
+    category = request.args.get('category', 'Regular')
+    strategy = request.args.get('strategy', 'front')
+    if not 1 <= count <= 50:
+        return jsonify({'success': False, 'message': 'count must be between 1 and 50'}), 400
+    if category not in pricing.CATEGORIES or strategy not in SCORERS:
+        return jsonify({'success': False, 'message': 'Unknown category or strategy'}), 400
+    
+    # Seats other customers are holding are treated as taken
+    held = [tuple(seat) for seat in seat_holds.held_seats(match_id, exclude_user_id=current_user.id)]
+    seats = allocator.best_available(match_id, count, category, strategy, blocked=held)
+    if seats is None:
+        return jsonify({'success': False, 'message': 'Match not found'}), 404
+    if not seats:
+        return jsonify({'success': False, 'message': f'No block of {count} adjacent seats left in {category}'})
+    
+    return jsonify({
+        'success': True,
+        'category': category,
+        'seats': [{'row': row, 'seat': seat} for row, seat in seats]
+    })
+
+@app.route('/api/matches/<int:match_id>/seats/stream')
+def seat_availability_stream(match_id):
+    """Server-sent events carrying seat changes as they are committed"""
+    first = inventory.availability(match_id, encoding=request.args.get('encoding', 'bitmap'))
+    if first is None:
+        return jsonify({'success': False, 'message': 'Match not found'}), 404
+    
+    def events():
+        state = first
+        yield f"event: snapshot\ndata: {json.dumps(state)}\n\n"
+        while True:
+            if not inventory.wait_for_change(match_id, state['version'], timeout=15):
+                yield ": keep-alive\n\n"
+                continue
+            state = inventory.availability(match_id, since=state['version'], epoch=state['epoch'])
+            kind = 'delta' if 'changes' in state else 'snapshot'
+            yield f"event: {kind}\ndata: {json.dumps(state)}\n\n"
+    
+    response = app.response_class(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/book_seats', methods=['POST'])
 @login_required
 def book_seats():
-    data = request.get_json()
-    match_id = data.get('match_id')
+    data = request.get_json(silent=True) or {}
     selected_seats = data.get('seats', [])
-    
+
+    # The waiting room is keyed by int; a string id would look unqueued
+    try:
+        match_id = int(data.get('match_id'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'match_id must be an integer'}), 400
+
     if not selected_seats:
         return jsonify({'success': False, 'message': 'No seats selected'})
     
+    if not waiting_room.is_admitted(match_id, session_token(session, match_id)):
+        return jsonify({
+            'success': False,
+            'message': 'This match is busy. You have been placed in the queue.',
+            'redirect': url_for('queue', match_id=match_id)
+        })
+    
     match = Match.query.get_or_404(match_id)
+    try:
+        seat_list = [(int(seat['row']), int(seat['seat'])) for seat in selected_seats]
+    except (TypeError, ValueError, KeyError):
+        return jsonify({'success': False, 'message': 'Each seat needs an integer row and seat'}), 400
     
-    # Check if any selected seats are already booked
-    for seat in selected_seats:
-        existing_booking = Booking.query.filter_by(
-            match_id=match_id,
-            seat_row=seat['row'],
-            seat_number=seat['seat']
-        ).first()
-        if existing_booking:
-            return jsonify({
-                'success': False, 
-                'message': f'Seat {seat["row"]}-{seat["seat"]} is already booked'
-            })
+    # Hold all selected seats at once until payment or expiry
+    try:
+        expires_at = seat_holds.claim(current_user.id, match.id, seat_list, ttl=app.config['SEAT_HOLD_TTL'])
+    except seat_holds.HoldError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
+    # Price by seat category and loyalty tier; the quote is honoured at payment
+    quote = pricing.engine.quote(match.id, seat_list, current_user.membership_tier)
     
     # Store booking details in session for payment
     session['booking_details'] = {
-        'match_id': match_id,
-        'seats': selected_seats,
-        'total_amount': len(selected_seats) * match.ticket_price
+        'match_id': match.id,
+        'seats': [line._asdict() for line in quote.lines],
+        'subtotal': quote.subtotal,
+        'discount': quote.discount,
+        'total_amount': quote.total,
+        'hold_expires_at': expires_at.isoformat()
     }
     
     return jsonify({'success': True, 'redirect': url_for('payment')})
 
+@app.route('/matches/<int:match_id>/live')
+def live_score(match_id):
+    match = Match.query.get_or_404(match_id)
+    stream_url = app.config['LIVE_SCORE_STREAM_URL']
+    if stream_url:
+        stream_url = stream_url.format(match_id=match.id)
+    else:
+        stream_url = url_for('live_score_stream', match_id=match.id)
+    return render_template('live_score.html', match=match, score=scoreboard.get(match.id), stream_url=stream_url)
+
+@app.route('/api/matches/<int:match_id>/live', methods=['GET', 'POST'])
+def live_score_feed(match_id):
+    """Current score, or ingest ball-by-ball updates from the score feed"""
+    if request.method == 'GET':
+        score = scoreboard.get(match_id)
+        if score is None:
+            return jsonify({'success': False, 'message': 'Match not found'}), 404
+        return jsonify(score)
+    
+    # The feed authenticates with a shared key; admins may post manually
+    expected = app.config['LIVE_SCORE_FEED_KEY']
+    provided = request.headers.get('X-Feed-Key', '')
+    feed_ok = bool(expected) and hmac.compare_digest(provided, expected)
+    if not feed_ok and not (current_user.is_authenticated and current_user.is_admin):
+        return jsonify({'success': False, 'message': 'Invalid feed key'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    updates = data.get('updates') or [data]
+    try:
+        result = scoreboard.ingest(match_id, updates)
+    except (TypeError, ValueError, KeyError):
+        return jsonify({'success': False, 'message': 'Malformed score update'}), 400
+    if result is None:
+        return jsonify({'success': False, 'message': 'Match not found'}), 404
+    
+    applied, score = result
+    return jsonify({'success': True, 'applied': applied, 'score': score})
+
+@app.route('/api/matches/<int:match_id>/live/stream')
+def live_score_stream(match_id):
+    """In-app SSE fallback when the asyncio broadcaster has no port of its own"""
+    first = scoreboard.get(match_id)
+    if first is None:
+        return jsonify({'success': False, 'message': 'Match not found'}), 404
+    
+    def events():
+        score = first
+        yield f"event: score\ndata: {json.dumps(score)}\n\n"
+        while True:
+            if not scoreboard.wait_for_change(match_id, score['version'], timeout=15):
+                yield ": keep-alive\n\n"
+                continue
+            score = scoreboard.peek(match_id)
+            yield f"event: score\ndata: {json.dumps(score)}\n\n"
+    
+    response = app.response_class(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/queue/<int:match_id>')
+def queue(match_id):
+    if not waiting_room.is_active(match_id):
+        return redirect(url_for('seats', match_id=match_id))
+    
+    # Keep an existing valid position, otherwise join the back of the queue
+    status = waiting_room.status(match_id, session_token(session, match_id))
+    if status['position'] is None:
+        try:
+            store_token(session, match_id, waiting_room.join(match_id))
+        except KeyError:
+            # Closed since the check above
+            return redirect(url_for('seats', match_id=match_id))
+        status = waiting_room.status(match_id, session_token(session, match_id))
+    if status['admitted']:
+        return redirect(url_for('seats', match_id=match_id))
+    
+    return render_template('waiting_room.html', match_id=match_id, status=status)
+
+@app.route('/queue/<int:match_id>/status')
+def queue_status(match_id):
+    # Polled by waiting browsers: signed cookie plus the worker's copy of the queue
+    token = request.args.get('token') or session_token(session, match_id)
+    return jsonify(waiting_room.status(match_id, token))
+
 @app.route('/payment')
 @login_required
 def payment():
@@ -138,23 +356,27 @@ def process_payment():
     # Simulate payment processing
     match_id = booking_details['match_id']
     seats = booking_details['seats']
-    total_amount = booking_details['total_amount']
-    
-    # Create bookings
-    bookings = []
-    for seat in seats:
-        booking = Booking(
-            user_id=current_user.id,
-            match_id=match_id,
-            seat_row=seat['row'],
-            seat_number=seat['seat'],
-            total_amount=total_amount / len(seats),
-            payment_status='completed'
-        )
-        db.session.add(booking)
-        bookings.append(booking)
     
-    db.session.commit()
+    # Convert the seat holds into bookings in one transaction
+    try:
+        seat_holds.confirm(current_user.id, match_id, [(seat['row'], seat['seat']) for seat in seats])
+    except seat_holds.HoldError as e:
+        session.pop('booking_details', None)
+        flash(str(e), 'error')
+        return redirect(url_for('seats', match_id=match_id))
+    
+    try:
+        booking_service.create_bookings(
+            current_user.id,
+            match_id,
+            [pricing.QuoteLine(**seat) for seat in seats]
+        )
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        session.pop('booking_details', None)
+        flash('One of your seats was booked by someone else. Please choose again.', 'error')
+        return redirect(url_for('seats', match_id=match_id))
     
     # Clear session
     session.pop('booking_details', None)
@@ -163,9 +385,12 @@ def process_payment():
     return redirect(url_for('tickets'))
 
 @app.route('/tickets')
+@read_replica
 @login_required
 def tickets():
-    bookings = Booking.query.filter_by(user_id=current_user.id).join(Match).join(Stadium).all()
+    bookings = Booking.query.filter_by(user_id=current_user.id).join(Match).join(Stadium).options(
+        contains_eager(Booking.match).contains_eager(Match.stadium)
+    ).all()
     return render_template('tickets.html', bookings=bookings)
 
 @app.route('/download_ticket/<int:booking_id>')
@@ -178,37 +403,141 @@ def download_ticket(booking_id):
         flash('Access denied.', 'error')
         return redirect(url_for('tickets'))
     
-    pdf_buffer = generate_ticket_pdf(booking)
+    # Tickets never change after purchase, so the content hash is a stable ETag
+    data = ticket_renderer.ticket_data(booking)
+    key = ticket_cache_key(data)
+    if key in request.if_none_match:
+        response = make_response('', 304)
+        response.set_etag(key)
+        return response
+    
+    # Streamed from the open cache file; send_file closes it
+    pdf = ticket_cache.get(key)
+    if pdf is None:
+        # Render in the process pool so ReportLab work leaves the request thread
+        try:
+            rendered = ticket_renderer.render_ticket_pooled(data, app.config['TICKET_RENDER_TIMEOUT'])
+        except ticket_renderer.RenderUnavailable:
+            return ticket_render_busy()
+        ticket_cache.put(key, rendered)
+        pdf = BytesIO(rendered)
+    
+    response = send_file(
+        pdf,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f'ticket_{booking.id}.pdf',
+        etag=key,
+        max_age=0
+    )
+    response.cache_control.private = True
+    return response
+
+def ticket_render_busy():
+    return 'Tickets are taking longer than usual to render. Please try again shortly.', 503, {'Retry-After': '5'}
+
+def tickets_response(bookings, output_format, filename):
+    """Batch-render bookings as one multi-page PDF or a ZIP of PDFs"""
+    tickets = [ticket_renderer.ticket_data(booking) for booking in bookings]
+    timeout = app.config['TICKET_RENDER_TIMEOUT'] * max(1, len(tickets) // 100)
+    try:
+        if output_format == 'zip':
+            body = ticket_renderer.render_zip(tickets, timeout)
+            mimetype = 'application/zip'
+        else:
+            body = ticket_renderer.render_pdf_pooled(tickets, timeout)
+            mimetype = 'application/pdf'
+            output_format = 'pdf'
+    except ticket_renderer.RenderUnavailable:
+        return ticket_render_busy()
+    
+    response = make_response(body)
+    response.headers['Content-Type'] = mimetype
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{output_format}'
+    return response
+
+@app.route('/tickets/download_all')
+@login_required
+def download_all_tickets():
+    bookings = Booking.query.filter_by(user_id=current_user.id).options(
+        joinedload(Booking.match).joinedload(Match.stadium), joinedload(Booking.user)
+    ).order_by(Booking.id).all()
+    if not bookings:
+        flash('You have no tickets to download.', 'info')
+        return redirect(url_for('tickets'))
     
-    response = make_response(pdf_buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=ticket_{booking.id}.pdf'
+    return tickets_response(bookings, request.args.get('format', 'pdf'), 'my_tickets')
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: admins, or a scraper sending the bearer token"""
+    expected = app.config['METRICS_TOKEN']
+    provided = request.headers.get('Authorization', '')
+    token_ok = bool(expected) and hmac.compare_digest(provided, f'Bearer {expected}')
+    if not token_ok and not (current_user.is_authenticated and current_user.is_admin):
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    return app.response_class(instrumentation.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Gate check-in API (authenticated by device key, never touches the user table)
+def gate_authorized():
+    expected = app.config['GATE_API_KEY']
+    provided = request.headers.get('X-Gate-Key', '')
+    return bool(expected) and hmac.compare_digest(provided, expected)
+
+@app.route('/gate/check_in', methods=['POST'])
+def gate_check_in():
+    if not gate_authorized():
+        return jsonify({'success': False, 'message': 'Invalid gate key'}), 403
     
-    return response
+    data = request.get_json(silent=True) or {}
+    match_id = data.get('match_id')
+    if match_id is not None:
+        try:
+            match_id = int(match_id)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'match_id must be an integer'}), 400
+    codes = data.get('codes') or [data.get('code')]
+    if not isinstance(codes, list) or len(codes) > app.config['GATE_MAX_CODES']:
+        return jsonify({
+            'success': False,
+            'message': f"codes must be a list of at most {app.config['GATE_MAX_CODES']} codes"
+        }), 400
+    
+    results = [gate.scan(code, match_id) for code in codes]
+    return jsonify({'success': True, 'results': results})
+
+@app.route('/gate/matches/<int:match_id>/manifest')
+def gate_manifest(match_id):
+    """Offline validation set for scanners; also primes this worker's gate"""
+    if not gate_authorized():
+        return jsonify({'success': False, 'message': 'Invalid gate key'}), 403
+    
+    return jsonify(gate.preload(match_id))
 
 # Admin routes
 @app.route('/dashboard')
+@read_replica
 @login_required
 def dashboard():
     if not current_user.is_admin:
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('matches'))
     
-    # Statistics
-    total_users = User.query.count()
-    total_matches = Match.query.count()
-    total_bookings = Booking.query.count()
-    total_revenue = db.session.query(db.func.sum(Booking.total_amount)).scalar() or 0
+    # Statistics from the summary tables
+    totals = dashboard_stats.totals()
+    total_users = int(totals['users'])
+    total_matches = int(totals['matches'])
+    total_bookings = int(totals['bookings'])
+    total_revenue = totals['revenue']
     
     # Recent bookings
-    recent_bookings = Booking.query.join(Match).join(User).order_by(Booking.booking_date.desc()).limit(10).all()
+    recent_bookings = Booking.query.options(
+        joinedload(Booking.user), joinedload(Booking.match)
+    ).order_by(Booking.booking_date.desc()).limit(10).all()
     
     # Booking statistics for chart
-    booking_stats = db.session.query(
-        Match.team1,
-        Match.team2,
-        db.func.count(Booking.id).label('booking_count')
-    ).join(Booking).group_by(Match.id).all()
+    booking_stats = dashboard_stats.top_matches()
     
     return render_template('dashboard.html', 
                          total_users=total_users,
@@ -218,6 +547,32 @@ def dashboard():
                          recent_bookings=recent_bookings,
                          booking_stats=booking_stats)
 
+@app.route('/admin/export/bookings')
+@read_replica
+@login_required
+def export_bookings():
+    """Bookings with match, stadium and customer columns as a streamed file"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    try:
+        filters = {
+            'start': finance_export.parse_date(request.args.get('start'), 'start'),
+            'end': finance_export.parse_date(request.args.get('end'), 'end'),
+            'tournament': request.args.get('tournament') or None,
+            'match_id': request.args.get('match_id', type=int),
+        }
+        chunks = finance_export.export(fmt, app.config['EXPORT_BATCH_SIZE'], **filters)
+    except finance_export.ExportError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    # No Content-Length, so the body goes out chunked as rows are read
+    response = app.response_class(stream_with_context(chunks), mimetype=finance_export.FORMATS[fmt][0])
+    response.headers['Content-Disposition'] = f'attachment; filename={finance_export.filename(fmt, **filters)}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/admin/stadiums')
 @login_required
 def admin_stadiums():
@@ -230,6 +585,7 @@ def admin_stadiums():
 
 @app.route('/admin/stadiums/add', methods=['POST'])
 @login_required
+@invalidates_pages
 def add_stadium():
     if not current_user.is_admin:
         return jsonify({'success': False, 'message': 'Access denied'})
@@ -267,6 +623,7 @@ def admin_matches():
 
 @app.route('/admin/matches/add', methods=['POST'])
 @login_required
+@invalidates_pages
 def add_match():
     if not current_user.is_admin:
         return jsonify({'success': False, 'message': 'Access denied'})
@@ -276,13 +633,17 @@ def add_match():
     stadium_id = int(request.form['stadium_id'])
     match_date = datetime.strptime(request.form['match_date'], '%Y-%m-%dT%H:%M')
     ticket_price = float(request.form['ticket_price'])
+    vip_price = request.form.get('vip_price', type=float)
+    premium_price = request.form.get('premium_price', type=float)
     
     match = Match(
         team1=team1,
         team2=team2,
         stadium_id=stadium_id,
         match_date=match_date,
-        ticket_price=ticket_price
+        ticket_price=ticket_price,
+        vip_price=vip_price,
+        premium_price=premium_price
     )
     
     db.session.add(match)
@@ -290,3 +651,173 @@ def add_match():
     
     flash('Match added successfully!', 'success')
     return redirect(url_for('admin_matches'))
+
+@app.route('/admin/matches/import', methods=['POST'])
+@login_required
+def import_fixtures():
+    """Bulk fixture upload; JSON report for API clients, flashed summary for the admin page"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        if wants_json:
+            return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+        flash('Choose a file to import.', 'error')
+        return redirect(url_for('admin_matches'))
+    
+    fmt = request.form.get('format') or fixture_import.detect_format(upload.filename)
+    try:
+        report = fixture_import.import_fixtures(fixture_import.read_rows(upload.stream, fmt),
+                                                app.config['IMPORT_BATCH_SIZE'],
+                                                dry_run=bool(request.form.get('dry_run')))
+    except fixture_import.FixtureImportError as e:
+        if wants_json:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('admin_matches'))
+    
+    if wants_json:
+        return jsonify({'success': not report['error_count'], **report})
+    flash(fixture_import.summary(report), 'warning' if report['error_count'] else 'success')
+    for error in report['errors'][:10]:
+        flash(f"Row {error['row']}: {'; '.join(error['errors'])}", 'error')
+    return redirect(url_for('admin_matches'))
+
+@app.route('/admin/matches/<int:match_id>/tickets')
+@login_required
+def admin_match_tickets(match_id):
+    """Every ticket of a match for box-office printing"""
+    if not current_user.is_admin:
+        flash('Access denied.', 'error')
+        return redirect(url_for('matches'))
+    
+    match = Match.query.options(joinedload(Match.stadium)).get_or_404(match_id)
+    bookings = Booking.query.filter_by(match_id=match.id).options(joinedload(Booking.user)) \
+        .order_by(Booking.seat_row, Booking.seat_number).all()
+    if not bookings:
+        flash('This match has no bookings yet.', 'info')
+        return redirect(url_for('admin_matches'))
+    
+    return tickets_response(bookings, request.args.get('format', 'pdf'), f'match_{match.id}_tickets')
+
+@app.route('/admin/queue/<int:match_id>', methods=['POST'])
+@login_required
+def admin_queue(match_id):
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    if data.get('action') == 'close':
+        waiting_room.close(match_id)
+        return jsonify({'success': True, 'active': False})
+    
+    Match.query.get_or_404(match_id)
+    try:
+        rate = float(data.get('rate', app.config['WAITING_ROOM_RATE']))
+        burst = int(data.get('burst', app.config['WAITING_ROOM_BURST']))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'rate must be a number and burst an integer'}), 400
+    if not 0 < rate < float('inf') or burst < 0:
+        return jsonify({'success': False, 'message': 'rate must be positive and burst not negative'}), 400
+    waiting_room.open(match_id, rate, burst)
+    return jsonify({'success': True, 'active': True, 'rate': rate, 'burst': burst})
+
+@app.route('/admin/matches/<int:match_id>/status', methods=['POST'])
+@login_required
+@invalidates_pages
+def admin_match_status(match_id):
+    """Update status/weather and notify every ticket holder"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    match = Match.query.get_or_404(match_id)
+    
+    # Status and weather changes are announced automatically on commit
+    if data.get('status'):
+        match.status = data['status']
+    if data.get('weather_forecast'):
+        match.weather_forecast = data['weather_forecast']
+    db.session.commit()
+    
+    # Free-text announcements such as rain delays
+    if data.get('message'):
+        dispatcher.publish(match.id, f'{match.team1} vs {match.team2}', data['message'], 'warning')
+    
+    if request.is_json:
+        return jsonify({'success': True, 'status': match.status})
+    flash('Match updated. Ticket holders are being notified.', 'success')
+    return redirect(url_for('admin_matches'))
+
+@app.route('/notifications')
+@login_required
+def notifications():
+    items = Notification.query.filter_by(user_id=current_user.id) \
+        .order_by(Notification.created_at.desc(), Notification.id.desc()).limit(50).all()
+    unread_ids = {item.id for item in items if not item.is_read}
+    if unread_ids:
+        dispatcher.mark_all_read(current_user.id)
+    return render_template('notifications.html', notifications=items, unread_ids=unread_ids)
+
+@app.route('/api/notifications/unread_count')
+@login_required
+def unread_notifications():
+    return jsonify({'success': True, 'count': dispatcher.unread_count(current_user.id)})
+
+@app.route('/api/bookings/batch', methods=['POST'])
+@login_required
+def batch_bookings():
+    """Back-office endpoint for group and corporate orders"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    seats = data.get('seats', [])
+    if not seats:
+        return jsonify({'success': False, 'message': 'No seats selected'}), 400
+    
+    match = Match.query.get_or_404(data.get('match_id'))
+    user_id = data.get('user_id', current_user.id)
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({'success': False, 'message': 'Unknown user'}), 400
+    
+    try:
+        seat_list = [(int(seat['row']), int(seat['seat'])) for seat in seats]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Each seat needs integer row and seat'}), 400
+    
+    # Reject booked, held or duplicate seats before touching the table
+    seat_map = inventory.get(match.id)
+    unavailable = seat_map.first_unavailable(seat_list)
+    if unavailable is None:
+        held = {tuple(seat) for seat in seat_holds.held_seats(match.id)}
+        unavailable = next((seat for seat in seat_list if seat in held), None)
+    if unavailable is None and len(set(seat_list)) != len(seat_list):
+        return jsonify({'success': False, 'message': 'The same seat was listed twice'}), 400
+    if unavailable:
+        return jsonify({
+            'success': False,
+            'message': f'Seat {unavailable[0]}-{unavailable[1]} is not available'
+        }), 409
+    
+    # Category prices unless the order was negotiated at a flat amount per seat
+    unit_price = data.get('amount_per_seat')
+    if unit_price is None:
+        quote = pricing.engine.quote(match.id, seat_list, user.membership_tier)
+    else:
+        quote = pricing.engine.quote(match.id, seat_list, unit_price=float(unit_price))
+    try:
+        booking_ids = booking_service.create_bookings(user_id, match.id, quote.lines)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'One or more seats were booked concurrently'}), 409
+    
+    return jsonify({
+        'success': True,
+        'booking_ids': booking_ids,
+        'total_amount': quote.total
+    })
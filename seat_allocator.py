@@ -0,0 +1,174 @@
+"""
+Seat allocator
+Best-available search for N adjacent seats. Each match keeps a per-row
+index of free runs derived from its SeatMap. The index is refreshed
+incrementally from the map's change log, so a search only walks the
+rows of the requested category (as laid out by the pricing grid) and
+their runs.
+"""
+import bisect
+import threading
+
+import pricing
+from pricing import DEFAULT_CATEGORY
+from seat_inventory import inventory
+
+
+# Scorers rank a block (lower is better). Within a row they must prefer
+# the block closest to the centre line, which is the only one searched.
+# An optional row_bound gives the lowest score any block in a row can
+# get, letting the search stop early.
+
+def score_front(row, start, count, first_row, seats_per_row):
+    """Closest to the field first, then closest to the centre line"""
+    centre_offset = abs((start + (count - 1) / 2) - (seats_per_row + 1) / 2)
+    return (row - first_row) * seats_per_row + centre_offset
+
+
+score_front.row_bound = lambda row, first_row, seats_per_row: (row - first_row) * seats_per_row
+
+
+def score_centre(row, start, count, first_row, seats_per_row):
+    """Closest to the centre line first, then closest to the field"""
+    centre_offset = abs((start + (count - 1) / 2) - (seats_per_row + 1) / 2)
+    return centre_offset * 1000 + (row - first_row)
+
+
+SCORERS = {
+    'front': score_front,
+    'centre': score_centre,
+}
+
+
+def free_runs(seat_map, row, blocked=()):
+    """[(start_seat, length)] maximal runs of free seats in one row"""
+    runs = []
+    start = None
+    for seat in range(1, seat_map.seats_per_row + 1):
+        if seat_map.is_booked(row, seat) or (row, seat) in blocked:
+            if start is not None:
+                runs.append((start, seat - start))
+                start = None
+        elif start is None:
+            start = seat
+    if start is not None:
+        runs.append((start, seat_map.seats_per_row + 1 - start))
+    return runs
+
+
+def most_central_block(runs, starts, count, ideal):
+    """Start seat of the fitting block nearest to ideal in a row, or None
+
+    ideal is the (possibly fractional) start that centres the block. runs
+    are ordered by start seat and starts is the list of their starts. Walks
+    outwards from the run at ideal and stops at the first fitting run on
+    each side, since anything further out is further from the centre.
+    """
+    i = bisect.bisect_right(starts, ideal) - 1
+    best = None
+    for j in range(i, -1, -1):
+        run_start, length = runs[j]
+        if length >= count:
+            best = min(max(round(ideal), run_start), run_start + length - count)
+            break
+    for j in range(i + 1, len(runs)):
+        run_start, length = runs[j]
+        if length >= count:
+            if best is None or run_start - ideal < abs(best - ideal):
+                best = run_start
+            break
+    return best
+
+
+class RunIndex:
+    """Free runs and longest run per row for one SeatMap"""
+
+    def __init__(self, seat_map):
+        self.seat_map = seat_map
+        self.runs = {}
+        self.starts = {}
+        self.longest = {}
+        self.rebuild()
+
+    def rebuild(self):
+        self.epoch = self.seat_map.epoch
+        self.version = self.seat_map.version
+        for row in range(1, self.seat_map.rows + 1):
+            self._index_row(row)
+
+    def _index_row(self, row):
+        runs = free_runs(self.seat_map, row)
+        self.runs[row] = runs
+        self.starts[row] = [start for start, _ in runs]
+        self.longest[row] = max((length for _, length in runs), default=0)
+
+    def refresh(self):
+        """Re-index only the rows touched since the last refresh"""
+        if self.version == self.seat_map.version and self.epoch == self.seat_map.epoch:
+            return
+        changes = self.seat_map.changes_since(self.version) if self.epoch == self.seat_map.epoch else None
+        if changes is None:
+            self.rebuild()
+            return
+        for row in {row for row, _, _ in changes}:
+            self._index_row(row)
+        self.version = self.seat_map.version
+
+    def search(self, count, rows, scorer=score_front, blocked=()):
+        """Best (score, row, start_seat) block of count free seats within
+        rows (ascending), or None"""
+        if not rows:
+            return None
+        first_row = rows[0]
+        spr = self.seat_map.seats_per_row
+        ideal = (spr + 1) / 2 - (count - 1) / 2
+        row_bound = getattr(scorer, 'row_bound', None)
+        blocked_rows = {row for row, _ in blocked}
+        best = None
+        for row in rows:
+            if best is not None and row_bound and row_bound(row, first_row, spr) > best[0]:
+                break
+            if self.longest[row] < count:
+                continue
+            if row in blocked_rows:
+                runs = free_runs(self.seat_map, row, blocked)
+                start = most_central_block(runs, [s for s, _ in runs], count, ideal)
+            else:
+                start = most_central_block(self.runs[row], self.starts[row], count, ideal)
+            if start is None:
+                continue
+            score = scorer(row, start, count, first_row, spr)
+            if best is None or score < best[0]:
+                best = (score, row, start)
+        return best
+
+
+class SeatAllocator:
+    """RunIndex per match, built lazily from the seat inventory"""
+
+    def __init__(self, inventory):
+        self.inventory = inventory
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def best_available(self, match_id, count, category=DEFAULT_CATEGORY, strategy='front', blocked=()):
+        """List of (row, seat) for the best block, [] if none fits, None if no such match"""
+        seat_map = self.inventory.get(match_id)
+        grid = pricing.engine.grid(match_id)
+        if seat_map is None or grid is None:
+            return None
+        rows = grid.rows_of(category)
+        with self._lock:
+            index = self._indexes.get(match_id)
+            if index is None or index.seat_map is not seat_map:
+                index = self._indexes[match_id] = RunIndex(seat_map)
+            else:
+                index.refresh()
+            best = index.search(count, rows, SCORERS[strategy], set(blocked))
+        if best is None:
+            return []
+        _, row, start = best
+        return [(row, seat) for seat in range(start, start + count)]
+
+
+allocator = SeatAllocator(inventory)
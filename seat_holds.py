@@ -0,0 +1,137 @@
+"""
+Seat holds
+Temporary, all-or-nothing seat reservations taken at seat selection and
+converted into bookings at payment. Expired holds are released in bulk
+by a background sweeper thread.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from extension import db
+from models import SeatHold
+from seat_inventory import inventory
+
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_SWEEP_INTERVAL = 30
+
+
+class HoldError(Exception):
+    """Raised when seats cannot be held or a hold cannot be confirmed"""
+
+
+def _seat_filter(seats):
+    return tuple_(SeatHold.seat_row, SeatHold.seat_number).in_(list(seats))
+
+
+def claim(user_id, match_id, seats, ttl):
+    """Atomically hold every seat in seats for ttl seconds
+
+    Any previous holds the user had on this match are replaced. Returns the
+    expiry time, or raises HoldError naming a seat that is not available.
+    """
+    seats = [(int(row), int(seat)) for row, seat in seats]
+    if len(set(seats)) != len(seats):
+        raise HoldError('The same seat was selected twice')
+
+    seat_map = inventory.get(match_id)
+    unavailable = seat_map.first_unavailable(seats)
+    if unavailable:
+        raise HoldError(f'Seat {unavailable[0]}-{unavailable[1]} is already booked')
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    try:
+        # Clear our own previous holds and any expired holds on these seats,
+        # then insert every hold in one statement: the unique constraint
+        # makes the whole claim fail if another buyer got there first.
+        db.session.execute(delete(SeatHold).where(
+            SeatHold.match_id == match_id,
+            (SeatHold.user_id == user_id) |
+            ((SeatHold.expires_at <= now) & _seat_filter(seats))
+        ))
+        db.session.execute(insert(SeatHold), [
+            {'user_id': user_id, 'match_id': match_id, 'seat_row': row,
+             'seat_number': seat, 'created_at': now, 'expires_at': expires_at}
+            for row, seat in seats
+        ])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        taken = db.session.execute(
+            select(SeatHold.seat_row, SeatHold.seat_number)
+            .where(SeatHold.match_id == match_id, _seat_filter(seats))
+            .limit(1)
+        ).first()
+        seat = f'{taken[0]}-{taken[1]}' if taken else 'selected'
+        raise HoldError(f'Seat {seat} is being held by another customer')
+    return expires_at
+
+
+def confirm(user_id, match_id, seats):
+    """Consume the user's live holds on seats inside the current transaction
+
+    The caller adds the bookings and commits; nothing is committed here so
+    the holds and the bookings change together.
+    """
+    seats = [(int(row), int(seat)) for row, seat in seats]
+    result = db.session.execute(delete(SeatHold).where(
+        SeatHold.user_id == user_id,
+        SeatHold.match_id == match_id,
+        SeatHold.expires_at > datetime.utcnow(),
+        _seat_filter(seats)
+    ))
+    if result.rowcount != len(seats):
+        db.session.rollback()
+        raise HoldError('Your seat hold has expired. Please select your seats again.')
+
+
+def held_seats(match_id, exclude_user_id=None):
+    """[row, seat] pairs currently held by other customers"""
+    query = select(SeatHold.seat_row, SeatHold.seat_number).where(
+        SeatHold.match_id == match_id, SeatHold.expires_at > datetime.utcnow()
+    )
+    if exclude_user_id is not None:
+        query = query.where(SeatHold.user_id != exclude_user_id)
+    return [[row, seat] for row, seat in db.session.execute(query)]
+
+
+def sweep_expired():
+    """Delete every expired hold in one statement and return how many went"""
+    result = db.session.execute(delete(SeatHold).where(SeatHold.expires_at <= datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount
+
+
+class HoldSweeper(threading.Thread):
+    """Daemon thread that periodically releases expired holds"""
+
+    def __init__(self, app, interval):
+        super().__init__(name='seat-hold-sweeper', daemon=True)
+        self.app = app
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    released = sweep_expired()
+                if released:
+                    logging.info("Released %d expired seat holds", released)
+            except Exception:
+                logging.exception("Seat hold sweep failed")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def init_app(app):
+    app.config.setdefault('SEAT_HOLD_TTL', DEFAULT_TTL_SECONDS)
+    app.config.setdefault('SEAT_HOLD_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)
+    sweeper = HoldSweeper(app, app.config['SEAT_HOLD_SWEEP_INTERVAL'])
+    sweeper.start()
+    app.extensions['seat_hold_sweeper'] = sweeper
@@ -0,0 +1,239 @@
+"""
+Seat inventory
+Compact per-match bitmap of booked seats, loaded once from the bookings
+table and kept in sync as bookings are committed. Every change bumps a
+per-map version and is kept in a short change log so clients can fetch
+deltas instead of the whole map.
+"""
+import base64
+import itertools
+import secrets
+import threading
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extension import db
+from models import Stadium, Match, Booking
+
+PENDING_KEY = 'seat_inventory_changes'
+CHANGE_LOG_SIZE = 8192
+
+
+class SeatMap:
+    """One bit per seat for a single match (rows x seats_per_row)"""
+
+    def __init__(self, rows, seats_per_row):
+        self.rows = rows
+        self.seats_per_row = seats_per_row
+        self.bits = bytearray((rows * seats_per_row + 7) // 8)
+        self.booked_count = 0
+        # Versions are per process; the epoch tells clients when they are
+        # talking to a different map (another worker, or a reload)
+        self.epoch = secrets.token_hex(4)
+        self.version = 0
+        self.changes = deque(maxlen=CHANGE_LOG_SIZE)
+
+    @property
+    def capacity(self):
+        return self.rows * self.seats_per_row
+
+    def contains(self, row, seat):
+        return 1 <= row <= self.rows and 1 <= seat <= self.seats_per_row
+
+    def _index(self, row, seat):
+        return (row - 1) * self.seats_per_row + (seat - 1)
+
+    def is_booked(self, row, seat):
+        i = self._index(row, seat)
+        return bool(self.bits[i >> 3] & (1 << (i & 7)))
+
+    def is_available(self, row, seat):
+        return self.contains(row, seat) and not self.is_booked(row, seat)
+
+    def set_booked(self, row, seat, booked=True):
+        if not self.contains(row, seat):
+            return False
+        i = self._index(row, seat)
+        mask = 1 << (i & 7)
+        was_booked = bool(self.bits[i >> 3] & mask)
+        if booked == was_booked:
+            return False
+        if booked:
+            self.bits[i >> 3] |= mask
+            self.booked_count += 1
+        else:
+            self.bits[i >> 3] &= ~mask
+            self.booked_count -= 1
+        self.version += 1
+        self.changes.append((self.version, row, seat, int(booked)))
+        return True
+
+    def changes_since(self, version):
+        """[row, seat, booked] changes after version, or None if the log no longer reaches back that far"""
+        if version == self.version:
+            return []
+        if not self.changes or version > self.version or version < self.changes[0][0] - 1:
+            return None
+        start = version - self.changes[0][0] + 1
+        return [[row, seat, booked] for _, row, seat, booked in itertools.islice(self.changes, start, None)]
+
+    def encode_bitmap(self):
+        """Base64 of the raw bitmap (bit i = seat i in row-major order, LSB first)"""
+        return base64.b64encode(bytes(self.bits)).decode()
+
+    def encode_rle(self):
+        """Alternating run lengths over row-major seats, starting with a free run"""
+        runs = []
+        current, length = 0, 0
+        for byte in self.bits:
+            # Whole bytes that continue the current run are the common case
+            if byte == (0xFF if current else 0):
+                length += 8
+                continue
+            for bit in range(8):
+                if (byte >> bit) & 1 == current:
+                    length += 1
+                else:
+                    runs.append(length)
+                    current, length = current ^ 1, 1
+        runs.append(length)
+        # Padding bits past the last seat are zero and end up in the final free run
+        runs[-1] -= len(self.bits) * 8 - self.capacity
+        if runs[-1] == 0 and len(runs) > 1:
+            runs.pop()
+        return runs
+
+    def first_unavailable(self, seats):
+        """Return the first (row, seat) in seats that cannot be booked, or None"""
+        for row, seat in seats:
+            if not self.is_available(row, seat):
+                return row, seat
+        return None
+
+    def booked_seats(self):
+        """List of [row, seat] pairs, skipping empty bytes of the bitmap"""
+        result = []
+        spr = self.seats_per_row
+        for byte_index, byte in enumerate(self.bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (1 << bit):
+                    i = byte_index * 8 + bit
+                    result.append([i // spr + 1, i % spr + 1])
+        return result
+
+
+class SeatInventory:
+    """Registry of SeatMaps keyed by match id"""
+
+    def __init__(self):
+        self._maps = {}
+        self._lock = threading.Lock()
+        self.changed = threading.Condition(self._lock)
+
+    def get(self, match_id):
+        """Return the SeatMap for a match, loading it on first use (None if the match does not exist)"""
+        seat_map = self._maps.get(match_id)
+        if seat_map is None:
+            seat_map = self._load(match_id)
+        return seat_map
+
+    def _load(self, match_id):
+        # Loads run under the registry lock so a commit cannot slip in
+        # between reading the bookings and publishing the map.
+        with self._lock:
+            if match_id in self._maps:
+                return self._maps[match_id]
+            layout = db.session.query(Stadium.rows, Stadium.seats_per_row) \
+                .join(Match, Match.stadium_id == Stadium.id) \
+                .filter(Match.id == match_id).first()
+            if layout is None:
+                return None
+            seat_map = SeatMap(layout.rows, layout.seats_per_row)
+            seats = db.session.query(Booking.seat_row, Booking.seat_number) \
+                .filter(Booking.match_id == match_id) \
+                .execution_options(yield_per=10000)
+            for row, seat in seats:
+                seat_map.set_booked(row, seat)
+            seat_map.version = 0
+            seat_map.changes.clear()
+            self._maps[match_id] = seat_map
+            return seat_map
+
+    def apply(self, changes):
+        """Apply committed (match_id, row, seat, booked) changes to loaded maps"""
+        with self._lock:
+            for match_id, row, seat, booked in changes:
+                seat_map = self._maps.get(match_id)
+                if seat_map is not None:
+                    seat_map.set_booked(row, seat, booked)
+            self.changed.notify_all()
+
+    def availability(self, match_id, since=None, epoch=None, encoding='bitmap'):
+        """Deltas since a version when possible, otherwise a full encoded snapshot"""
+        seat_map = self.get(match_id)
+        if seat_map is None:
+            return None
+        with self._lock:
+            result = {'epoch': seat_map.epoch, 'version': seat_map.version}
+            if since is not None and epoch == seat_map.epoch:
+                changes = seat_map.changes_since(since)
+                if changes is not None:
+                    result['changes'] = changes
+                    return result
+            result.update(rows=seat_map.rows, seats_per_row=seat_map.seats_per_row,
+                          booked_count=seat_map.booked_count)
+            if encoding == 'rle':
+                result.update(encoding='rle', runs=seat_map.encode_rle())
+            else:
+                result.update(encoding='bitmap', bitmap=seat_map.encode_bitmap())
+            return result
+
+    def wait_for_change(self, match_id, version, timeout):
+        """Block until the match's map moves past version (or timeout)"""
+        seat_map = self.get(match_id)
+        with self._lock:
+            return self.changed.wait_for(lambda: seat_map.version != version, timeout)
+
+    def invalidate(self, match_id=None):
+        """Drop a match (or every match) so it is reloaded on next access"""
+        with self._lock:
+            if match_id is None:
+                self._maps.clear()
+            else:
+                self._maps.pop(match_id, None)
+
+
+inventory = SeatInventory()
+
+
+def stage(session, match_id, seats, booked=True):
+    """Queue seat changes written outside the ORM unit of work (e.g. bulk inserts)"""
+    pending = session.info.setdefault(PENDING_KEY, [])
+    pending.extend((match_id, int(row), int(seat), booked) for row, seat in seats)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_booking_changes(session, flush_context):
+    pending = session.info.setdefault(PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            pending.append((obj.match_id, obj.seat_row, obj.seat_number, True))
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            pending.append((obj.match_id, obj.seat_row, obj.seat_number, False))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_booking_changes(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        inventory.apply(pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_booking_changes(session):
+    session.info.pop(PENDING_KEY, None)
@@ -18,6 +18,20 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Unread notification badge
+    const notificationCount = document.getElementById('notification-count');
+    if (notificationCount) {
+        fetch(notificationCount.dataset.url)
+            .then(response => response.json())
+            .then(data => {
+                if (data.success && data.count > 0) {
+                    notificationCount.textContent = data.count > 99 ? '99+' : data.count;
+                    notificationCount.classList.remove('d-none');
+                }
+            })
+            .catch(() => {});
+    }
+
     // Smooth scrolling for anchor links
     document.querySelectorAll('a[href^="#"]:not([href="#"])').forEach(anchor => {
         anchor.addEventListener('click', function (e) {
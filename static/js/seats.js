@@ -5,9 +5,22 @@ class SeatSelection {
         this.matchId = options.matchId;
         this.rows = options.rows;
         this.seatsPerRow = options.seatsPerRow;
-        this.ticketPrice = options.ticketPrice;
-        this.bookedSeats = new Set(options.bookedSeats.map(seat => `${seat[0]}-${seat[1]}`));
+        // Price grid from the pricing engine (index 0 unused) and the member's tier discount
+        this.rowPrices = options.rowPrices;
+        this.rowCategories = options.rowCategories;
+        this.discountRate = options.discountRate || 0;
+        this.heldSeats = new Set(options.heldSeats.map(seat => `${seat[0]}-${seat[1]}`));
+        this.bookedSeats = new Set();
         this.selectedSeats = new Set();
+        this.seatElements = new Map();
+        
+        // Versioned availability feed (see /api/matches/<id>/seats)
+        this.availabilityUrl = options.availabilityUrl;
+        this.streamUrl = options.streamUrl;
+        this.epoch = null;
+        this.version = null;
+        this.pollTimer = null;
+        this.bestAvailableUrl = options.bestAvailableUrl;
         
         this.init();
     }
@@ -15,6 +28,109 @@ class SeatSelection {
     init() {
         this.generateSeatsGrid();
         this.bindEvents();
+        this.loadAvailability();
+    }
+    
+    loadAvailability() {
+        fetch(this.availabilityUrl)
+            .then(response => response.json())
+            .then(state => {
+                this.applyAvailability(state);
+                this.subscribe();
+            })
+            .catch(() => this.schedulePoll());
+    }
+    
+    subscribe() {
+        if (!window.EventSource || !this.streamUrl) {
+            this.schedulePoll();
+            return;
+        }
+        const source = new EventSource(this.streamUrl);
+        const handler = (e) => this.applyAvailability(JSON.parse(e.data));
+        source.addEventListener('snapshot', handler);
+        source.addEventListener('delta', handler);
+        source.onerror = () => {
+            // Fall back to polling for deltas if the stream is unavailable
+            source.close();
+            this.schedulePoll();
+        };
+    }
+    
+    schedulePoll() {
+        clearTimeout(this.pollTimer);
+        this.pollTimer = setTimeout(() => this.poll(), 5000);
+    }
+    
+    poll() {
+        let url = this.availabilityUrl;
+        if (this.version !== null) {
+            url += `?since=${this.version}&epoch=${encodeURIComponent(this.epoch)}`;
+        }
+        fetch(url)
+            .then(response => response.json())
+            .then(state => this.applyAvailability(state))
+            .finally(() => this.schedulePoll());
+    }
+    
+    applyAvailability(state) {
+        if (state.changes) {
+            state.changes.forEach(([row, seat, booked]) => this.setSeatBooked(`${row}-${seat}`, booked === 1));
+        } else {
+            const booked = this.decodeSnapshot(state);
+            this.seatElements.forEach((element, seatKey) => this.setSeatBooked(seatKey, booked.has(seatKey)));
+        }
+        this.epoch = state.epoch;
+        this.version = state.version;
+    }
+    
+    decodeSnapshot(state) {
+        // Both encodings describe seats in row-major order
+        const booked = new Set();
+        const addIndex = (i) => booked.add(`${Math.floor(i / state.seats_per_row) + 1}-${(i % state.seats_per_row) + 1}`);
+        if (state.encoding === 'rle') {
+            let index = 0;
+            state.runs.forEach((length, n) => {
+                if (n % 2 === 1) {
+                    for (let i = index; i < index + length; i++) addIndex(i);
+                }
+                index += length;
+            });
+        } else {
+            const bytes = atob(state.bitmap);
+            for (let b = 0; b < bytes.length; b++) {
+                const byte = bytes.charCodeAt(b);
+                if (!byte) continue;
+                for (let bit = 0; bit < 8; bit++) {
+                    if (byte & (1 << bit)) addIndex(b * 8 + bit);
+                }
+            }
+        }
+        return booked;
+    }
+    
+    setSeatBooked(seatKey, booked) {
+        const element = this.seatElements.get(seatKey);
+        if (!element) return;
+        
+        if (booked) {
+            this.bookedSeats.add(seatKey);
+        } else {
+            this.bookedSeats.delete(seatKey);
+        }
+        const unavailable = booked || this.heldSeats.has(seatKey);
+        element.classList.toggle('booked', unavailable);
+        element.classList.toggle('available', !unavailable);
+        element.title = unavailable
+            ? 'Seat already booked'
+            : this.seatTitle(element.dataset.row, element.dataset.seat);
+        
+        if (unavailable && this.selectedSeats.has(seatKey)) {
+            element.classList.remove('selected');
+            this.selectedSeats.delete(seatKey);
+            this.updateSummary();
+            showError(`Row ${element.dataset.row}, Seat ${element.dataset.seat} was just booked by someone else.`);
+        }
     }
     
     generateSeatsGrid() {
@@ -45,15 +161,16 @@ class SeatSelection {
                 seatElement.dataset.seat = seat;
                 seatElement.textContent = seat;
                 
-                // Set seat status
-                if (this.bookedSeats.has(seatKey)) {
+                // Set seat status (booked seats arrive from the availability feed)
+                if (this.heldSeats.has(seatKey)) {
                     seatElement.classList.add('booked');
                     seatElement.title = 'Seat already booked';
                 } else {
                     seatElement.classList.add('available');
-                    seatElement.title = `Row ${row}, Seat ${seat} - $${this.ticketPrice.toFixed(2)}`;
+                    seatElement.title = this.seatTitle(row, seat);
                 }
                 
+                this.seatElements.set(seatKey, seatElement);
                 seatsContainer.appendChild(seatElement);
             }
             
@@ -72,6 +189,15 @@ class SeatSelection {
             }
         });
         
+        const bestBtn = document.getElementById('best-available-btn');
+        if (bestBtn) {
+            bestBtn.addEventListener('click', () => {
+                const count = document.getElementById('best-count').value;
+                const category = document.getElementById('best-category').value;
+                this.selectBestAvailable(count, category);
+            });
+        }
+        
         const proceedBtn = document.getElementById('proceed-btn');
         if (proceedBtn) {
             proceedBtn.addEventListener('click', () => {
@@ -80,6 +206,36 @@ class SeatSelection {
         }
     }
     
+    selectBestAvailable(count, category) {
+        const url = `${this.bestAvailableUrl}?count=${count}&category=${encodeURIComponent(category)}`;
+        fetch(url)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    showError(data.message || 'No suitable seats found.');
+                    return;
+                }
+                // Replace the current selection with the suggested block
+                this.selectedSeats.forEach(seatKey => {
+                    const element = this.seatElements.get(seatKey);
+                    if (element) element.classList.remove('selected');
+                });
+                this.selectedSeats.clear();
+                data.seats.forEach(({ row, seat }) => {
+                    const seatKey = `${row}-${seat}`;
+                    const element = this.seatElements.get(seatKey);
+                    if (element) {
+                        element.classList.add('selected');
+                        this.selectedSeats.add(seatKey);
+                    }
+                });
+                this.updateSummary();
+                const first = this.seatElements.get(`${data.seats[0].row}-${data.seats[0].seat}`);
+                if (first) first.scrollIntoView({ block: 'center', behavior: 'smooth' });
+            })
+            .catch(() => showError('An error occurred. Please try again.'));
+    }
+    
     toggleSeat(seatElement) {
         const row = parseInt(seatElement.dataset.row);
         const seat = parseInt(seatElement.dataset.seat);
@@ -123,7 +279,7 @@ class SeatSelection {
                 return `
                     <div class="d-flex justify-content-between align-items-center mb-1">
                         <span>Row ${row}, Seat ${seat}</span>
-                        <span class="text-success">$${this.ticketPrice.toFixed(2)}</span>
+                        <span class="text-success">$${this.seatPrice(row).toFixed(2)}</span>
                     </div>
                 `;
             }).join('');
@@ -136,7 +292,20 @@ class SeatSelection {
         }
         
         seatCountElement.textContent = this.selectedSeats.size;
-        totalAmountElement.textContent = `$${(this.selectedSeats.size * this.ticketPrice).toFixed(2)}`;
+        const total = Array.from(this.selectedSeats)
+            .reduce((sum, seatKey) => sum + this.seatPrice(seatKey.split('-')[0]), 0);
+        totalAmountElement.textContent = `$${total.toFixed(2)}`;
+    }
+    
+    seatPrice(row) {
+        // Same rounding as pricing.PriceGrid.quote
+        const price = this.rowPrices[Number(row)];
+        const discount = Math.round(price * this.discountRate * 100) / 100;
+        return price - discount;
+    }
+    
+    seatTitle(row, seat) {
+        return `Row ${row}, Seat ${seat} (${this.rowCategories[Number(row)]}) - $${this.seatPrice(row).toFixed(2)}`;
     }
     
     proceedToPayment() {
@@ -167,6 +336,9 @@ class SeatSelection {
         .then(data => {
             if (data.success) {
                 window.location.href = data.redirect;
+            } else if (data.redirect) {
+                // Sent to the waiting room for a busy match
+                window.location.href = data.redirect;
             } else {
                 showError(data.message || 'Failed to book seats. Please try again.');
             }
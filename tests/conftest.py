@@ -0,0 +1,97 @@
+"""
+Shared fixtures
+The app runs against a throwaway SQLite database that is emptied before
+every test, along with the process-wide caches that would otherwise carry
+rows from one test into the next. No app context is left pushed, so each
+test client request gets its own session as it would in production;
+tests and factories open one around their own database work.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Never the configured database: every test starts by dropping all tables
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+
+from app import app as flask_app, db
+from identity import identities, ALL_USERS
+from response_cache import response_cache
+from seat_inventory import inventory
+from waiting_room import waiting_room
+import auth_service
+import match_catalogue
+import models
+import pricing
+
+
+@pytest.fixture
+def app(monkeypatch):
+    flask_app.config['TESTING'] = True
+    # Hash inline rather than starting a process pool per test run
+    monkeypatch.setattr(auth_service, '_workers', 0)
+    monkeypatch.setattr(auth_service.auth.ip_limiter, 'rate', None)
+    monkeypatch.setattr(auth_service.auth.email_limiter, 'rate', None)
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+    identities.invalidate(ALL_USERS)
+    match_catalogue.invalidate()
+    pricing.engine.invalidate()
+    response_cache.invalidate()
+    inventory.invalidate()
+    monkeypatch.setattr(waiting_room, '_queues', {})
+    return flask_app
+
+
+@pytest.fixture
+def stadium(app):
+    """Id of a 40 x 60 stadium"""
+    with app.app_context():
+        stadium = models.Stadium(name='MCG', city='Melbourne', capacity=2400, rows=40, seats_per_row=60)
+        db.session.add(stadium)
+        db.session.commit()
+        return stadium.id
+
+
+@pytest.fixture
+def make_match(app, stadium):
+    def make_match(**values):
+        """Id of a new upcoming match"""
+        values = {'team1': 'India', 'team2': 'Pakistan', 'stadium_id': stadium,
+                  'match_date': datetime.utcnow() + timedelta(days=10), 'ticket_price': 50.0,
+                  'vip_price': 120.0, 'premium_price': 250.0, **values}
+        with app.app_context():
+            match = models.Match(**values)
+            db.session.add(match)
+            db.session.commit()
+            return match.id
+    return make_match
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(email='fan@example.com', password='secret', **values):
+        """Id of a new user"""
+        with app.app_context():
+            user = models.User(name='Fan', email=email,
+                               password_hash=auth_service.auth.hash_password(password), **values)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def login(app):
+    def login(email='fan@example.com', password='secret'):
+        client = app.test_client()
+        response = client.post('/login', data={'email': email, 'password': password})
+        assert response.status_code == 302
+        return client
+    return login
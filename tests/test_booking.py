@@ -0,0 +1,39 @@
+import pytest
+
+
+@pytest.mark.parametrize('seats', [
+    [{'row': 1}],
+    [{'seat': 1}],
+    [{'row': 'A', 'seat': 1}],
+    [{'row': None, 'seat': 1}],
+    [[1, 1]],
+    ['1-1'],
+    [None],
+    5,
+])
+def test_malformed_seats_are_rejected(make_match, make_user, login, seats):
+    make_user()
+    match_id = make_match()
+
+    response = login().post('/book_seats', json={'match_id': match_id, 'seats': seats})
+
+    assert response.status_code == 400
+    assert response.json['success'] is False
+
+
+def test_seats_outside_the_stadium_are_refused(make_match, make_user, login):
+    make_user()
+    match_id = make_match()
+
+    response = login().post('/book_seats', json={'match_id': match_id, 'seats': [{'row': 41, 'seat': 1}]})
+
+    assert response.json['success'] is False
+
+
+def test_valid_seats_are_held(make_match, make_user, login):
+    make_user()
+    match_id = make_match()
+
+    response = login().post('/book_seats', json={'match_id': match_id, 'seats': [{'row': '3', 'seat': 7}]})
+
+    assert response.json == {'success': True, 'redirect': '/payment'}
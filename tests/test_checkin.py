@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from checkin import gate, OK, DUPLICATE, INVALID, WRONG_MATCH
+from extension import db
+from models import Booking
+import checkin
+
+
+@pytest.fixture
+def gate_state(app, monkeypatch):
+    """The process-wide gate with no manifests, admissions or queued writes"""
+    for name in ('_manifests', '_admitted', '_loading', '_attempted'):
+        monkeypatch.setattr(gate, name, {})
+    monkeypatch.setattr(gate.writer, 'submit', lambda *args: None)
+    return gate
+
+
+@pytest.fixture
+def ticket(app, make_match, make_user, gate_state):
+    """Issue a ticket: a booking whose qr_code is a signed gate code"""
+    match_id = make_match()
+    user_id = make_user()
+
+    def ticket(seat_row=1, seat_number=1):
+        code = gate.sign(match_id, seat_row, seat_number, user_id)
+        with app.app_context():
+            db.session.add(Booking(user_id=user_id, match_id=match_id, seat_row=seat_row,
+                                   seat_number=seat_number, total_amount=50.0, qr_code=code))
+            db.session.commit()
+        return match_id, code
+    return ticket
+
+
+def test_signed_codes_round_trip_and_tampering_fails():
+    signer = checkin.TicketSigner('secret')
+    code = signer.sign(7, 3, 12, 99)
+
+    assert signer.verify(code) == (7, 3, 12, 99)
+    assert signer.verify(code.replace(':3:', ':4:')) is None
+    assert signer.verify(code[:-1] + ('A' if code[-1] != 'A' else 'B')) is None
+    assert checkin.TicketSigner('other').verify(code) is None
+    assert signer.verify('CT1:7:3:12:99:é') is None
+    assert signer.verify(None) is None
+
+
+def test_scan_admits_once(app, ticket):
+    match_id, code = ticket()
+    with app.app_context():
+        assert gate.scan(code, match_id) == OK
+        assert gate.scan(code, match_id) == DUPLICATE
+        assert gate.scan(code, match_id + 1) == WRONG_MATCH
+
+
+def test_cancelled_ticket_is_refused(app, ticket):
+    match_id, code = ticket()
+    with app.app_context():
+        db.session.query(Booking).delete()
+        db.session.commit()
+
+        assert gate.scan(code, match_id) == INVALID
+
+
+def test_checked_in_elsewhere_is_a_duplicate(app, ticket):
+    match_id, code = ticket()
+    with app.app_context():
+        db.session.query(Booking).update({'check_in_time': db.func.current_timestamp()})
+        db.session.commit()
+
+        assert gate.scan(code, match_id) == DUPLICATE
+
+
+def test_ticket_bought_after_the_manifest_loaded(app, ticket, monkeypatch):
+    monkeypatch.setattr(checkin, 'MANIFEST_RECHECK_INTERVAL', 0)
+    match_id, first = ticket(1, 1)
+    with app.app_context():
+        assert gate.scan(first, match_id) == OK
+    _, second = ticket(1, 2)
+    with app.app_context():
+        assert gate.scan(second, match_id) == OK
+
+
+def test_concurrent_first_scans_load_the_manifest_once(app, ticket, monkeypatch):
+    match_id, code = ticket()
+    loads = []
+    manifest = gate.manifest
+
+    def slow_manifest(match_id):
+        loads.append(match_id)
+        time.sleep(0.2)
+        return manifest(match_id)
+    monkeypatch.setattr(gate, 'manifest', slow_manifest)
+    results = []
+
+    def scan():
+        with app.app_context():
+            results.append(gate.scan(code, match_id))
+    threads = [threading.Thread(target=scan) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == [match_id]
+    assert sorted(results) == [DUPLICATE] * 7 + [OK]
+
+
+def test_failed_reload_keeps_the_last_manifest(app, ticket, monkeypatch):
+    match_id, code = ticket()
+    with app.app_context():
+        gate.preload(match_id)
+    monkeypatch.setattr(gate, 'manifest_ttl', 0)
+    monkeypatch.setattr(checkin, 'MANIFEST_RECHECK_INTERVAL', 0)
+
+    def db_down(match_id):
+        raise OperationalError('SELECT', {}, Exception('database is down'))
+    monkeypatch.setattr(gate, 'manifest', db_down)
+
+    with app.app_context():
+        assert gate.scan(code, match_id) == OK
+        assert gate.scan('CT1:1:1:1:1:forged', match_id) == INVALID
+
+
+def test_no_manifest_falls_back_to_the_signature(app, ticket, monkeypatch):
+    match_id, code = ticket()
+
+    def db_down(match_id):
+        raise OperationalError('SELECT', {}, Exception('database is down'))
+    monkeypatch.setattr(gate, 'manifest', db_down)
+
+    with app.app_context():
+        assert gate.scan(code, match_id) == OK
+        assert gate.scan(code, match_id) == DUPLICATE
@@ -0,0 +1,35 @@
+from sqlalchemy import delete
+
+from extension import db
+from models import StatCounter
+import dashboard_stats
+
+
+def test_first_run_seeds_the_summary_once(app, make_user, make_match):
+    make_user()
+    make_match()
+    with app.app_context():
+        db.session.execute(delete(StatCounter))
+        db.session.commit()
+
+        # Workers starting together: one seeds, the others skip
+        assert [dashboard_stats.seed() for _ in range(3)] == [True, False, False]
+        assert dashboard_stats.totals() == {'users': 1, 'matches': 1, 'bookings': 0, 'revenue': 0}
+
+        # Emptied again within the lease: left to the rebuild-stats command
+        db.session.execute(delete(StatCounter))
+        db.session.commit()
+        assert dashboard_stats.seed() is False
+
+
+def test_deltas_fold_into_the_totals(app, make_user):
+    make_user()
+    make_user(email='second@example.com')
+    with app.app_context():
+        dashboard_stats.rebuild()
+        make_user(email='third@example.com')
+
+        assert dashboard_stats.totals()['users'] == 3
+        assert dashboard_stats.fold_all() == 1
+        assert dashboard_stats.totals()['users'] == 3
+        assert db.session.get(StatCounter, 'users').value == 3
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from extension import db
+from models import Match, PriceHistory
+import dynamic_pricing
+
+
+def prices(match_id):
+    match = db.session.get(Match, match_id, populate_existing=True)
+    return match.ticket_price, match.vip_price, match.premium_price
+
+
+def test_flat_demand_settles_on_a_fixed_point(app, stadium):
+    with app.app_context():
+        # Inserted outside the ORM, so the match has no price_history at all
+        match_id = db.session.execute(insert(Match).returning(Match.id), {
+            'team1': 'India', 'team2': 'Pakistan', 'stadium_id': stadium,
+            'match_date': datetime.utcnow() + timedelta(days=10),
+            'ticket_price': 50.0, 'vip_price': 120.0, 'premium_price': 250.0,
+        }).scalar_one()
+        db.session.commit()
+
+        for _ in range(30):
+            report = dynamic_pricing.reprice()
+
+        # No demand: MIN_MULTIPLIER of the first run's prices, then no more moves
+        assert prices(match_id) == (40.0, 96.0, 200.0)
+        assert report['repriced'] == 0
+        bases = db.session.scalars(
+            select(PriceHistory.price).where(PriceHistory.reason == dynamic_pricing.BASE_REASON)
+        ).all()
+        assert sorted(bases) == [50.0, 120.0, 250.0]
+
+
+def test_admin_price_change_becomes_the_base(app, make_match):
+    match_id = make_match()
+    with app.app_context():
+        for _ in range(10):
+            dynamic_pricing.reprice()
+        assert prices(match_id)[0] == 40.0
+
+        db.session.get(Match, match_id).ticket_price = 100.0
+        db.session.commit()
+        for _ in range(10):
+            dynamic_pricing.reprice()
+
+        assert prices(match_id)[0] == 80.0
+
+
+def test_dry_run_writes_nothing(app, make_match):
+    match_id = make_match()
+    with app.app_context():
+        history = db.session.query(PriceHistory).count()
+
+        report = dynamic_pricing.reprice(dry_run=True)
+
+        assert report['repriced'] == 1
+        assert prices(match_id) == (50.0, 120.0, 250.0)
+        assert db.session.query(PriceHistory).count() == history
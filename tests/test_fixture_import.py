@@ -0,0 +1,109 @@
+import io
+import json
+
+import pytest
+
+from extension import db
+from models import Match, Stadium, PriceHistory
+import fixture_import
+
+HEADER = 'stadium,city,rows,seats_per_row,team1,team2,match_date,ticket_price,vip_price\n'
+
+
+def run_import(app, text, fmt='csv', dry_run=False):
+    with app.app_context():
+        rows = fixture_import.read_rows(io.BytesIO(text.encode() if isinstance(text, str) else text), fmt)
+        return fixture_import.import_fixtures(rows, dry_run=dry_run)
+
+
+def errors(report):
+    return {error['row']: error['errors'] for error in report['errors']}
+
+
+def test_new_venue_and_fixtures_are_created(app):
+    report = run_import(app, HEADER +
+                        'Eden Gardens,Kolkata,30,50,India,England,2026-11-02T14:30,40,90\n'
+                        'Eden Gardens,,,,India,Australia,2026-11-09T14:30,45,\n')
+
+    assert (report['stadiums_created'], report['matches_created'], report['error_count']) == (1, 2, 0)
+    with app.app_context():
+        assert db.session.query(Stadium.rows, Stadium.seats_per_row, Stadium.capacity).one() == (30, 50, 1500)
+        assert db.session.query(PriceHistory).filter_by(reason='Initial price').count() == 6
+
+
+@pytest.mark.parametrize('line, message', [
+    ('MCG,Melbourne,,,India,India,2026-11-02,40,', 'team1 and team2 must differ'),
+    ('MCG,Melbourne,,,India,,2026-11-02,40,', 'team1 and team2 are both required for a fixture'),
+    ('MCG,Melbourne,,,India,England,02/11/2026,40,', 'match_date must look like 2025-11-02T14:30'),
+    ('MCG,Melbourne,,,India,England,2026-11-02,,', 'ticket_price is required'),
+    ('MCG,Melbourne,,,India,England,2026-11-02,free,', 'ticket_price must be a number'),
+    ('MCG,Melbourne,,,India,England,2026-11-02,-5,', 'ticket_price must be positive'),
+    ('Lord\'s,London,,,India,England,2026-11-02,40,',
+     "unknown stadium 'Lord's'; give city, rows and seats_per_row to create it"),
+    ('Lord\'s,London,900,50,India,England,2026-11-02,40,', 'rows must be between 1 and 500'),
+    (',,,,India,England,2026-11-02,40,', 'stadium is required'),
+])
+def test_invalid_rows_are_reported_and_skipped(app, stadium, line, message):
+    report = run_import(app, HEADER + line + '\nMCG,Melbourne,,,India,Pakistan,2026-11-03,40,\n')
+
+    assert message in errors(report)[1]
+    assert (report['matches_created'], report['error_count']) == (1, 1)
+
+
+def test_invalid_row_does_not_create_its_stadium(app):
+    report = run_import(app, HEADER + 'Lord\'s,London,30,50,India,England,not a date,40,\n')
+
+    assert report['stadiums_created'] == 0
+    with app.app_context():
+        assert db.session.query(Stadium).count() == 0
+
+
+def test_ambiguous_stadium_name_needs_a_city(app, stadium):
+    run_import(app, 'stadium,city,rows,seats_per_row\nMCG,Manchester,20,20\n')
+
+    report = run_import(app, HEADER + 'MCG,,,,India,England,2026-11-02,40,\n')
+
+    assert errors(report) == {1: ["stadium 'MCG' exists in several cities; add a city"]}
+
+
+def test_reimport_updates_prices_and_keeps_empty_columns(app, stadium):
+    run_import(app, HEADER + 'MCG,Melbourne,,,India,England,2026-11-02T14:30,40,90\n')
+
+    report = run_import(app, HEADER + 'mcg,melbourne,,,india,england,2026-11-02T14:30,55,\n')
+
+    assert (report['matches_created'], report['matches_updated']) == (0, 1)
+    with app.app_context():
+        assert db.session.query(Match.ticket_price, Match.vip_price).one() == (55.0, 90.0)
+        assert db.session.query(PriceHistory).filter_by(reason='Fixture import').count() == 1
+
+
+def test_json_lines_report_bad_lines(app, stadium):
+    lines = [json.dumps({'stadium': 'MCG', 'team1': 'India', 'team2': 'England',
+                         'match_date': '2026-11-02', 'ticket_price': 40}), '{not json', '[1, 2]']
+
+    report = run_import(app, '\n'.join(lines), 'jsonl')
+
+    assert report['matches_created'] == 1
+    assert errors(report)[2][0].startswith('invalid JSON')
+    assert errors(report)[3] == ['not a fixture object: [1, 2]']
+
+
+def test_dry_run_saves_nothing(app, stadium):
+    report = run_import(app, HEADER + 'MCG,Melbourne,,,India,England,2026-11-02,40,\n', dry_run=True)
+
+    assert report['matches_created'] == 1
+    with app.app_context():
+        assert db.session.query(Match).count() == 0
+
+
+@pytest.mark.parametrize('data, fmt, message', [
+    (b'stadium,team1\nMCG,\xff\xfe\n', 'csv', 'not UTF-8'),
+    ('team1,team2\nIndia,England\n', 'csv', 'header row'),
+    ('{"stadium": "MCG"}', 'json', 'list of fixture objects'),
+    ('[{"stadium": ', 'json', 'Invalid JSON'),
+])
+def test_unreadable_files_are_rejected_whole(app, stadium, data, fmt, message):
+    with pytest.raises(fixture_import.FixtureImportError, match=message):
+        run_import(app, data, fmt)
+    with app.app_context():
+        assert db.session.query(Match).count() == 0
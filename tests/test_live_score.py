@@ -0,0 +1,68 @@
+import pytest
+
+from live_score import ScoreBoard
+
+
+@pytest.fixture
+def workers(app):
+    """Two scoreboards standing in for two workers; neither starts its
+    writer thread, so tests flush and sync by hand"""
+    return ScoreBoard(), ScoreBoard()
+
+
+def test_other_workers_pick_up_ingested_balls(app, make_match, workers):
+    match_id = make_match()
+    feed, viewer = workers
+    with app.app_context():
+        assert viewer.get(match_id)['runs'] == 0
+        feed.ingest(match_id, [{'seq': 1, 'runs': 4}, {'seq': 2, 'runs': 0, 'wicket': True}])
+        feed.flush()
+
+        assert viewer.sync() == 1
+        score = viewer.get(match_id)
+        assert (score['runs'], score['wickets'], score['overs'], score['version']) == (4, 1, '0.2', 1)
+        assert viewer.sync() == 0
+
+
+def test_sync_wakes_waiting_viewers(app, make_match, workers):
+    match_id = make_match()
+    feed, viewer = workers
+    with app.app_context():
+        version = viewer.get(match_id)['version']
+        feed.ingest(match_id, [{'seq': 1, 'runs': 6}])
+        feed.flush()
+        viewer.sync()
+
+    assert viewer.wait_for_change(match_id, version, timeout=0)
+
+
+def test_sync_keeps_unflushed_and_newer_balls(app, make_match, workers):
+    match_id = make_match()
+    feed, other = workers
+    with app.app_context():
+        feed.ingest(match_id, [{'seq': 1, 'runs': 1}])
+        feed.flush()
+        other.ingest(match_id, [{'seq': 1, 'runs': 1}, {'seq': 2, 'runs': 2}])
+
+        # Unflushed, then flushed but ahead of the stored score
+        assert other.sync() == 0
+        other.flush()
+        feed.ingest(match_id, [{'seq': 2, 'runs': 2}, {'seq': 3, 'runs': 3}])
+        feed.flush()
+        other.ingest(match_id, [{'seq': 4, 'runs': 4}])
+        assert other.sync() == 0
+
+        assert other.get(match_id)['runs'] == 7
+
+
+def test_malformed_batch_changes_nothing(app, make_match, workers):
+    match_id = make_match()
+    feed, _ = workers
+    with app.app_context():
+        before = feed.get(match_id)
+
+        with pytest.raises(ValueError):
+            feed.ingest(match_id, [{'seq': 1, 'runs': 4}, {'seq': 2, 'runs': 'four'}])
+
+        assert feed.get(match_id) == before
+        assert feed.flush() == 0
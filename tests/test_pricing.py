@@ -0,0 +1,54 @@
+import pytest
+
+from extension import db
+from models import StadiumSection
+import pricing
+
+
+def categories(match_id, rows):
+    return [line.category for line in pricing.engine.quote(match_id, [(row, 1) for row in rows]).lines]
+
+
+def test_section_edit_reprices_the_stadiums_matches(app, stadium, make_match):
+    match_id = make_match()
+    with app.app_context():
+        # Default bands on 40 rows: Premium 1-8, VIP 9-16, Regular 17-40
+        assert categories(match_id, [1, 9, 20]) == ['Premium', 'VIP', 'Regular']
+
+        pricing.set_sections(stadium, [('Premium', 1, 2), ('VIP', 3, 20)])
+
+        assert categories(match_id, [1, 9, 20, 21]) == ['Premium', 'VIP', 'VIP', 'Regular']
+        assert pricing.engine.quote(match_id, [(20, 1)]).total == 120.0
+
+        pricing.set_sections(stadium, [])
+
+        assert categories(match_id, [1, 9, 20]) == ['Premium', 'VIP', 'Regular']
+
+
+@pytest.mark.parametrize('sections', [
+    [('Balcony', 1, 5)],
+    [('VIP', 0, 5)],
+    [('VIP', 5, 41)],
+    [('VIP', 6, 5)],
+    [('Premium', 1, 5), ('VIP', 5, 10)],
+])
+def test_invalid_sections_are_refused(app, stadium, sections):
+    with app.app_context():
+        pricing.set_sections(stadium, [('Premium', 1, 3)])
+
+        with pytest.raises(pricing.SectionError):
+            pricing.set_sections(stadium, sections)
+
+        assert db.session.query(StadiumSection).count() == 1
+
+
+def test_set_sections_command(app, stadium):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['set-sections', str(stadium), 'Premium:1-4', 'VIP:5-10'])
+    assert result.exit_code == 0
+    assert result.output == 'Premium 1-4, VIP 5-10\n'
+
+    assert runner.invoke(args=['set-sections', str(stadium), 'VIP:5']).exit_code == 2
+    assert runner.invoke(args=['set-sections', str(stadium + 1), 'VIP:5-10']).exit_code == 2
+    assert runner.invoke(args=['set-sections', str(stadium)]).output == 'Premium 1-8, VIP 9-16, Regular 17-40\n'
@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+
+from extension import db
+from models import Match
+from replicas import replicas, copy_sqlite
+from response_cache import response_cache
+
+
+@pytest.fixture
+def replica(app, monkeypatch):
+    """Call to copy the primary into a replica, which then lags behind
+    every later write"""
+    engine = create_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'replica.db'))
+    monkeypatch.setattr(replicas, 'engines', {'replica1': engine})
+    monkeypatch.setattr(replicas, '_down_until', {})
+
+    def sync():
+        with app.app_context():
+            copy_sqlite(db.engine, replicas.engines)
+    yield sync
+    engine.dispose()
+
+
+def rename(app, match_id, team1):
+    with app.app_context():
+        db.session.get(Match, match_id).team1 = team1
+        db.session.commit()
+
+
+def test_read_replica_views_read_the_replica(app, make_match, make_user, login, replica):
+    make_user()
+    match_id = make_match(team1='Stale')
+    replica()
+    rename(app, match_id, 'Fresh')
+
+    data = login().get(f'/seats/{match_id}').data
+
+    assert b'Select Seats - Stale vs Pakistan' in data
+
+
+def test_seat_fragments_are_filled_from_the_primary(app, make_match, make_user, login, replica):
+    make_user()
+    match_id = make_match(team1='Stale')
+    replica()
+    rename(app, match_id, 'Fresh')
+
+    login().get(f'/seats/{match_id}')
+
+    assert 'Fresh vs Pakistan' in response_cache.get(f'fragment:seats-header:{match_id}')
+
+
+def test_catalogue_is_filled_from_the_primary(app, make_match, make_user, login, replica):
+    make_user()
+    make_match(team1='Old')
+    replica()
+    make_match(team1='Brand New')
+
+    signed_in = login().get('/matches')
+    anonymous = app.test_client().get('/matches')
+
+    assert b'Brand New' in signed_in.data
+    assert b'Brand New' in anonymous.data
+
+
+def test_failed_replica_falls_back_to_the_primary(app, make_match, make_user, login, replica):
+    make_user()
+    match_id = make_match()
+    # Never synced: the replica file has no tables
+
+    response = login().get(f'/seats/{match_id}')
+
+    assert response.status_code == 200
+    assert replicas.status() == {'replica1': False}
+
+
+def test_read_your_writes_goes_to_the_primary(app, make_match, make_user, login, replica):
+    make_user()
+    match_id = make_match()
+    replica()
+    client = login()
+    response = client.post('/book_seats', json={'match_id': match_id, 'seats': [{'row': 30, 'seat': 1}]})
+    assert response.json['success']
+    client.post('/process_payment')
+
+    assert b'download_ticket/' in client.get('/tickets').data
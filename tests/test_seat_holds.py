@@ -0,0 +1,108 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from extension import db
+from models import Booking, SeatHold
+import seat_holds
+
+
+@pytest.fixture
+def buyers(make_user):
+    return [make_user(email=f'buyer{i}@example.com') for i in range(6)]
+
+
+def claim_at_once(app, match_id, claims):
+    """Run seat_holds.claim for each (user_id, seats) in its own thread,
+    released together; returns user_id -> True or the HoldError message"""
+    barrier = threading.Barrier(len(claims))
+    results = {}
+
+    def claim(user_id, seats):
+        with app.app_context():
+            barrier.wait()
+            try:
+                seat_holds.claim(user_id, match_id, seats, ttl=60)
+                results[user_id] = True
+            except seat_holds.HoldError as e:
+                results[user_id] = str(e)
+    threads = [threading.Thread(target=claim, args=claim_args) for claim_args in claims]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def holders(app, match_id):
+    with app.app_context():
+        return set(db.session.execute(
+            db.select(SeatHold.user_id, SeatHold.seat_row, SeatHold.seat_number).where(SeatHold.match_id == match_id)
+        ).tuples())
+
+
+def test_one_buyer_wins_a_contested_seat(app, make_match, buyers):
+    match_id = make_match()
+
+    results = claim_at_once(app, match_id, [(user_id, [(5, 5)]) for user_id in buyers])
+
+    winners = [user_id for user_id, result in results.items() if result is True]
+    assert len(winners) == 1
+    assert all('being held by another customer' in result for result in results.values() if result is not True)
+    assert holders(app, match_id) == {(winners[0], 5, 5)}
+
+
+def test_overlapping_claims_are_all_or_nothing(app, make_match, buyers):
+    match_id = make_match()
+    first, second = buyers[:2]
+
+    results = claim_at_once(app, match_id, [(first, [(1, 1), (1, 2)]), (second, [(1, 2), (1, 3)])])
+
+    assert list(results.values()).count(True) == 1
+    winner = first if results[first] is True else second
+    assert {user_id for user_id, _, _ in holders(app, match_id)} == {winner}
+
+
+def test_expired_holds_can_be_taken(app, make_match, buyers):
+    match_id = make_match()
+    first, second = buyers[:2]
+    with app.app_context():
+        seat_holds.claim(first, match_id, [(2, 2)], ttl=60)
+        with pytest.raises(seat_holds.HoldError):
+            seat_holds.claim(second, match_id, [(2, 2)], ttl=60)
+        db.session.execute(db.update(SeatHold).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.session.commit()
+
+        seat_holds.claim(second, match_id, [(2, 2)], ttl=60)
+
+        with pytest.raises(seat_holds.HoldError, match='expired'):
+            seat_holds.confirm(first, match_id, [(2, 2)])
+    assert holders(app, match_id) == {(second, 2, 2)}
+
+
+def test_a_new_claim_replaces_the_buyers_holds(app, make_match, buyers):
+    match_id = make_match()
+    with app.app_context():
+        seat_holds.claim(buyers[0], match_id, [(3, 1), (3, 2)], ttl=60)
+        seat_holds.claim(buyers[0], match_id, [(3, 2), (3, 3)], ttl=60)
+
+        seat_holds.claim(buyers[1], match_id, [(3, 1)], ttl=60)
+
+    assert holders(app, match_id) == {(buyers[0], 3, 2), (buyers[0], 3, 3), (buyers[1], 3, 1)}
+
+
+def test_booked_and_repeated_seats_are_refused(app, make_match, buyers):
+    match_id = make_match()
+    with app.app_context():
+        seat_holds.claim(buyers[0], match_id, [(4, 4)], ttl=60)
+        seat_holds.confirm(buyers[0], match_id, [(4, 4)])
+        db.session.add(Booking(user_id=buyers[0], match_id=match_id, seat_row=4, seat_number=4,
+                               total_amount=50.0, qr_code='CT1:code'))
+        db.session.commit()
+
+        with pytest.raises(seat_holds.HoldError, match='4-4 is already booked'):
+            seat_holds.claim(buyers[1], match_id, [(4, 3), (4, 4)], ttl=60)
+        with pytest.raises(seat_holds.HoldError, match='twice'):
+            seat_holds.claim(buyers[1], match_id, [(4, 5), (4, 5)], ttl=60)
+    assert holders(app, match_id) == set()
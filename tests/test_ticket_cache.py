@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from extension import db
+from models import Booking
+from ticket_cache import TicketCache, ticket_cache
+import ticket_renderer
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TicketCache(str(tmp_path), max_bytes=1000)
+
+
+def test_open_ticket_survives_eviction(cache):
+    cache.put('a', b'%PDF-a' * 100)
+    f = cache.get('a')
+
+    # Another worker's put pushes the cache over budget and evicts it
+    cache.put('b', b'%PDF-b' * 100)
+    assert not os.path.exists(cache._path('a'))
+
+    with f:
+        assert f.read() == b'%PDF-a' * 100
+    assert cache.get('a') is None
+
+
+def test_download_streams_the_cached_file(app, make_match, make_user, login, tmp_path, monkeypatch):
+    monkeypatch.setattr(ticket_cache, 'directory', str(tmp_path))
+    renders = []
+
+    def render_inline(data, timeout):
+        renders.append(data['booking_id'])
+        return ticket_renderer.render_ticket(data)
+    monkeypatch.setattr(ticket_renderer, 'render_ticket_pooled', render_inline)
+    user_id = make_user()
+    match_id = make_match()
+    with app.app_context():
+        booking = Booking(user_id=user_id, match_id=match_id, seat_row=1, seat_number=1,
+                          total_amount=50.0, qr_code='CT1:code')
+        db.session.add(booking)
+        db.session.commit()
+        booking_id = booking.id
+    client = login()
+
+    first = client.get(f'/download_ticket/{booking_id}')
+    second = client.get(f'/download_ticket/{booking_id}')
+
+    assert renders == [booking_id]
+    assert first.data.startswith(b'%PDF') and second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert client.get(f'/download_ticket/{booking_id}',
+                      headers={'If-None-Match': first.headers['ETag']}).status_code == 304
@@ -0,0 +1,76 @@
+import pytest
+
+from waiting_room import WaitingRoom, session_token
+
+
+@pytest.fixture
+def workers(app):
+    """Two waiting rooms sharing the database, as two worker processes would"""
+    rooms = []
+    for _ in range(2):
+        room = WaitingRoom()
+        room.init_app(app)
+        room.sync_interval = 0
+        rooms.append(room)
+    return rooms
+
+
+def test_queue_opened_in_one_worker_is_seen_by_another(app, make_match, workers):
+    match_id = make_match()
+    first, second = workers
+    with app.app_context():
+        first.open(match_id, rate=1, burst=0)
+        assert second.is_active(match_id)
+
+        first.close(match_id)
+        assert not second.is_active(match_id)
+
+
+def test_positions_and_admissions_are_shared(app, make_match, workers):
+    match_id = make_match()
+    first, second = workers
+    with app.app_context():
+        first.open(match_id, rate=0.001, burst=1)
+        tokens = [first.join(match_id), second.join(match_id), first.join(match_id)]
+
+        assert [second.status(match_id, token)['position'] for token in tokens] == [1, 2, 3]
+        # One admission between both workers, not one each
+        assert [first.is_admitted(match_id, token) for token in tokens] == [True, False, False]
+        assert [second.is_admitted(match_id, token) for token in tokens] == [True, False, False]
+
+
+def test_reopening_voids_old_positions(app, make_match, workers):
+    match_id = make_match()
+    first, second = workers
+    with app.app_context():
+        first.open(match_id, rate=1, burst=5)
+        token = first.join(match_id)
+        second.open(match_id, rate=1, burst=5)
+
+        assert first.status(match_id, token)['position'] is None
+
+
+def test_queue_route_admits_within_the_burst(app, make_match, make_user, login):
+    make_user(is_admin=True)
+    match_id = make_match()
+    client = login()
+    response = client.post(f'/admin/queue/{match_id}', json={'rate': 1, 'burst': 1})
+    assert response.json['active']
+
+    assert client.get(f'/queue/{match_id}').status_code == 302
+    with client.session_transaction() as session:
+        assert session_token(session, match_id)
+    other = app.test_client()
+    assert other.get(f'/queue/{match_id}').status_code == 200
+
+
+@pytest.mark.parametrize('payload', [{'rate': 'fast'}, {'burst': 'lots'}, {'rate': None},
+                                     {'rate': 0}, {'rate': 'inf'}, {'burst': -1}])
+def test_admin_queue_rejects_bad_settings(make_match, make_user, login, payload):
+    make_user(is_admin=True)
+    match_id = make_match()
+
+    response = login().post(f'/admin/queue/{match_id}', json=payload)
+
+    assert response.status_code == 400
+    assert response.json['success'] is False
@@ -0,0 +1,103 @@
+"""
+Ticket cache
+On-disk cache of rendered ticket PDFs, content-addressed by a hash of the
+fields printed on the ticket, with size-bounded LRU eviction. The hash
+doubles as the ETag for download_ticket.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Bump when the ticket layout changes so old renders are not served
+LAYOUT_VERSION = 2
+
+
+def key_for(data):
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{LAYOUT_VERSION}:{payload}'.encode()).hexdigest()
+
+
+class TicketCache:
+    """Directory of <key>.pdf files; total_bytes is this process's running
+    estimate, corrected from the directory on every eviction pass"""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('TICKET_CACHE_DIR', os.path.join(app.instance_path, 'ticket_cache'))
+        app.config.setdefault('TICKET_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        self.directory = app.config['TICKET_CACHE_DIR']
+        self.max_bytes = app.config['TICKET_CACHE_MAX_BYTES']
+        os.makedirs(self.directory, exist_ok=True)
+        self.total_bytes = sum(size for _, _, size in self._entries())
+        app.extensions['ticket_cache'] = self
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def _entries(self):
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.pdf'):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, key):
+        """Open binary file of the cached PDF (marked as recently used), or
+        None; the caller closes it. The open handle keeps the contents
+        readable even if another worker evicts the file meanwhile."""
+        try:
+            f = open(self._path(key), 'rb')
+        except FileNotFoundError:
+            return None
+        os.utime(f.fileno())
+        return f
+
+    def put(self, key, pdf):
+        """Store pdf bytes atomically and return the cached path"""
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes += len(pdf) - replaced
+            over_budget = self.total_bytes > self.max_bytes
+        if over_budget:
+            self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Remove least recently used files until the cache is at 90% of its
+        budget, never removing keep (the file just written)"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in entries)
+            target = self.max_bytes * 0.9
+            for path, _, size in entries:
+                if total <= target:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self.total_bytes = total
+        logging.info("Ticket cache trimmed to %d bytes", total)
+
+
+ticket_cache = TicketCache()
@@ -0,0 +1,213 @@
+"""
+Ticket renderer
+ReportLab ticket rendering with styles built once per process, a process
+pool so PDF work runs across cores instead of in the request thread, and
+batch output as one multi-page PDF or a ZIP of single tickets.
+
+Workers receive plain dicts (see ticket_data) so nothing here touches the
+database. They are started from a forkserver that has preloaded only this
+module (spawn where forkserver is unavailable), never forked from the app
+process and its background threads. As with any such pool, workers import
+the launching script, so scripts must not build the app at import time
+outside the main process (see main.py). A pool that lost a worker is
+replaced; timeouts and lost workers surface as RenderUnavailable.
+"""
+import atexit
+import multiprocessing
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+
+DEFAULT_WORKERS = 2
+RENDER_TIMEOUT = 30
+
+INSTRUCTIONS = """
+<b>Important Instructions:</b><br/>
+• Please arrive at the stadium at least 30 minutes before the match<br/>
+• Carry a valid ID proof along with this ticket<br/>
+• Outside food and beverages are not allowed<br/>
+• Ticket is non-transferable and non-refundable<br/>
+• Lost tickets will not be replaced<br/><br/>
+
+<b>Enjoy the match! 🏏</b>
+"""
+
+
+def ticket_data(booking):
+    """Plain, picklable snapshot of everything printed on a ticket"""
+    match = booking.match
+    return {
+        'booking_id': booking.id,
+        'team1': match.team1,
+        'team2': match.team2,
+        'stadium_name': match.stadium.name,
+        'stadium_city': match.stadium.city,
+        'match_date': match.match_date,
+        'seat_row': booking.seat_row,
+        'seat_number': booking.seat_number,
+        'total_amount': booking.total_amount,
+        'user_name': booking.user.name,
+        'booking_date': booking.booking_date,
+        'qr_code': booking.qr_code,
+    }
+
+
+@lru_cache(maxsize=1)
+def _styles():
+    """Stylesheet, title style and table style, built once per process"""
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        textColor=colors.darkblue,
+        alignment=1  # Center alignment
+    )
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('BACKGROUND', (1, 0), (1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    return styles['Normal'], title_style, table_style
+
+
+def _qr_drawing(code, size=1.6*inch):
+    widget = QrCodeWidget(code)
+    x1, y1, x2, y2 = widget.getBounds()
+    drawing = Drawing(size, size, transform=[size / (x2 - x1), 0, 0, size / (y2 - y1), 0, 0])
+    drawing.add(widget)
+    return drawing
+
+
+def _ticket_flowables(data):
+    normal_style, title_style, table_style = _styles()
+    match_info = [
+        ['Match:', f"{data['team1']} vs {data['team2']}"],
+        ['Stadium:', f"{data['stadium_name']}, {data['stadium_city']}"],
+        ['Date & Time:', data['match_date'].strftime('%B %d, %Y at %I:%M %p')],
+        ['Seat:', f"Row {data['seat_row']}, Seat {data['seat_number']}"],
+        ['Price:', f"${data['total_amount']:.2f}"],
+        ['Booking ID:', f"#{data['booking_id']}"],
+        ['Booked By:', data['user_name']],
+        ['Booking Date:', data['booking_date'].strftime('%B %d, %Y')]
+    ]
+    table = Table(match_info, colWidths=[2*inch, 4*inch])
+    table.setStyle(table_style)
+    content = [
+        Paragraph("🏏 CRICKET TICKET", title_style),
+        Spacer(1, 20),
+        table,
+        Spacer(1, 30),
+    ]
+    if data.get('qr_code'):
+        content.extend([_qr_drawing(data['qr_code']), Spacer(1, 20)])
+    content.append(Paragraph(INSTRUCTIONS, normal_style))
+    return content
+
+
+def render_pdf(tickets):
+    """Render one or more ticket dicts as a PDF (one ticket per page)"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=1*inch)
+    content = []
+    for i, data in enumerate(tickets):
+        if i:
+            content.append(PageBreak())
+        content.extend(_ticket_flowables(data))
+    doc.build(content)
+    return buffer.getvalue()
+
+
+def render_ticket(data):
+    return render_pdf([data])
+
+
+class RenderUnavailable(Exception):
+    """The pool timed out or lost a worker"""
+
+
+_executor = None
+_workers = DEFAULT_WORKERS
+_pool_lock = threading.Lock()
+
+
+def _context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def _pool():
+    global _executor
+    with _pool_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=_workers, mp_context=_context())
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _discard(pool):
+    """Drop a broken pool so the next call starts a fresh one"""
+    global _executor
+    with _pool_lock:
+        if _executor is pool:
+            _executor = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _pooled(call, timeout):
+    pool = _pool()
+    try:
+        return call(pool, timeout)
+    except BrokenProcessPool:
+        _discard(pool)
+        raise RenderUnavailable('ticket renderer lost a worker')
+    except FutureTimeout:
+        raise RenderUnavailable(f'ticket rendering took longer than {timeout}s')
+
+
+def render_ticket_pooled(data, timeout=RENDER_TIMEOUT):
+    return _pooled(lambda pool, timeout: pool.submit(render_ticket, data).result(timeout=timeout), timeout)
+
+
+def render_pdf_pooled(tickets, timeout=RENDER_TIMEOUT):
+    return _pooled(lambda pool, timeout: pool.submit(render_pdf, tickets).result(timeout=timeout), timeout)
+
+
+def render_zip(tickets, timeout=None):
+    """ZIP containing one PDF per ticket, rendered across the pool"""
+    def render_all(pool, timeout):
+        return list(pool.map(render_ticket, tickets, timeout=timeout, chunksize=max(1, len(tickets) // 32)))
+
+    pdfs = _pooled(render_all, timeout)
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for data, pdf in zip(tickets, pdfs):
+            archive.writestr(f"ticket_{data['booking_id']}.pdf", pdf)
+    return buffer.getvalue()
+
+
+def init_app(app):
+    global _workers
+    app.config.setdefault('TICKET_RENDER_WORKERS', DEFAULT_WORKERS)
+    app.config.setdefault('TICKET_RENDER_TIMEOUT', RENDER_TIMEOUT)
+    _workers = app.config['TICKET_RENDER_WORKERS']
@@ -0,0 +1,171 @@
+"""
+Waiting room
+Virtual admission queue in front of the seat routes for hot matches.
+Visitors get a signed position token and are admitted at a fixed rate
+per match. Open queues live in the waiting_room_queues table, so every
+worker sees the same queue: joining takes the next position with one
+atomic UPDATE that also advances the shared token bucket. Checking a
+position reads a per-worker copy of the queue row refreshed at most every
+WAITING_ROOM_SYNC_INTERVAL seconds and the signed session cookie, and
+extrapolates the frontier from the bucket's shared timestamp, so polling
+costs at most one primary-key lookup per match per interval. Opening or
+closing a queue reaches other workers within that interval.
+"""
+import secrets
+import threading
+import time
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import case, delete, insert, select, update
+
+from extension import db
+from models import WaitingRoomQueue
+from replicas import primary_only
+
+DEFAULT_RATE = 50          # admissions per second
+DEFAULT_BURST = 200        # admissions allowed at once after an idle spell
+DEFAULT_TOKEN_MAX_AGE = 2 * 60 * 60
+DEFAULT_SYNC_INTERVAL = 1.0
+
+QUEUE_COLUMNS = (WaitingRoomQueue.epoch, WaitingRoomQueue.rate, WaitingRoomQueue.burst,
+                 WaitingRoomQueue.issued, WaitingRoomQueue.frontier, WaitingRoomQueue.updated_at)
+
+
+class MatchQueue:
+    """Snapshot of a queue row: an admission frontier that advances at
+    rate per second (token bucket) from its value at updated_at"""
+
+    def __init__(self, epoch, rate, burst, issued, frontier, updated_at):
+        self.epoch = epoch
+        self.rate = rate
+        self.burst = burst
+        self.issued = issued
+        self.frontier = frontier
+        self.updated_at = updated_at
+
+    def admitted_through(self, now=None):
+        elapsed = max(0.0, (now or time.time()) - self.updated_at)
+        # Idle capacity accumulates, but never more than burst ahead of the queue
+        return int(min(self.frontier + elapsed * self.rate, self.issued + self.burst))
+
+
+class WaitingRoom:
+    """Per-match queues plus signing of position tokens"""
+
+    def __init__(self):
+        self._serializer = None
+        self.token_max_age = DEFAULT_TOKEN_MAX_AGE
+        self.sync_interval = DEFAULT_SYNC_INTERVAL
+        # match_id -> (monotonic time read, MatchQueue or None)
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('WAITING_ROOM_RATE', DEFAULT_RATE)
+        app.config.setdefault('WAITING_ROOM_BURST', DEFAULT_BURST)
+        app.config.setdefault('WAITING_ROOM_TOKEN_MAX_AGE', DEFAULT_TOKEN_MAX_AGE)
+        app.config.setdefault('WAITING_ROOM_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL)
+        self._serializer = URLSafeTimedSerializer(app.secret_key, salt='waiting-room')
+        self.token_max_age = app.config['WAITING_ROOM_TOKEN_MAX_AGE']
+        self.sync_interval = app.config['WAITING_ROOM_SYNC_INTERVAL']
+        app.extensions['waiting_room'] = self
+
+    def _remember(self, match_id, queue):
+        with self._lock:
+            self._queues[match_id] = (time.monotonic(), queue)
+
+    def _queue(self, match_id):
+        """This worker's copy of the match queue (None if closed), re-read once stale"""
+        entry = self._queues.get(match_id)
+        if entry is not None and time.monotonic() - entry[0] < self.sync_interval:
+            return entry[1]
+        with primary_only():
+            row = db.session.execute(select(*QUEUE_COLUMNS).where(WaitingRoomQueue.match_id == match_id)).first()
+        queue = MatchQueue(*row) if row is not None else None
+        self._remember(match_id, queue)
+        return queue
+
+    def open(self, match_id, rate, burst):
+        """(Re)open a match queue; positions issued before are void"""
+        queues = WaitingRoomQueue.__table__
+        db.session.execute(delete(queues).where(queues.c.match_id == match_id))
+        values = {'epoch': secrets.token_hex(4), 'rate': rate, 'burst': burst, 'issued': 0,
+                  'frontier': float(burst), 'updated_at': time.time()}
+        db.session.execute(insert(queues).values(match_id=match_id, **values))
+        db.session.commit()
+        self._remember(match_id, MatchQueue(**values))
+
+    def close(self, match_id):
+        queues = WaitingRoomQueue.__table__
+        db.session.execute(delete(queues).where(queues.c.match_id == match_id))
+        db.session.commit()
+        self._remember(match_id, None)
+
+    def is_active(self, match_id):
+        return self._queue(match_id) is not None
+
+    def join(self, match_id):
+        """Issue the next position in the match queue as a signed token"""
+        queues = WaitingRoomQueue.__table__
+        now = time.time()
+        advanced = queues.c.frontier + (now - queues.c.updated_at) * queues.c.rate
+        cap = queues.c.issued + queues.c.burst
+        row = db.session.execute(
+            update(queues).where(queues.c.match_id == match_id).values(
+                issued=queues.c.issued + 1,
+                frontier=case((advanced < cap, advanced), else_=cap),
+                updated_at=now,
+            ).returning(*(queues.c[column.key] for column in QUEUE_COLUMNS))
+        ).first()
+        db.session.commit()
+        if row is None:
+            self._remember(match_id, None)
+            raise KeyError(match_id)
+        queue = MatchQueue(*row)
+        self._remember(match_id, queue)
+        return self._serializer.dumps({'m': match_id, 'p': queue.issued, 'e': queue.epoch})
+
+    def _position(self, match_id, token):
+        queue = self._queue(match_id)
+        if queue is None or not token:
+            return queue, None
+        try:
+            data = self._serializer.loads(token, max_age=self.token_max_age)
+        except BadSignature:
+            return queue, None
+        if data.get('m') != match_id or data.get('e') != queue.epoch:
+            return queue, None
+        return queue, data['p']
+
+    def status(self, match_id, token):
+        """Dict describing where token stands; position is None for invalid tokens"""
+        queue, position = self._position(match_id, token)
+        if queue is None:
+            return {'active': False, 'admitted': True}
+        if position is None:
+            return {'active': True, 'admitted': False, 'position': None}
+        frontier = queue.admitted_through()
+        ahead = max(0, position - frontier)
+        return {
+            'active': True,
+            'admitted': ahead == 0,
+            'position': position,
+            'ahead': ahead,
+            'eta_seconds': round(ahead / queue.rate, 1) if queue.rate else None,
+        }
+
+    def is_admitted(self, match_id, token):
+        return self.status(match_id, token)['admitted']
+
+
+waiting_room = WaitingRoom()
+
+
+def session_token(session, match_id):
+    return session.get('queue_tokens', {}).get(str(match_id))
+
+
+def store_token(session, match_id, token):
+    tokens = dict(session.get('queue_tokens', {}))
+    tokens[str(match_id)] = token
+    session['queue_tokens'] = tokens